@@ -14,18 +14,37 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Import route blueprints
-from routes import main_bp, analysis_bp, familiar_bp
+from routes import main_bp, analysis_bp, familiar_bp, media_bp, jobs_bp, assets_bp, metrics_bp, install_timing
+from cli import storage_cli, assets_cli
+from services.static_assets import asset_url, image_sources, background_image
 
 
 def create_app():
     """Application factory function"""
     app = Flask(__name__)
     app.secret_key = os.environ.get('SECRET_KEY', 'witch-workshop-secret-key-2024')
+    # Hard cap on request bodies; uploads have their own, smaller cap (MAX_UPLOAD_MB)
+    app.config['MAX_CONTENT_LENGTH'] = int(float(os.environ.get('MAX_REQUEST_MB', '32')) * 1024 * 1024)
     
     # Register blueprints
     app.register_blueprint(main_bp)
     app.register_blueprint(analysis_bp)
     app.register_blueprint(familiar_bp)
+    app.register_blueprint(media_bp)
+    app.register_blueprint(jobs_bp)
+    app.register_blueprint(assets_bp)
+    app.register_blueprint(metrics_bp)
+
+    # Server-Timing headers, latency histograms and the slow-request profiler
+    install_timing(app)
+
+    # Fingerprinted asset URLs for templates (see services/static_assets.py)
+    app.jinja_env.globals.update(asset_url=asset_url, image_sources=image_sources,
+                                 background_image=background_image)
+    
+    # Register CLI commands
+    app.cli.add_command(storage_cli)
+    app.cli.add_command(assets_cli)
     
     return app
 
@@ -0,0 +1,155 @@
+"""
+Background Removal Benchmark - NumPy engine vs. the original per-pixel loops
+
+Runs `cutout_white_background` from services.gemini_service against a
+copy of the original pure-Python implementation on fixture images,
+checks that both produce identical pixels and reports timings.
+
+Usage:
+    python -m benchmarks.bench_background
+    python -m benchmarks.bench_background --sizes 256 512 --repeat 5 --json
+    python -m benchmarks.bench_background --no-reference --output background.json
+"""
+
+import os
+import sys
+import time
+import argparse
+from PIL import Image, ImageDraw, ImageFilter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import report
+from services.gemini_service import cutout_white_background, smooth_edges
+
+STATIC_IMAGES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'images')
+
+
+# ============ Reference implementation (original per-pixel code) ============
+
+def reference_remove(img: Image.Image, threshold: int = 240, tolerance: int = 30) -> Image.Image:
+    img = img.convert('RGBA')
+    pixels = img.load()
+    width, height = img.size
+    for y in range(height):
+        for x in range(width):
+            r, g, b, a = pixels[x, y]
+            is_bright = r > threshold and g > threshold and b > threshold
+            is_neutral = abs(r - g) < tolerance and abs(g - b) < tolerance and abs(r - b) < tolerance
+            if is_bright and is_neutral:
+                pixels[x, y] = (r, g, b, 0)
+            else:
+                pixels[x, y] = (r, g, b, 255)
+    return reference_smooth(img)
+
+
+def reference_smooth(img: Image.Image, passes: int = 2) -> Image.Image:
+    pixels = img.load()
+    width, height = img.size
+    for _ in range(passes):
+        new_img = img.copy()
+        new_pixels = new_img.load()
+        for y in range(1, height - 1):
+            for x in range(1, width - 1):
+                r, g, b, a = pixels[x, y]
+                if 0 < a < 255:
+                    neighbor_alphas = []
+                    for dy in [-1, 0, 1]:
+                        for dx in [-1, 0, 1]:
+                            if dx == 0 and dy == 0:
+                                continue
+                            _, _, _, na = pixels[x + dx, y + dy]
+                            neighbor_alphas.append(na)
+                    avg_alpha = sum(neighbor_alphas) // len(neighbor_alphas)
+                    new_alpha = (a + avg_alpha) // 2
+                    new_pixels[x, y] = (r, g, b, new_alpha)
+        img = new_img
+        pixels = img.load()
+    return img
+
+
+# ============ Fixtures ============
+
+def sticker_fixture(size: int) -> Image.Image:
+    """A coloured creature on a slightly noisy white background, like a generated sticker"""
+    img = Image.new('RGB', (size, size), (250, 250, 248))
+    draw = ImageDraw.Draw(img)
+    draw.ellipse((size * 0.2, size * 0.25, size * 0.8, size * 0.9), fill=(120, 70, 160))
+    draw.ellipse((size * 0.35, size * 0.1, size * 0.65, size * 0.4), fill=(250, 200, 80))
+    draw.rectangle((size * 0.45, size * 0.5, size * 0.55, size * 0.6), fill=(245, 245, 250))
+    # Blur creates the light, almost-white fringe that the thresholds have to judge
+    return img.filter(ImageFilter.GaussianBlur(max(1, size // 128)))
+
+
+def partial_alpha_fixture(size: int) -> Image.Image:
+    """RGBA image with a soft alpha gradient, to exercise smooth_edges directly"""
+    img = sticker_fixture(size).convert('RGBA')
+    alpha = Image.radial_gradient('L').resize((size, size))
+    img.putalpha(alpha)
+    return img
+
+
+def load_fixtures(sizes: list) -> list:
+    fixtures = [(f"sticker-{size}", sticker_fixture(size)) for size in sizes]
+    broom = os.path.join(STATIC_IMAGES, 'broom.png')
+    if os.path.exists(broom):
+        img = Image.open(broom)
+        img.thumbnail((max(sizes), max(sizes)))
+        fixtures.append((f"broom-{img.size[0]}x{img.size[1]}", img))
+    return fixtures
+
+
+# ============ Runner ============
+
+def _best_of(fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(sizes: list, repeat: int = 3, reference: bool = True) -> list:
+    results = []
+    for name, img in load_fixtures(sizes):
+        img.load()
+        row = {'fixture': name, 'pixels': img.size[0] * img.size[1]}
+        row['vectorized_ms'] = _best_of(lambda: cutout_white_background(img), repeat) * 1000
+        soft = partial_alpha_fixture(min(img.size))
+        row['smooth_ms'] = _best_of(lambda: smooth_edges(soft), repeat) * 1000
+
+        if reference:
+            expected = reference_remove(img.copy())
+            row['reference_ms'] = _best_of(lambda: reference_remove(img.copy()), 1) * 1000
+            row['identical'] = cutout_white_background(img).tobytes() == expected.tobytes()
+            row['speedup'] = row['reference_ms'] / row['vectorized_ms']
+            row['smooth_identical'] = smooth_edges(soft).tobytes() == reference_smooth(soft.copy()).tobytes()
+        results.append(row)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[256, 512, 1024])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-reference', action='store_true', help='Skip the slow per-pixel reference')
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results')
+    parser.add_argument('--output', help='Write the JSON report here')
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.repeat, reference=not args.no_reference)
+    if args.json or args.output:
+        report('background_removal', vars(args), results, args.output)
+        return
+
+    for row in results:
+        line = f"{row['fixture']:<20} vectorized {row['vectorized_ms']:8.1f} ms"
+        if 'reference_ms' in row:
+            line += (f"   reference {row['reference_ms']:9.1f} ms   x{row['speedup']:.0f}"
+                     f"   identical={row['identical'] and row['smooth_identical']}")
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
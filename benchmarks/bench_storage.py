@@ -0,0 +1,96 @@
+"""
+Storage Benchmark - storage_service operations on a synthetic dataset
+
+Seeds a temporary data directory with a synthetic familiars.json (and a
+SQLite import of it for --backend sqlite), points the storage service at
+it through DATA_DIR and times the public read and write functions.
+
+Usage:
+    python -m benchmarks.bench_storage --count 10000
+    python -m benchmarks.bench_storage --count 100000 --backend sqlite --output storage.json
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import time_calls, report
+from benchmarks.synthetic import write_dataset
+
+
+def run(count: int, backend: str = 'json', images: bool = False, reads: int = 50, writes: int = 5) -> list:
+    """Time each operation; must run in a fresh process (storage config is read at import)"""
+    data_dir = tempfile.mkdtemp(prefix='bench-storage-')
+    try:
+        json_file = os.path.join(data_dir, 'familiars.json')
+        dataset_bytes = write_dataset(json_file, count, images=images)
+        os.environ.update({'DATA_DIR': data_dir, 'STORAGE_BACKEND': backend})
+
+        from services import storage_service
+        if backend == 'sqlite':
+            from services.sqlite_storage import migrate_json_to_sqlite
+            migrate_json_to_sqlite(json_file, storage_service.SQLITE_FILE)
+
+        familiars = storage_service.get_familiars()
+        ids = [f['id'] for f in familiars]
+        middle_id = ids[len(ids) // 2]
+        deep_cursor = storage_service.page_key(familiars[len(familiars) // 2], 'newest')
+        new_ids = iter(range(10 ** 9))
+
+        def cold_load():
+            storage_service._cache.records = None
+            storage_service.get_familiars()
+
+        def save_and_delete():
+            familiar = dict(familiars[0], id=f'new{next(new_ids)}')
+            storage_service.save_familiar(familiar)
+            storage_service.delete_familiar(familiar['id'])
+
+        operations = [
+            ('cold_load', cold_load, writes if backend == 'json' else reads),
+            ('get_familiars', storage_service.get_familiars, reads),
+            ('get_familiar', lambda: storage_service.get_familiar(middle_id), reads),
+            ('page_first_50', lambda: storage_service.get_familiars_page('newest', 50), reads),
+            ('page_deep_50', lambda: storage_service.get_familiars_page('newest', 50, deep_cursor), reads),
+            ('leaderboard_top_100', lambda: storage_service.get_familiars_page('magic_power', 100), reads),
+            ('get_leaderboard_full', storage_service.get_leaderboard, writes),
+            ('get_rank', lambda: storage_service.get_rank(middle_id), reads),
+            ('user_familiars', storage_service.get_user_familiars, reads),
+            ('validator', storage_service.storage_validator, reads),
+            ('changes_since', lambda: storage_service.get_changes(max(0, storage_service.get_change_seq() - 10)), reads),
+            ('increment_votes', lambda: storage_service.increment_votes(middle_id, likes=1), writes),
+            ('save_and_delete', save_and_delete, writes),
+        ]
+
+        results = []
+        for name, fn, repeat in operations:
+            fn()  # warm up (builds caches and indexes once)
+            row = {'operation': name, 'backend': backend, 'records': count, 'images': images,
+                   'dataset_mb': round(dataset_bytes / 1024 / 1024, 2)}
+            row.update(time_calls(fn, repeat))
+            results.append(row)
+        return results
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark storage_service on synthetic data')
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('--backend', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--images', action='store_true', help='Records with inline base64 images')
+    parser.add_argument('--reads', type=int, default=50, help='Repetitions per read operation')
+    parser.add_argument('--writes', type=int, default=5, help='Repetitions per write operation')
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    results = run(args.count, args.backend, args.images, args.reads, args.writes)
+    report('storage', vars(args), results, args.output)
+
+
+if __name__ == '__main__':
+    main()
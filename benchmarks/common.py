@@ -0,0 +1,84 @@
+"""
+Benchmark helpers - Timing statistics and machine-readable reports
+
+Every benchmark prints (or writes) one JSON document:
+
+    {"benchmark": "<name>", "environment": {...}, "config": {...}, "results": [...]}
+
+so runs from different releases can be compared with
+`python -m benchmarks.compare old.json new.json`.
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """q-th percentile (0-100) of an ascending list, by linear interpolation"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(latencies: list) -> dict:
+    """Latency statistics in milliseconds for a list of durations in seconds"""
+    values = sorted(latencies)
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'mean_ms': sum(values) / len(values) * 1000,
+        'p50_ms': percentile(values, 50) * 1000,
+        'p95_ms': percentile(values, 95) * 1000,
+        'p99_ms': percentile(values, 99) * 1000,
+        'max_ms': values[-1] * 1000,
+    }
+
+
+def time_calls(fn, repeat: int = 20, min_time: float = 0.0) -> dict:
+    """Call fn at least `repeat` times (and for at least min_time seconds) and summarize"""
+    latencies = []
+    started = time.perf_counter()
+    while len(latencies) < repeat or time.perf_counter() - started < min_time:
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies)
+
+
+def environment() -> dict:
+    """Where and on what code a benchmark ran"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'commit': commit or None,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def report(name: str, config: dict, results: list, output: str = None) -> dict:
+    """Build the JSON document for a run and write it to `output` (or stdout)"""
+    document = {'benchmark': name, 'environment': environment(), 'config': config,
+                'results': results}
+    text = json.dumps(document, indent=2)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        sys.stdout.write(text + '\n')
+    return document
@@ -0,0 +1,89 @@
+"""
+Compare Benchmark Runs - Relative change between two JSON reports
+
+Matches result rows of two reports of the same benchmark (by route,
+operation or fixture plus the dataset parameters) and prints the change
+of each metric. Latencies going up and throughput going down by more
+than --threshold percent are flagged as regressions; the exit status is
+1 if there are any.
+
+Usage:
+    python -m benchmarks.compare baseline.json candidate.json
+    python -m benchmarks.compare baseline.json candidate.json --threshold 10 --json
+"""
+
+import sys
+import json
+import argparse
+
+# Metrics per row and whether a higher value is better
+METRICS = {
+    'throughput_rps': True,
+    'p50_ms': False,
+    'p95_ms': False,
+    'p99_ms': False,
+    'vectorized_ms': False,
+    'smooth_ms': False,
+}
+KEY_FIELDS = ('route', 'operation', 'fixture', 'backend', 'records', 'images', 'clients')
+
+
+def row_key(row: dict) -> tuple:
+    return tuple((field, row[field]) for field in KEY_FIELDS if field in row)
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> list:
+    before = {row_key(row): row for row in baseline['results']}
+    changes = []
+    for row in candidate['results']:
+        old = before.get(row_key(row))
+        if old is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            if metric not in row or metric not in old or not old[metric]:
+                continue
+            change = (row[metric] - old[metric]) / old[metric] * 100
+            worse = -change if higher_is_better else change
+            changes.append({
+                'key': dict(row_key(row)),
+                'metric': metric,
+                'baseline': old[metric],
+                'candidate': row[metric],
+                'change_pct': change,
+                'regression': worse > threshold,
+            })
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two benchmark reports')
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=5.0, help='Regression threshold in percent')
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results')
+    args = parser.parse_args()
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.candidate, 'r', encoding='utf-8') as f:
+        candidate = json.load(f)
+    if baseline.get('benchmark') != candidate.get('benchmark'):
+        sys.exit(f"Different benchmarks: {baseline.get('benchmark')} vs {candidate.get('benchmark')}")
+
+    changes = compare(baseline, candidate, args.threshold)
+    if args.json:
+        print(json.dumps({'benchmark': candidate['benchmark'],
+                          'baseline': baseline.get('environment', {}).get('commit'),
+                          'candidate': candidate.get('environment', {}).get('commit'),
+                          'changes': changes}, indent=2))
+    else:
+        for c in changes:
+            label = ' '.join(str(v) for v in c['key'].values())
+            flag = '  REGRESSION' if c['regression'] else ''
+            print(f"{label:<40} {c['metric']:<15} {c['baseline']:10.2f} -> {c['candidate']:10.2f}"
+                  f"  {c['change_pct']:+7.1f}%{flag}")
+    sys.exit(1 if any(c['regression'] for c in changes) else 0)
+
+
+if __name__ == '__main__':
+    main()
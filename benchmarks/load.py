@@ -0,0 +1,294 @@
+"""
+Load Driver - Multi-client throughput and latency for every /api route
+
+Each route is driven on its own for `--duration` seconds by `--clients`
+threads, each with a keep-alive connection, and reported as throughput
+plus p50/p95/p99 latency. Without --url a benchmarks.server process is
+started on a synthetic dataset with the Gemini stub, and stopped again
+at the end.
+
+Read routes run first, then the Gemini-backed ones, then writes, so the
+read numbers are not skewed by records added during the run. The SSE
+streams (/api/familiars/changes/stream, /api/jobs/<id>/events) are
+long-lived and not part of the request/response measurements.
+
+Usage:
+    python -m benchmarks.load --count 10000 --clients 8 --duration 5
+    python -m benchmarks.load --url http://127.0.0.1:5000 --routes list_page forest
+    python -m benchmarks.load --count 1000 --output load.json
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+import subprocess
+import http.client
+import urllib.parse
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import summarize, report, ROOT
+
+
+class Route:
+    """
+    One benchmarked endpoint.
+
+    `request(ctx)` returns (method, path, body, headers) for the next call,
+    or None when the route has run out of work (e.g. nothing left to delete).
+    `record(ctx, status, body)` can harvest ids from responses.
+    """
+
+    def __init__(self, name: str, request, record=None, group: str = 'read'):
+        self.name = name
+        self.request = request
+        self.record = record
+        self.group = group
+
+
+def _json(method: str, path: str, payload: dict):
+    return method, path, json.dumps(payload).encode('utf-8'), {'Content-Type': 'application/json'}
+
+
+def _multipart(field: str, filename: str, data: bytes, mime_type: str):
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: {mime_type}\r\n\r\n').encode('ascii') + data + f'\r\n--{boundary}--\r\n'.encode('ascii')
+    return body, {'Content-Type': f'multipart/form-data; boundary={boundary}'}
+
+
+def _photo(seed: int, size: int = 640) -> bytes:
+    """A distinct JPEG per seed, so analysis requests miss the cache"""
+    rng = random.Random(seed)
+    img = Image.new('RGB', (size, size), tuple(rng.randint(0, 255) for _ in range(3)))
+    img.putpixel((rng.randrange(size), rng.randrange(size)), (rng.randint(0, 255), 0, 0))
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def _sticker_data_uri() -> str:
+    import base64
+    img = Image.new('RGB', (256, 256), (255, 255, 255))
+    img.paste((120, 70, 160), (64, 64, 192, 192))
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def build_routes() -> list:
+    def pick(ctx):
+        return random.choice(ctx['ids'])
+
+    def next_counter(ctx):
+        with ctx['lock']:
+            ctx['counter'] += 1
+            return ctx['counter']
+
+    def analyze(ctx):
+        body, headers = _multipart('image', 'photo.jpg', _photo(next_counter(ctx)), 'image/jpeg')
+        return 'POST', '/api/analyze', body, headers
+
+    def record_job(ctx, status, body):
+        if status == 202:
+            ctx['job_ids'].append(json.loads(body)['jobId'])
+
+    def record_created(ctx, status, body):
+        if status == 200:
+            with ctx['lock']:
+                ctx['created'].append(json.loads(body)['familiar']['id'])
+
+    def delete(ctx):
+        with ctx['lock']:
+            if not ctx['created']:
+                return None
+            familiar_id = ctx['created'].pop()
+        return 'DELETE', f'/api/familiars/{familiar_id}', None, {}
+
+    gzip = {'Accept-Encoding': 'gzip'}
+    return [
+        Route('list_all', lambda ctx: ('GET', '/api/familiars?limit=all', None, gzip)),
+        Route('list_page', lambda ctx: ('GET', '/api/familiars?limit=50', None, gzip)),
+        Route('list_not_modified', lambda ctx: ('GET', '/api/familiars?limit=all', None,
+                                                {**gzip, 'If-None-Match': ctx['etag']})),
+        Route('forest', lambda ctx: ('GET', '/api/familiars/forest?limit=all', None, gzip)),
+        Route('user', lambda ctx: ('GET', '/api/familiars/user?limit=all', None, gzip)),
+        Route('leaderboard', lambda ctx: ('GET', '/api/familiars/leaderboard?limit=100', None, gzip)),
+        Route('rank', lambda ctx: ('GET', f'/api/familiars/{pick(ctx)}/rank', None, {})),
+        Route('changes', lambda ctx: ('GET', f"/api/familiars/changes?since={ctx['seq']}", None, {})),
+        Route('familiar_stats', lambda ctx: ('GET', '/api/familiars/stats', None, {})),
+        Route('analyze_stats', lambda ctx: ('GET', '/api/analyze/stats', None, {})),
+        Route('generate_stats', lambda ctx: ('GET', '/api/generate/stats', None, {})),
+        Route('job_stats', lambda ctx: ('GET', '/api/jobs/stats', None, {})),
+        Route('analyze', analyze, group='gemini'),
+        Route('generate_image', lambda ctx: _json('POST', '/api/generate-image', {
+            'species': 'Owl', 'description': f'variant {next_counter(ctx)}'}), group='gemini'),
+        Route('remove_background', lambda ctx: _json('POST', '/api/remove-background', {
+            'imageUrl': ctx['sticker']}), group='gemini'),
+        Route('generate_job', lambda ctx: _json('POST', '/api/generate', {
+            'species': 'Fox', 'description': f'variant {next_counter(ctx)}'}), record_job, group='gemini'),
+        Route('job_status', lambda ctx: ('GET', f"/api/jobs/{random.choice(ctx['job_ids'])}", None, {})
+              if ctx['job_ids'] else None, group='gemini'),
+        Route('create', lambda ctx: _json('POST', '/api/familiars', {
+            'animal_name': f'Bench {next_counter(ctx)}', 'animal_species': 'Moth',
+            'original_item_name': 'Load', 'generated_image': '/media/none.png'}),
+            record_created, group='write'),
+        Route('update', lambda ctx: _json('PUT', f'/api/familiars/{pick(ctx)}', {
+            'animal_name': f'Renamed {next_counter(ctx)}'}), group='write'),
+        Route('like', lambda ctx: _json('POST', f'/api/familiars/{pick(ctx)}/like', {
+            'value': random.choice((1, -1))}), group='write'),
+        Route('set_main', lambda ctx: _json('POST', f"/api/familiars/{random.choice(ctx['user_ids'] or ctx['ids'])}/set-main", {}),
+              group='write'),
+        Route('delete', delete, group='write'),
+    ]
+
+
+# ============ Driver ============
+
+def _connection(base_url: str) -> http.client.HTTPConnection:
+    parsed = urllib.parse.urlsplit(base_url)
+    return http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=120)
+
+
+def _call(conn, method, path, body, headers):
+    conn.request(method, path, body=body, headers=headers)
+    response = conn.getresponse()
+    return response.status, response.read(), response.headers
+
+
+def prepare_context(base_url: str) -> dict:
+    conn = _connection(base_url)
+    _, body, headers = _call(conn, 'GET', '/api/familiars?limit=all&fields=id,user_id', None, {})
+    familiars = json.loads(body)
+    _, _, list_headers = _call(conn, 'GET', '/api/familiars?limit=all', None, {'Accept-Encoding': 'gzip'})
+    conn.close()
+    return {
+        'ids': [f['id'] for f in familiars][:5000],
+        'user_ids': [f['id'] for f in familiars if f.get('user_id') == 'local_user'][:500],
+        'seq': int(headers.get('X-Change-Seq', '0')),
+        'etag': list_headers.get('ETag', ''),
+        'sticker': _sticker_data_uri(),
+        'job_ids': [],
+        'created': [],
+        'counter': 0,
+        'lock': threading.Lock(),
+    }
+
+
+def drive(base_url: str, route: Route, ctx: dict, clients: int, duration: float) -> dict:
+    latencies, statuses, errors = [], {}, []
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(clients + 1)
+    deadline = [0.0]
+
+    def client():
+        conn = _connection(base_url)
+        mine, my_statuses = [], {}
+        start_barrier.wait()
+        while time.perf_counter() < deadline[0]:
+            request = route.request(ctx)
+            if request is None:
+                break
+            start = time.perf_counter()
+            try:
+                status, body, _ = _call(conn, *request)
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                conn = _connection(base_url)
+                with lock:
+                    errors.append(str(e))
+                continue
+            mine.append(time.perf_counter() - start)
+            my_statuses[status] = my_statuses.get(status, 0) + 1
+            if route.record is not None:
+                route.record(ctx, status, body)
+        conn.close()
+        with lock:
+            latencies.extend(mine)
+            for status, n in my_statuses.items():
+                statuses[status] = statuses.get(status, 0) + n
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    started = time.perf_counter()
+    deadline[0] = started + duration
+    start_barrier.wait()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    failed = sum(n for status, n in statuses.items() if status >= 500) + len(errors)
+    row = {'route': route.name, 'group': route.group, 'clients': clients,
+           'throughput_rps': len(latencies) / elapsed if elapsed else 0.0,
+           'statuses': {str(k): v for k, v in sorted(statuses.items())},
+           'errors': failed}
+    row.update(summarize(latencies))
+    return row
+
+
+def start_server(args) -> tuple:
+    """Spawn benchmarks.server; returns (process, base_url)"""
+    command = [sys.executable, '-m', 'benchmarks.server', '--count', str(args.count),
+               '--backend', args.backend, '--stub-latency', str(args.stub_latency)]
+    if args.images:
+        command.append('--images')
+    process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.PIPE, text=True)
+    for line in process.stdout:
+        if line.startswith('READY '):
+            # Keep draining the app's output so a full pipe never blocks the server
+            threading.Thread(target=lambda: process.stdout.read(), daemon=True).start()
+            return process, line.split()[1]
+    process.wait()
+    raise RuntimeError('Benchmark server exited before becoming ready')
+
+
+def main():
+    routes = build_routes()
+    parser = argparse.ArgumentParser(description='Multi-client load test of the /api routes')
+    parser.add_argument('--url', help='Test a running server instead of spawning one')
+    parser.add_argument('--count', type=int, default=1000, help='Synthetic records (spawned server)')
+    parser.add_argument('--backend', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--images', action='store_true', help='Records with inline base64 images')
+    parser.add_argument('--stub-latency', type=float, default=0.05)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=3.0, help='Seconds per route')
+    parser.add_argument('--routes', nargs='+', choices=[r.name for r in routes],
+                        help='Only these routes (default: all)')
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    process = None
+    base_url = args.url
+    if base_url is None:
+        process, base_url = start_server(args)
+    try:
+        ctx = prepare_context(base_url)
+        results = []
+        for route in routes:
+            if args.routes and route.name not in args.routes:
+                continue
+            row = drive(base_url, route, ctx, args.clients, args.duration)
+            print(f"{row['route']:<20} {row['throughput_rps']:8.1f} req/s   "
+                  f"p50 {row.get('p50_ms', 0):8.2f} ms   p95 {row.get('p95_ms', 0):8.2f} ms   "
+                  f"p99 {row.get('p99_ms', 0):8.2f} ms   errors {row['errors']}", file=sys.stderr)
+            results.append(row)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    config = {k: v for k, v in vars(args).items() if k != 'url'}
+    config['target'] = args.url or 'spawned'
+    report('load', config, results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Run All Benchmarks - The full matrix into one output directory
+
+Storage runs for each record count x {no images, inline images} x
+{json, sqlite}, each in its own process (storage config is read at
+import), then the background removal microbenchmarks and a load run.
+Every run writes its own JSON report; compare two directories file by
+file with benchmarks.compare.
+
+Usage:
+    python -m benchmarks.run_all --out bench-results/
+    python -m benchmarks.run_all --counts 1000 10000 100000 --skip-load --out bench-results/
+"""
+
+import os
+import sys
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import ROOT
+
+
+def _run(args: list, output: str):
+    print(f"-> {os.path.basename(output)}", file=sys.stderr)
+    subprocess.run([sys.executable, '-m'] + args + ['--output', output], cwd=ROOT, check=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the benchmark matrix')
+    parser.add_argument('--out', required=True, help='Directory for the JSON reports')
+    parser.add_argument('--counts', type=int, nargs='+', default=[1000, 10000],
+                        help='Record counts (100000 takes several minutes)')
+    parser.add_argument('--backends', nargs='+', choices=['json', 'sqlite'], default=['json', 'sqlite'])
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=3.0)
+    parser.add_argument('--skip-load', action='store_true')
+    args = parser.parse_args()
+
+    out = os.path.abspath(args.out)
+    os.makedirs(out, exist_ok=True)
+    for count in args.counts:
+        for images in (False, True):
+            for backend in args.backends:
+                suffix = '-images' if images else ''
+                command = ['benchmarks.bench_storage', '--count', str(count), '--backend', backend]
+                if images:
+                    command.append('--images')
+                _run(command, os.path.join(out, f'storage-{backend}-{count}{suffix}.json'))
+
+    _run(['benchmarks.bench_background', '--no-reference'], os.path.join(out, 'background.json'))
+
+    if not args.skip_load:
+        for backend in args.backends:
+            _run(['benchmarks.load', '--count', str(args.counts[0]), '--backend', backend,
+                  '--clients', str(args.clients), '--duration', str(args.duration)],
+                 os.path.join(out, f'load-{backend}-{args.counts[0]}.json'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark Server - The app on a synthetic dataset with a local Gemini stub
+
+Creates a temporary data directory seeded with synthetic familiars,
+starts tools/gemini_stub in-process and serves the Flask app with a
+threaded WSGI server. Prints `READY <base url>` once it accepts requests;
+everything is removed again on exit. Used by benchmarks.load.
+
+Usage:
+    python -m benchmarks.server --count 10000 --port 5050
+"""
+
+import os
+import sys
+import shutil
+import logging
+import signal
+import tempfile
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import write_dataset
+from tools.gemini_stub import start_stub
+
+
+def configure(data_dir: str, count: int, backend: str, images: bool, stub_latency: float):
+    """Seed data_dir and point every service at it (before the app is imported)"""
+    json_file = os.path.join(data_dir, 'familiars.json')
+    write_dataset(json_file, count, images=images)
+
+    _, stub_url = start_stub(latency=stub_latency, image_size=256)
+    os.environ.update({
+        'DATA_DIR': data_dir,
+        'STORAGE_BACKEND': backend,
+        'GEMINI_BASE_URL': stub_url,
+        'API_KEY': 'stub',
+    })
+    if backend == 'sqlite':
+        from services.sqlite_storage import migrate_json_to_sqlite
+        migrate_json_to_sqlite(json_file, os.path.join(data_dir, 'familiars.db'))
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the app on synthetic data for load tests')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=0, help='0 picks a free port')
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('--backend', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--images', action='store_true', help='Records with inline base64 images')
+    parser.add_argument('--stub-latency', type=float, default=0.05, help='Gemini stub latency in seconds')
+    args = parser.parse_args()
+
+    # Terminate like Ctrl-C so the temporary data directory is cleaned up
+    signal.signal(signal.SIGTERM, _interrupt)
+    data_dir = tempfile.mkdtemp(prefix='bench-server-')
+    try:
+        configure(data_dir, args.count, args.backend, args.images, args.stub_latency)
+
+        from werkzeug.serving import make_server
+        from app import create_app
+
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)  # no per-request log lines
+        server = make_server(args.host, args.port, create_app(), threaded=True)
+        print(f"READY http://{args.host}:{server.server_port}", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Synthetic Familiars - Deterministic datasets for benchmarks
+
+Generates familiars with the same shape as real records. With
+`images=True` both image fields hold inline base64 PNG data URIs (like
+records saved before the blob store existed); otherwise they are short
+/media/-style URLs.
+
+Usage:
+    python -m benchmarks.synthetic --count 10000 --out /tmp/familiars.json
+    python -m benchmarks.synthetic --count 1000 --images --image-size 64 --out /tmp/familiars.json
+"""
+
+import io
+import os
+import sys
+import json
+import base64
+import random
+import hashlib
+import argparse
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SPECIES = ['Owl', 'Fox', 'Raven', 'Cat', 'Toad', 'Dragonling', 'Moth', 'Hare', 'Newt']
+ITEMS = ['Old Watch', 'Charcoal', 'Feather', 'Crystal', 'Rock', 'Teacup', 'Key', 'Candle']
+SYLLABLES = ['neb', 'ul', 'a', 'cin', 'der', 'whis', 'per', 'glim', 'mer', 'moss', 'um', 'bra']
+USERS = ['local_user'] + [f'user_{i}' for i in range(50)]
+START_TIME = 1700000000000
+
+
+def _image_data_uri(rng: random.Random, size: int) -> str:
+    """A small random sticker as a PNG data URI"""
+    img = Image.new('RGB', (size, size), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    color = tuple(rng.randint(30, 200) for _ in range(3))
+    draw.ellipse((size * 0.2, size * 0.2, size * 0.8, size * 0.9), fill=color)
+    for _ in range(size // 8):
+        x, y = rng.randrange(size), rng.randrange(size)
+        draw.point((x, y), fill=tuple(rng.randint(0, 255) for _ in range(3)))
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def make_familiar(index: int, rng: random.Random, images: bool = False, image_size: int = 64) -> dict:
+    likes = rng.randint(0, 500)
+    dislikes = rng.randint(0, likes // 2 + 1)
+    name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+    if images:
+        original = _image_data_uri(rng, image_size)
+        generated = _image_data_uri(rng, image_size)
+    else:
+        digest = hashlib.sha256(f'{index}'.encode('ascii')).hexdigest()
+        original = f'/media/{digest}.jpg'
+        generated = f'/media/{digest[::-1]}.png'
+    return {
+        'id': f'bench{index:07d}',
+        'user_id': rng.choice(USERS),
+        'original_image': original,
+        'generated_image': generated,
+        'animal_name': name,
+        'animal_species': rng.choice(SPECIES),
+        'original_item_name': rng.choice(ITEMS),
+        'magic_power': likes - dislikes,
+        'created_time': START_TIME + index * 60000,
+        'likes': likes,
+        'dislikes': dislikes,
+        'lane': rng.randint(0, 4),
+        'speed': round(10 + rng.random() * 20, 2),
+        'is_main': False,
+    }
+
+
+def generate(count: int, seed: int = 0, images: bool = False, image_size: int = 64) -> list:
+    """`count` familiars, newest first like the storage file"""
+    rng = random.Random(seed)
+    familiars = [make_familiar(i, rng, images, image_size) for i in range(count)]
+    familiars.reverse()
+    return familiars
+
+
+def write_dataset(path: str, count: int, seed: int = 0, images: bool = False, image_size: int = 64) -> int:
+    """Write a familiars.json file; returns its size in bytes"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(generate(count, seed, images, image_size), f)
+    return os.path.getsize(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic familiars.json')
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--images', action='store_true', help='Inline base64 images')
+    parser.add_argument('--image-size', type=int, default=64, help='Inline image size in px')
+    parser.add_argument('--out', required=True)
+    args = parser.parse_args()
+
+    size = write_dataset(args.out, args.count, args.seed, args.images, args.image_size)
+    print(f"Wrote {args.count} familiars ({size / 1024 / 1024:.1f} MB) to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
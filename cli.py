@@ -0,0 +1,172 @@
+"""
+CLI Commands - Maintenance commands for the Flask CLI
+
+Usage:
+    flask --app app storage migrate-sqlite
+    flask --app app storage externalize-images
+    flask --app app storage backfill-thumbnails [--fetch-external]
+    flask --app app storage export familiars.ndjson.gz
+    flask --app app storage import familiars.ndjson.gz [--replace]
+    flask --app app storage assign-lanes
+    flask --app app storage hash-images [--all]
+    flask --app app storage gc-blobs [--min-age-hours 24] [--dry-run]
+    flask --app app assets build
+"""
+
+import click
+from flask.cli import AppGroup
+
+from services import storage_service
+
+storage_cli = AppGroup('storage', help='Storage maintenance commands')
+assets_cli = AppGroup('assets', help='Front-end asset commands')
+
+
+@storage_cli.command('migrate-sqlite')
+@click.option('--json-file', default=storage_service.STORAGE_FILE, show_default=True,
+              help='Source familiars.json file')
+@click.option('--db-file', default=storage_service.SQLITE_FILE, show_default=True,
+              help='Target SQLite database')
+@click.option('--replace', is_flag=True, help='Empty the database before importing')
+def migrate_sqlite(json_file, db_file, replace):
+    """Import familiars.json into the SQLite backend"""
+    from services.sqlite_storage import migrate_json_to_sqlite
+
+    count = migrate_json_to_sqlite(json_file, db_file, replace=replace)
+    click.echo(f"Migrated {count} familiars into {db_file}")
+    click.echo("Set STORAGE_BACKEND=sqlite to use it.")
+
+
+@storage_cli.command('externalize-images')
+def externalize_images_command():
+    """Move inline base64 images of existing familiars into the blob store"""
+    from services.blob_store import externalize_images, IMAGE_FIELDS
+
+    operations = []
+    for familiar in storage_service.get_familiars():
+        # Cached records are shared and read-only; externalize a copy
+        externalized = externalize_images(dict(familiar))
+        updates = {field: externalized[field] for field in IMAGE_FIELDS
+                   if field in externalized and externalized[field] != familiar[field]}
+        if updates:
+            operations.append(('update', familiar['id'], updates))
+    storage_service.apply_batch(operations)
+    click.echo(f"Externalized images of {len(operations)} familiars")
+
+
+@storage_cli.command('backfill-thumbnails')
+@click.option('--fetch-external', is_flag=True,
+              help='Also copy images held at remote URLs into the blob store')
+def backfill_thumbnails_command(fetch_external):
+    """Give older familiars thumbnails: move their images into the blob store and render them"""
+    import io
+    from PIL import Image
+    from services.blob_store import externalize_images, put_bytes, IMAGE_FIELDS
+    from services.gemini_service import load_image_bytes
+    from services.thumbnail_service import create_thumbnails
+
+    operations = []
+    for familiar in storage_service.get_familiars():
+        # Cached records are shared and read-only; work on a copy
+        updated = externalize_images(dict(familiar))
+        for field in IMAGE_FIELDS:
+            url = updated.get(field)
+            if not (fetch_external and isinstance(url, str) and url.startswith(('http://', 'https://'))):
+                continue
+            try:
+                data = load_image_bytes(url)
+                with Image.open(io.BytesIO(data)) as img:
+                    mime_type = Image.MIME.get(img.format)
+                updated[field] = put_bytes(data, mime_type)
+            except Exception as e:
+                click.echo(f"Skipped {field} of {familiar['id']}: {e}", err=True)
+        create_thumbnails(updated)
+        updates = {field: updated[field] for field in IMAGE_FIELDS
+                   if field in updated and updated[field] != familiar[field]}
+        if updates:
+            operations.append(('update', familiar['id'], updates))
+    storage_service.apply_batch(operations)
+    click.echo(f"Moved images of {len(operations)} familiars into the blob store and rendered thumbnails")
+
+
+@storage_cli.command('export')
+@click.argument('path', default='-')
+def export_command(path):
+    """Write all familiars as NDJSON to PATH (.gz compresses; '-' is stdout)"""
+    from services.bulk_io import export_ndjson, open_ndjson
+
+    if path == '-':
+        count = export_ndjson(click.get_text_stream('stdout'))
+    else:
+        with open_ndjson(path, 'w') as f:
+            count = export_ndjson(f)
+    click.echo(f"Exported {count} familiars", err=True)
+
+
+@storage_cli.command('import')
+@click.argument('path')
+@click.option('--replace', is_flag=True, help='Delete familiars that are not in the file')
+def import_command(path, replace):
+    """Upsert familiars from an NDJSON file (.gz is decompressed) in one write"""
+    from services.bulk_io import import_ndjson, open_ndjson, InvalidRecord
+
+    try:
+        with open_ndjson(path, 'r') as f:
+            count = import_ndjson(f, replace=replace)
+    except InvalidRecord as e:
+        raise click.ClickException(f"{e} (nothing was imported)")
+    click.echo(f"Imported {count} familiars")
+
+
+@storage_cli.command('assign-lanes')
+def assign_lanes_command():
+    """Persist balanced forest lanes (and speeds) for familiars stored without them"""
+    from services.forest_service import assign_flight
+
+    missing = [f for f in storage_service.get_familiars() if 'lane' not in f or 'speed' not in f]
+    # Oldest first, so lanes alternate along the timeline
+    missing.sort(key=lambda f: f.get('created_time', 0))
+    assign_flight(missing)
+    click.echo(f"Assigned lanes to {len(missing)} familiars")
+
+
+@storage_cli.command('hash-images')
+@click.option('--all', 'rehash', is_flag=True, help='Also rehash familiars that already have hashes')
+def hash_images_command(rehash):
+    """Store perceptual image hashes for familiars saved without them"""
+    from services.image_hash import image_hashes
+
+    operations = [('update', f['id'], {'image_hashes': image_hashes(f)})
+                  for f in storage_service.get_familiars() if rehash or 'image_hashes' not in f]
+    storage_service.apply_batch(operations)
+    click.echo(f"Hashed images of {len(operations)} familiars")
+
+
+@storage_cli.command('gc-blobs')
+@click.option('--min-age-hours', default=24.0, show_default=True,
+              help='Keep unreferenced blobs younger than this (saves in progress, unsaved generations)')
+@click.option('--dry-run', is_flag=True, help='Only report what would be deleted')
+def gc_blobs_command(min_age_hours, dry_run):
+    """Delete blobs (and their thumbnails) that no familiar references"""
+    from services.blob_store import collect_garbage, digest_of, IMAGE_FIELDS
+    from services.thumbnail_service import remove_thumbnails
+
+    referenced = {digest_of(f.get(field)) for f in storage_service.export_familiars()
+                  for field in IMAGE_FIELDS}
+    removed = collect_garbage(referenced, min_age_hours * 3600, dry_run=dry_run)
+    if not dry_run:
+        for digest in removed:
+            remove_thumbnails(digest)
+    click.echo(f"{'Would delete' if dry_run else 'Deleted'} {len(removed)} unreferenced blobs")
+
+
+@assets_cli.command('build')
+def build_assets_command():
+    """Build fingerprinted, compressed and resized assets into static/dist"""
+    from services.static_assets import build_assets, DIST_DIR, brotli
+
+    manifest = build_assets()
+    variants = sum(len(entry.get('variants', [])) for entry in manifest.values())
+    click.echo(f"Built {len(manifest)} assets ({variants} image variants) into {DIST_DIR}")
+    if brotli is None:
+        click.echo("Install the 'brotli' package to also build .br files.")
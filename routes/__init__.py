@@ -5,5 +5,10 @@ Routes package - API endpoint handlers
 from .main_routes import main_bp
 from .analysis_routes import analysis_bp
 from .familiar_routes import familiar_bp
+from .media_routes import media_bp
+from .job_routes import jobs_bp
+from .asset_routes import assets_bp
+from .metrics_routes import metrics_bp, install_timing
 
-__all__ = ['main_bp', 'analysis_bp', 'familiar_bp']
+__all__ = ['main_bp', 'analysis_bp', 'familiar_bp', 'media_bp', 'jobs_bp', 'assets_bp', 'metrics_bp',
+           'install_timing']
@@ -2,23 +2,49 @@
 Analysis Routes - Image analysis and generation endpoints
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, url_for
+from werkzeug.exceptions import RequestEntityTooLarge
 import os
 import base64
 
 from services.gemini_service import (
     analyze_object_and_suggest_names,
     generate_familiar_image,
-    remove_white_background
+    remove_white_background,
+    admission_stats
 )
+from services.admission import Overloaded
+from services.asset_pipeline import create_familiar_asset
+from services.analysis_cache import analysis_cache
+from services.image_ingest import read_upload, normalize_for_analysis, UploadTooLarge, InvalidImage
+from services.image_cache import image_cache
+from services.similarity_service import find_near_duplicate
+from services.thumbnail_service import with_thumbnails
+from services.job_service import job_queue, QueueFull
 
 analysis_bp = Blueprint('analysis', __name__, url_prefix='/api')
 API_KEY = os.environ.get('API_KEY', '')
 
 
+def _cutout_params(data: dict, threshold: int, tolerance: int) -> tuple:
+    """(threshold, tolerance) for background removal from a request body; ValueError if invalid"""
+    values = []
+    for name, default in (('threshold', threshold), ('tolerance', tolerance)):
+        value = data.get(name, default)
+        if not isinstance(value, int) or isinstance(value, bool) or not 0 <= value <= 255:
+            raise ValueError(f'{name} must be an integer between 0 and 255')
+        values.append(value)
+    return tuple(values)
+
+
 @analysis_bp.route('/analyze', methods=['POST'])
 def analyze():
-    """Analyze uploaded image and suggest familiar names"""
+    """
+    Analyze uploaded image and suggest familiar names. If the upload is a
+    near-duplicate of an existing familiar's original image, the result
+    also has `reuse: {distance, familiar}` so the workshop can offer that
+    familiar's assets instead of generating new ones.
+    """
     try:
         if 'image' not in request.files:
             return jsonify({'error': 'No image provided'}), 400
@@ -27,12 +53,23 @@ def analyze():
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        image_data = file.read()
+        # Capped streaming read, then a downscaled compact copy for Gemini (and its hash)
+        image_data = read_upload(file.stream)
+        mime_type, image_data, upload_hash = normalize_for_analysis(image_data)
         base64_image = base64.b64encode(image_data).decode('utf-8')
         
-        result = analyze_object_and_suggest_names(base64_image, API_KEY)
+        result = analyze_object_and_suggest_names(base64_image, API_KEY, mime_type)
+        reuse = _reuse_offer(upload_hash)
+        if reuse is not None:
+            result = {**result, 'reuse': reuse}
         return jsonify(result)
     
+    except Overloaded as e:
+        return _overloaded(e)
+    except (UploadTooLarge, RequestEntityTooLarge) as e:
+        return jsonify({'error': str(e)}), 413
+    except InvalidImage as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Analysis error: {e}")
         return jsonify({
@@ -43,7 +80,63 @@ def analyze():
         })
 
 
+def _overloaded(e: Overloaded):
+    """429 for a Gemini call refused by admission control"""
+    return jsonify({'error': 'The spirits are busy, try again shortly', 'detail': str(e)}), 429, \
+        {'Retry-After': str(e.retry_after)}
+
+
+def _reuse_offer(upload_hash):
+    """The closest familiar whose original image nearly matches an upload, or None"""
+    if upload_hash is None:
+        return None
+    try:
+        duplicate = find_near_duplicate(upload_hash)
+    except Exception as e:
+        print(f"Similarity lookup error: {e}")
+        return None
+    if duplicate is None:
+        return None
+    distance, familiar = duplicate
+    return {'distance': distance, 'familiar': with_thumbnails(familiar)}
+
+
+@analysis_bp.route('/analyze/stats', methods=['GET'])
+def analyze_stats():
+    """Hit ratio, size and evictions of the analysis result cache, and Gemini admission"""
+    return jsonify({**analysis_cache.stats(), 'admission': admission_stats()['analysis']})
+
+
 @analysis_bp.route('/generate', methods=['POST'])
+def start_generation():
+    """
+    Start the generation pipeline (generate -> remove background -> store ->
+    thumbnails) in the background; returns a job id at once. The job
+    result is {'imageUrl': '/media/...png', 'thumbnails': {size: url}}.
+    """
+    data = request.json or {}
+    species = data.get('species', 'creature')
+    description = data.get('description', 'A magical familiar')
+    thumbnails = bool(data.get('thumbnails', True))
+    try:
+        threshold, tolerance = _cutout_params(data, 235, 35)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        job = job_queue.submit('generate', create_familiar_asset, species, description, API_KEY,
+                               threshold, tolerance, thumbnails)
+    except QueueFull:
+        return jsonify({'error': 'Too many generations in progress, try again shortly'}), 503, {'Retry-After': '5'}
+    
+    return jsonify({
+        'jobId': job['id'],
+        'status': job['status'],
+        'statusUrl': url_for('jobs.get_job', job_id=job['id']),
+        'eventsUrl': url_for('jobs.job_events', job_id=job['id'])
+    }), 202
+
+
 @analysis_bp.route('/generate-image', methods=['POST'])
 def generate_image():
     """Generate familiar image using AI"""
@@ -55,22 +148,32 @@ def generate_image():
         image_url = generate_familiar_image(species, description, API_KEY)
         return jsonify({'imageUrl': image_url})
     
+    except Overloaded as e:
+        return _overloaded(e)
     except Exception as e:
         print(f"Image generation error: {e}")
         return jsonify({'imageUrl': f'https://picsum.photos/seed/{species}/512/512'})
 
 
+@analysis_bp.route('/generate/stats', methods=['GET'])
+def generate_stats():
+    """Hit ratio, size and evictions of the generated image cache, and Gemini admission"""
+    return jsonify({**image_cache.stats(), 'admission': admission_stats()['image']})
+
+
 @analysis_bp.route('/remove-background', methods=['POST'])
 def remove_bg():
     """Remove white background from image and return transparent PNG"""
     try:
         data = request.json
         image_url = data.get('imageUrl', '')
-        threshold = data.get('threshold', 240)
-        tolerance = data.get('tolerance', 30)
         
         if not image_url:
             return jsonify({'error': 'No image URL provided'}), 400
+        try:
+            threshold, tolerance = _cutout_params(data, 240, 30)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         result_url = remove_white_background(image_url, threshold, tolerance)
         return jsonify({'imageUrl': result_url})
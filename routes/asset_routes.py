@@ -0,0 +1,33 @@
+"""
+Asset Routes - Serve fingerprinted build output from static/dist
+"""
+
+import mimetypes
+from flask import Blueprint, request, send_file, abort
+
+from services.static_assets import resolve_asset
+from routes.media_routes import IMMUTABLE_CACHE_CONTROL
+
+assets_bp = Blueprint('assets', __name__, url_prefix='/assets')
+
+
+@assets_bp.route('/<path:name>', methods=['GET'])
+def serve(name):
+    """Serve a built asset, pre-compressed when the client accepts it"""
+    found = resolve_asset(name)
+    if found is None:
+        abort(404)
+
+    path, encodings = found
+    mime_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    encoding = next((e for e in encodings if e in request.accept_encodings), None)
+    suffix = {'br': '.br', 'gzip': '.gz'}.get(encoding, '')
+
+    response = send_file(path + suffix, mimetype=mime_type, conditional=True,
+                         etag=f"{name}{suffix}")
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if encodings:
+        response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
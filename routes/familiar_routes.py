@@ -2,83 +2,436 @@
 Familiar Routes - CRUD operations and interactions for familiars
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.wsgi import get_input_stream
+import io
+import os
+import gzip
+import json
 import time
 import random
 
 from services.storage_service import (
-    get_familiars, save_familiar, update_familiar, delete_familiar,
-    get_user_familiars, get_leaderboard, get_forest_familiars
+    get_familiars, get_familiar, save_familiar, delete_familiar,
+    get_user_familiars, get_leaderboard, get_forest_familiars, storage_stats,
+    tally_votes, fill_flight_defaults, get_rank, get_changes, get_change_seq,
+    export_familiars, transaction, CURRENT_USER_ID
 )
+from services.bulk_io import import_ndjson, InvalidRecord
+from services.forest_service import forest_window, lane_allocator, FOREST_WINDOW_SIZE, FOREST_MAX_WINDOW
+from services.blob_store import externalize_images, IMAGE_FIELDS
+from services.image_hash import add_image_hashes, image_hashes
+from services.similarity_service import similar_familiars, SIMILAR_DISTANCE, SIMILAR_MAX_DISTANCE
+from services.thumbnail_service import create_thumbnails, with_thumbnails
+from services.vote_buffer import VoteBuffer
+from routes.listing import list_familiars, parse_listing_args, project, MAX_PAGE_SIZE
+from routes.http_cache import conditional
+from routes.json_stream import stream_json_array, stream_ndjson
 
 familiar_bp = Blueprint('familiar', __name__, url_prefix='/api/familiars')
 
+# Optional write-behind buffering of likes/dislikes
+vote_buffer = None
+if os.environ.get('VOTE_WRITE_BEHIND', '').lower() in ('1', 'true', 'yes'):
+    vote_buffer = VoteBuffer(
+        interval=float(os.environ.get('VOTE_FLUSH_INTERVAL', '1.0')),
+        max_pending=int(os.environ.get('VOTE_FLUSH_THRESHOLD', '100'))
+    ).start()
+
+# Change stream: storage is polled for a new seq this often, and a stream
+# is closed after CHANGE_STREAM_TIMEOUT (EventSource reconnects by itself)
+CHANGE_POLL_INTERVAL = float(os.environ.get('CHANGE_POLL_INTERVAL', '1.0'))
+CHANGE_STREAM_TIMEOUT = 300
+KEEPALIVE_INTERVAL = 15
+
+# Bulk endpoints: request size cap for NDJSON imports, operations per batch
+IMPORT_MAX_MB = float(os.environ.get('IMPORT_MAX_MB', '1024'))
+BATCH_MAX_OPERATIONS = int(os.environ.get('BATCH_MAX_OPERATIONS', '1000'))
+
 
 # ============ Read Operations ============
 
 @familiar_bp.route('', methods=['GET'])
+@conditional('familiars')
 def get_all():
     """Get all familiars"""
-    return jsonify(get_familiars())
+    return list_familiars(get_familiars, order='newest')
 
 
 @familiar_bp.route('/forest', methods=['GET'])
+@conditional('forest')
 def get_forest():
     """Get familiars for forest view"""
-    return jsonify(get_forest_familiars())
+    return list_familiars(get_forest_familiars, order='newest', prepare=fill_flight_defaults)
+
+
+@familiar_bp.route('/forest/window', methods=['GET'])
+@conditional('forest_window')
+def get_forest_window():
+    """
+    At most ?size= familiars for the forest (default FOREST_WINDOW_SIZE),
+    sampled by recency and magic power. The same ?seed= gets the same
+    window until the familiars change.
+    """
+    try:
+        size = int(request.args.get('size', FOREST_WINDOW_SIZE))
+        seed = int(request.args.get('seed', 0))
+        if not 1 <= size <= FOREST_MAX_WINDOW:
+            raise ValueError(f'size must be between 1 and {FOREST_MAX_WINDOW}')
+        if seed < 0:
+            raise ValueError('seed must be a non-negative integer')
+        fields = parse_listing_args(request.args)['fields']
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    headers = {'X-Change-Seq': str(get_change_seq())}
+    return stream_json_array(forest_window(size, seed), lambda f: project(with_thumbnails(f), fields),
+                             headers=headers)
 
 
 @familiar_bp.route('/user', methods=['GET'])
+@conditional('user')
 def get_user():
     """Get current user's familiars"""
-    return jsonify(get_user_familiars())
+    return list_familiars(get_user_familiars, order='newest', user_id=CURRENT_USER_ID)
 
 
 @familiar_bp.route('/leaderboard', methods=['GET'])
+@conditional('leaderboard')
 def get_rankings():
-    """Get leaderboard rankings"""
-    return jsonify(get_leaderboard())
+    """Get leaderboard rankings (top N with ?limit=N)"""
+    return list_familiars(get_leaderboard, order='magic_power')
+
+
+@familiar_bp.route('/<familiar_id>/rank', methods=['GET'])
+@conditional('rank')
+def get_familiar_rank(familiar_id):
+    """Get a familiar's leaderboard position"""
+    ranking = get_rank(familiar_id)
+    if ranking is None:
+        return jsonify({'error': 'Familiar not found'}), 404
+    rank, total = ranking
+    return jsonify({'id': familiar_id, 'rank': rank, 'total': total})
+
+
+@familiar_bp.route('/<familiar_id>/similar', methods=['GET'])
+@conditional('similar')
+def get_similar(familiar_id):
+    """
+    Familiars whose ?field= image (generated_image or original_image) is
+    within Hamming ?distance= of this familiar's, closest first, each with
+    its `distance`. At most ?limit= (default 20).
+    """
+    try:
+        field = request.args.get('field', 'generated_image')
+        if field not in IMAGE_FIELDS:
+            raise ValueError(f"field must be one of {', '.join(IMAGE_FIELDS)}")
+        distance = int(request.args.get('distance', SIMILAR_DISTANCE))
+        if not 0 <= distance <= SIMILAR_MAX_DISTANCE:
+            raise ValueError(f'distance must be between 0 and {SIMILAR_MAX_DISTANCE}')
+        listing = parse_listing_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    found = similar_familiars(familiar_id, field, distance, listing['limit'] or 20)
+    if found is None:
+        return jsonify({'error': 'Familiar not found'}), 404
+    return jsonify({
+        'id': familiar_id,
+        'field': field,
+        'similar': [{**project(with_thumbnails(f), listing['fields']), 'distance': d}
+                    for d, f in found]
+    })
+
+
+def _change_feed(since: int, fields) -> dict:
+    """get_changes() with familiars rendered like the list endpoints"""
+    feed = get_changes(since, MAX_PAGE_SIZE)
+    for change in feed['changes']:
+        if 'familiar' in change:
+            change['familiar'] = project(with_thumbnails(change['familiar']), fields)
+    return feed
+
+
+def _since_arg(value) -> int:
+    try:
+        since = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('since must be a non-negative integer')
+    if since < 0:
+        raise ValueError('since must be a non-negative integer')
+    return since
+
+
+@familiar_bp.route('/changes', methods=['GET'])
+@conditional('changes')
+def get_changes_since():
+    """
+    Familiars created, updated or deleted after ?since=<seq> (from
+    X-Change-Seq or a previous response). With `reset: true` the client
+    must reload the full list; with `more: true` it should ask again.
+    """
+    try:
+        since = _since_arg(request.args.get('since'))
+        fields = parse_listing_args(request.args)['fields']
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(_change_feed(since, fields))
+
+
+@familiar_bp.route('/changes/stream', methods=['GET'])
+def stream_changes():
+    """
+    Server-sent events with the same payload as /changes, one event per
+    batch of changes. The event id is the seq, so a reconnecting
+    EventSource resumes from its Last-Event-ID.
+    """
+    try:
+        since = _since_arg(request.headers.get('Last-Event-ID') or request.args.get('since'))
+        fields = parse_listing_args(request.args)['fields']
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def stream(since):
+        stop_at = time.monotonic() + CHANGE_STREAM_TIMEOUT
+        last_sent = time.monotonic()
+        yield f"retry: {int(CHANGE_POLL_INTERVAL * 1000)}\n\n"
+        while time.monotonic() < stop_at:
+            if get_change_seq() != since:
+                feed = _change_feed(since, fields)
+                since = feed['seq']
+                last_sent = time.monotonic()
+                yield f"id: {since}\ndata: {json.dumps(feed)}\n\n"
+                if feed['more']:
+                    continue
+            elif time.monotonic() - last_sent >= KEEPALIVE_INTERVAL:
+                last_sent = time.monotonic()
+                yield ": keep-alive\n\n"
+            time.sleep(CHANGE_POLL_INTERVAL)
+
+    return Response(stream_with_context(stream(since)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@familiar_bp.route('/stats', methods=['GET'])
+def get_stats():
+    """Storage backend and cache statistics"""
+    stats = storage_stats()
+    if vote_buffer is not None:
+        stats['vote_buffer'] = vote_buffer.stats()
+    return jsonify(stats)
+
+
+@familiar_bp.route('/export', methods=['GET'])
+@conditional('export')
+def export():
+    """All familiars as NDJSON (one record per line, newest first), streamed"""
+    filename = f"familiars-{time.strftime('%Y%m%d-%H%M%S')}.ndjson"
+    return stream_ndjson(export_familiars(), headers={
+        'Content-Disposition': f'attachment; filename="{filename}"'})
 
 
 # ============ Create Operation ============
 
+def _new_familiar(data: dict, lane: int) -> dict:
+    """A new familiar of the current user from request data"""
+    now = int(time.time() * 1000)
+    return {
+        'id': str(now),
+        'user_id': 'local_user',
+        'original_image': data.get('original_image', ''),
+        'generated_image': data.get('generated_image', ''),
+        'animal_name': data.get('animal_name', 'Unknown'),
+        'animal_species': data.get('animal_species', 'Unknown'),
+        'original_item_name': data.get('original_item_name', 'Unknown'),
+        'magic_power': 0,
+        'created_time': now,
+        'likes': 0,
+        'dislikes': 0,
+        'lane': lane,
+        'speed': 10 + random.random() * 20,
+        'is_main': False
+    }
+
+
 @familiar_bp.route('', methods=['POST'])
 def create():
     """Save a new familiar"""
     try:
-        data = request.json
-        familiar = {
-            'id': str(int(time.time() * 1000)),
-            'user_id': 'local_user',
-            'original_image': data.get('original_image', ''),
-            'generated_image': data.get('generated_image', ''),
-            'animal_name': data.get('animal_name', 'Unknown'),
-            'animal_species': data.get('animal_species', 'Unknown'),
-            'original_item_name': data.get('original_item_name', 'Unknown'),
-            'magic_power': 0,
-            'created_time': int(time.time() * 1000),
-            'likes': 0,
-            'dislikes': 0,
-            'lane': random.randint(0, 4),
-            'speed': 10 + random.random() * 20,
-            'is_main': False
-        }
+        familiar = _new_familiar(request.json, lane_allocator().next())
+        # Images go to the blob store; the record keeps only their URLs
+        externalize_images(familiar)
+        create_thumbnails(familiar)
+        add_image_hashes(familiar)
         save_familiar(familiar)
-        return jsonify({'success': True, 'familiar': familiar})
+        return jsonify({'success': True, 'familiar': with_thumbnails(familiar)})
     
     except Exception as e:
         print(f"Save error: {e}")
         return jsonify({'error': str(e)}), 500
 
 
+class _CappedStream(io.RawIOBase):
+    """Request body reader that raises RequestEntityTooLarge past `limit` bytes"""
+
+    def __init__(self, stream, limit: int):
+        self.stream = stream
+        self.limit = limit
+        self.consumed = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.stream.read(min(len(buffer), self.limit - self.consumed + 1))
+        self.consumed += len(data)
+        if self.consumed > self.limit:
+            raise RequestEntityTooLarge(f"Import is larger than {IMPORT_MAX_MB:g} MB")
+        buffer[:len(data)] = data
+        return len(data)
+
+
+@familiar_bp.route('/import', methods=['POST'])
+def import_familiars():
+    """
+    Bulk upsert familiars from an NDJSON body (gzip with Content-Encoding:
+    gzip), parsed line by line and saved in one write. ?mode=replace
+    deletes every familiar that is not in the body.
+    """
+    mode = request.args.get('mode', 'upsert')
+    if mode not in ('upsert', 'replace'):
+        return jsonify({'error': "mode must be 'upsert' or 'replace'"}), 400
+    limit = int(IMPORT_MAX_MB * 1024 * 1024)
+    if (request.content_length or 0) > limit:
+        return jsonify({'error': f"Import is larger than {IMPORT_MAX_MB:g} MB"}), 413
+    try:
+        # The raw input stream: request.stream may be capped at MAX_REQUEST_MB
+        body = io.BufferedReader(_CappedStream(get_input_stream(request.environ), limit))
+        if request.headers.get('Content-Encoding', '').lower() == 'gzip':
+            body = gzip.GzipFile(fileobj=body, mode='rb')
+        count = import_ndjson(body, replace=(mode == 'replace'))
+        return jsonify({'success': True, 'imported': count})
+    except InvalidRecord as e:
+        return jsonify({'error': str(e), 'line': e.line_number}), 400
+    except RequestEntityTooLarge as e:
+        return jsonify({'error': e.description}), 413
+    except Exception as e:
+        print(f"Import error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+def _batch_operation(index: int, item, lanes) -> tuple:
+    """Validate one batch entry and turn it into an (op, id, payload) operation"""
+    if not isinstance(item, dict):
+        raise ValueError(f"Operation {index}: expected an object")
+    op = item.get('op')
+    if op == 'create':
+        data = item.get('familiar') or {}
+        if not isinstance(data, dict):
+            raise ValueError(f"Operation {index}: 'familiar' must be an object")
+        # Unique within the batch even when created in the same millisecond
+        familiar = _new_familiar(data, lanes.next())
+        familiar['id'] = f"{familiar['id']}-{index}"
+        return op, familiar['id'], familiar
+    familiar_id = item.get('id')
+    if not isinstance(familiar_id, str) or not familiar_id:
+        raise ValueError(f"Operation {index}: 'id' is required")
+    if op == 'update':
+        updates = item.get('updates')
+        if not isinstance(updates, dict):
+            raise ValueError(f"Operation {index}: 'updates' must be an object")
+        return op, familiar_id, updates
+    if op == 'vote':
+        return op, familiar_id, (1, 0) if item.get('value', 1) > 0 else (0, 1)
+    if op == 'delete':
+        return op, familiar_id, None
+    raise ValueError(f"Operation {index}: unknown op {op!r}")
+
+
+def _store_batch_images(op: str, payload):
+    """Move a validated operation's images to the blob store; returns an update's image hashes"""
+    if op == 'create':
+        create_thumbnails(externalize_images(payload))
+        add_image_hashes(payload)
+    elif op == 'update':
+        return image_hashes(externalize_images(payload))
+    return None
+
+
+@familiar_bp.route('/batch', methods=['POST'])
+def batch():
+    """
+    Apply many operations in one storage transaction. Body:
+    {"operations": [{"op": "create", "familiar": {...}},
+                    {"op": "update", "id": ..., "updates": {...}},
+                    {"op": "vote", "id": ..., "value": 1 | -1},
+                    {"op": "delete", "id": ...}]}
+    Invalid input rejects the whole batch; ops on missing familiars are
+    reported as not_found and the rest still apply.
+    """
+    try:
+        items = (request.get_json(silent=True) or {}).get('operations')
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': "'operations' must be a non-empty list"}), 400
+        if len(items) > BATCH_MAX_OPERATIONS:
+            return jsonify({'error': f"At most {BATCH_MAX_OPERATIONS} operations per batch"}), 400
+        try:
+            lanes = lane_allocator()
+            operations = [_batch_operation(i, item, lanes) for i, item in enumerate(items)]
+        except (ValueError, TypeError) as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Blobs are written only once the whole batch is valid, and images
+        # are decoded and hashed before the storage lock is taken. If the
+        # transaction then fails, `storage gc-blobs` collects the blobs.
+        hashes = [_store_batch_images(op, payload) for op, _, payload in operations]
+        with transaction() as tx:
+            written = []
+            for (op, familiar_id, payload), update_hashes in zip(operations, hashes):
+                if op == 'update':
+                    current = tx.get(familiar_id)
+                    if current is not None:
+                        payload = _with_image_hashes(current, payload, update_hashes)
+                written.append(tx.apply(op, familiar_id, payload))
+
+        results = []
+        for (op, familiar_id, _), familiar in zip(operations, written):
+            result = {'op': op, 'id': familiar_id, 'status': 'ok'}
+            if familiar is None:
+                result['status'] = 'exists' if op == 'create' else 'not_found'
+            elif op != 'delete':
+                result['familiar'] = with_thumbnails(familiar)
+            results.append(result)
+        return jsonify({'success': True, 'results': results})
+    except Exception as e:
+        print(f"Batch error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
 # ============ Update Operations ============
 
+def _with_image_hashes(current: dict, updates: dict, hashes: dict) -> dict:
+    """Updates plus the familiar's image hashes, with those of replaced images swapped for `hashes`"""
+    changed = [field for field in IMAGE_FIELDS if field in updates]
+    if not changed:
+        return updates
+    merged = {field: value for field, value in (current.get('image_hashes') or {}).items()
+              if field not in changed}
+    merged.update(hashes)
+    return {**updates, 'image_hashes': merged}
+
+
 @familiar_bp.route('/<familiar_id>', methods=['PUT'])
 def update(familiar_id):
     """Update a familiar"""
     try:
-        data = request.json
-        update_familiar(familiar_id, data)
+        data = externalize_images(request.json)
+        # Images are decoded and hashed before the storage lock is taken
+        hashes = image_hashes(data)
+        with transaction() as tx:
+            current = tx.get(familiar_id)
+            if current is None:
+                return jsonify({'error': 'Familiar not found'}), 404
+            tx.update(familiar_id, _with_image_hashes(current, data, hashes))
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -90,47 +443,43 @@ def like(familiar_id):
     try:
         data = request.json
         value = data.get('value', 1)
+        likes, dislikes = (1, 0) if value > 0 else (0, 1)
         
-        familiars = get_familiars()
-        familiar = next((f for f in familiars if f['id'] == familiar_id), None)
+        if vote_buffer is not None:
+            # Write-behind: count the vote in memory, storage catches up on flush
+            familiar, (pending_likes, pending_dislikes) = vote_buffer.vote(
+                familiar_id, lambda: get_familiar(familiar_id), likes, dislikes)
+            if familiar is None:
+                return jsonify({'error': 'Familiar not found'}), 404
+            familiar = tally_votes(familiar, pending_likes, pending_dislikes)
+        else:
+            # likes/dislikes and magic_power = likes - dislikes in one write
+            with transaction() as tx:
+                familiar = tx.vote(familiar_id, likes, dislikes)
+            if familiar is None:
+                return jsonify({'error': 'Familiar not found'}), 404
         
-        if familiar:
-            # Update likes or dislikes count
-            if value > 0:
-                new_likes = familiar.get('likes', 0) + 1
-                update_familiar(familiar_id, {'likes': new_likes})
-            else:
-                new_dislikes = familiar.get('dislikes', 0) + 1
-                update_familiar(familiar_id, {'dislikes': new_dislikes})
-            
-            # Recalculate magic_power = likes - dislikes
-            updated_familiars = get_familiars()
-            updated_familiar = next((f for f in updated_familiars if f['id'] == familiar_id), None)
-            new_magic_power = updated_familiar.get('likes', 0) - updated_familiar.get('dislikes', 0)
-            update_familiar(familiar_id, {'magic_power': new_magic_power})
-            
-            return jsonify({
-                'success': True, 
-                'likes': updated_familiar.get('likes', 0),
-                'dislikes': updated_familiar.get('dislikes', 0),
-                'magic_power': new_magic_power
-            })
-        
-        return jsonify({'error': 'Familiar not found'}), 404
+        return jsonify({
+            'success': True, 
+            'likes': familiar.get('likes', 0),
+            'dislikes': familiar.get('dislikes', 0),
+            'magic_power': familiar.get('magic_power', 0)
+        })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @familiar_bp.route('/<familiar_id>/set-main', methods=['POST'])
 def set_main(familiar_id):
-    """Set a familiar as the main one"""
+    """Set a familiar as the main one (exactly one main familiar, in one write)"""
     try:
-        familiars = get_user_familiars()
-        for f in familiars:
-            if f.get('is_main'):
-                update_familiar(f['id'], {'is_main': False})
-        
-        update_familiar(familiar_id, {'is_main': True})
+        with transaction() as tx:
+            if tx.get(familiar_id) is None:
+                return jsonify({'error': 'Familiar not found'}), 404
+            for f in tx.by_user(CURRENT_USER_ID):
+                if f.get('is_main') and f['id'] != familiar_id:
+                    tx.update(f['id'], {'is_main': False})
+            tx.update(familiar_id, {'is_main': True})
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -0,0 +1,82 @@
+"""
+HTTP cache helpers - ETags and Cache-Control for read endpoints
+
+`conditional(name)` wraps a GET handler. The ETag is a hash of the
+storage validator, the endpoint, its view arguments and the query
+string, so it is computed with one stat/query and no records. A request
+whose If-None-Match matches gets a bare 304 before the handler runs.
+Compressed bodies get the tag plus their encoding (`<tag>-gzip`), and a
+304 is only sent for the tag of the encoding this request would get, so
+a client that stops accepting gzip never revalidates a gzip body.
+
+Cache-Control defaults to "no-cache" (always revalidate, which is cheap
+thanks to the ETag) and can be set per endpoint with
+CACHE_CONTROL_<NAME>, e.g. CACHE_CONTROL_LEADERBOARD="public, max-age=10".
+"""
+
+import os
+import hashlib
+from functools import wraps
+
+from flask import request, make_response
+
+from services.storage_service import storage_validator
+from routes.json_stream import negotiate_encoding
+
+DEFAULT_CACHE_CONTROL = {
+    'familiars': 'no-cache',
+    'forest': 'no-cache',
+    'forest_window': 'no-cache',
+    'user': 'private, no-cache',
+    'leaderboard': 'no-cache',
+    'rank': 'no-cache',
+    'similar': 'no-cache',
+    'changes': 'no-cache',
+    'export': 'private, no-cache',
+}
+
+
+def cache_control_for(name: str) -> str:
+    return os.environ.get(f'CACHE_CONTROL_{name.upper()}',
+                          DEFAULT_CACHE_CONTROL.get(name, 'no-cache'))
+
+
+def compute_etag(name: str) -> str:
+    """Strong ETag for the current request against the current storage state"""
+    query = '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True)))
+    view_args = '&'.join(f'{k}={v}' for k, v in sorted((request.view_args or {}).items()))
+    raw = '\n'.join((storage_validator(), name, view_args, query))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def conditional(name: str):
+    """Decorator adding ETag / If-None-Match / Cache-Control handling to a GET view"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Computed before the view runs: if storage changes meanwhile the
+            # response is labelled with the older tag and simply revalidates
+            etag = compute_etag(name)
+            cache_control = cache_control_for(name)
+
+            # Compressed representations get their own strong tags. Views that
+            # don't compress send the identity tag, which is valid for any request
+            encoding = negotiate_encoding(request.accept_encodings)
+            candidates = (etag, f'{etag}-{encoding}') if encoding else (etag,)
+            matched = next((tag for tag in candidates
+                            if request.if_none_match.contains_weak(tag)), None)
+            if matched is not None:
+                response = make_response('', 304)
+                response.set_etag(matched)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                encoding = response.headers.get('Content-Encoding')
+                response.set_etag(f'{etag}-{encoding}' if encoding else etag)
+
+            response.headers['Cache-Control'] = cache_control
+            response.vary.add('Accept-Encoding')
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,54 @@
+"""
+Job Routes - Status and live updates for background jobs
+"""
+
+from flask import Blueprint, Response, jsonify, stream_with_context
+import json
+import time
+
+from services.job_service import job_queue, FINISHED_STATES
+
+jobs_bp = Blueprint('jobs', __name__, url_prefix='/api/jobs')
+
+# How long one event stream stays open, and how often it sends keep-alives
+STREAM_TIMEOUT = 120
+KEEPALIVE_INTERVAL = 15
+
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get a job's status and, once done, its result"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found (unknown, or finished more than JOB_TTL seconds ago)'}), 404
+    return jsonify(job)
+
+
+@jobs_bp.route('/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-sent events with the job's state on every change, until it finishes"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found (unknown, or finished more than JOB_TTL seconds ago)'}), 404
+
+    def stream(job):
+        stop_at = time.monotonic() + STREAM_TIMEOUT
+        yield f"data: {json.dumps(job)}\n\n"
+        while job['status'] not in FINISHED_STATES and time.monotonic() < stop_at:
+            updated = job_queue.wait_for_change(job_id, job['revision'], KEEPALIVE_INTERVAL)
+            if updated is None:
+                break
+            if updated['revision'] == job['revision']:
+                yield ": keep-alive\n\n"
+                continue
+            job = updated
+            yield f"data: {json.dumps(job)}\n\n"
+
+    return Response(stream_with_context(stream(job)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@jobs_bp.route('/stats', methods=['GET'])
+def job_stats():
+    """Job counts by state, for the worker process that answers"""
+    return jsonify(job_queue.stats())
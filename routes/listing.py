@@ -0,0 +1,136 @@
+"""
+Listing helpers - Cursor pagination and field projection for list endpoints
+
+Query parameters understood by every /api/familiars list endpoint:
+- limit:  page size (1-500, default 50), or "all" for the whole list in one
+          response (no cursor)
+- after:  opaque cursor from the previous page's X-Next-Cursor header
+- fields: comma-separated fields to return, or "all". The default omits
+          original_image when it has a thumbnail, which is all list views
+          show of it; legacy records without one keep the image itself.
+
+Pages are plain JSON arrays, like the limit=all responses. When there is
+a next page its cursor is sent in the X-Next-Cursor header and a
+`Link: <...>; rel="next"` header.
+
+Every list response also carries X-Change-Seq, the change sequence read
+before the records were loaded; pass it to /api/familiars/changes?since=
+to receive only what changed afterwards.
+
+Bodies are streamed record by record and compressed when the client
+accepts it (see routes/json_stream.py).
+"""
+
+import json
+import base64
+import binascii
+
+from flask import request, jsonify, url_for
+
+from services.storage_service import get_familiars_page, get_change_seq, page_key
+from services.thumbnail_service import with_thumbnails
+from routes.json_stream import stream_json_array
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# ?limit= value that opts in to the whole, unpaginated list
+ALL = 'all'
+LIGHT_EXCLUDED_FIELDS = ('original_image',)
+
+
+def encode_cursor(key: tuple) -> str:
+    raw = json.dumps(list(key), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (binascii.Error, ValueError, UnicodeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(key, list) or not key:
+        raise ValueError('Invalid cursor')
+    return tuple(key)
+
+
+def parse_listing_args(args, allow_all: bool = False) -> dict:
+    """
+    Read limit/after/fields from the query string; raises ValueError on bad
+    input. `limit` is None when not given, and ALL for limit=all where
+    `allow_all` permits it.
+    """
+    limit = args.get('limit')
+    if limit == ALL and allow_all:
+        if args.get('after'):
+            raise ValueError('limit=all cannot be combined with after')
+    elif limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValueError('limit must be an integer')
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+
+    after = args.get('after')
+    if after:
+        after = decode_cursor(after)
+    else:
+        after = None
+
+    fields = args.get('fields')
+    if fields is not None:
+        fields = fields.strip()
+        fields = None if fields == 'all' else {f.strip() for f in fields.split(',') if f.strip()} | {'id'}
+    else:
+        fields = 'light'
+
+    return {'limit': limit, 'after': after, 'fields': fields}
+
+
+def project(familiar: dict, fields) -> dict:
+    """Keep only the requested fields of a familiar"""
+    if fields is None:
+        return familiar
+    if fields == 'light':
+        # Images without a thumbnail to show instead are kept
+        thumbnails = familiar.get('thumbnails') or {}
+        return {k: v for k, v in familiar.items()
+                if k not in LIGHT_EXCLUDED_FIELDS or k not in thumbnails}
+    return {k: v for k, v in familiar.items() if k in fields}
+
+
+def list_familiars(load_all, order: str, user_id: str = None, prepare=None):
+    """
+    Build a list endpoint response.
+
+    Args:
+        load_all: Returns the full, unpaginated list (for limit=all)
+        order: Key of storage_service.PAGE_ORDERS used for pages
+        user_id: Restrict pages to one user's familiars
+        prepare: Optional post-processing applied to each page
+    """
+    try:
+        args = parse_listing_args(request.args, allow_all=True)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Read before the records so no change between the two can be missed
+    headers = {'X-Change-Seq': str(get_change_seq())}
+    if args['limit'] == ALL:
+        records = load_all()
+    else:
+        limit = args['limit'] or DEFAULT_PAGE_SIZE
+        # Fetch one extra record to know whether another page follows
+        records = get_familiars_page(order, limit + 1, args['after'], user_id)
+        if len(records) > limit:
+            records = records[:limit]
+            cursor = encode_cursor(page_key(records[-1], order))
+            next_url = url_for(request.endpoint, **{**request.args.to_dict(), 'after': cursor})
+            headers['X-Next-Cursor'] = cursor
+            headers['Link'] = f'<{next_url}>; rel="next"'
+        if prepare is not None:
+            records = prepare(records)
+
+    fields = args['fields']
+    return stream_json_array(records, lambda f: project(with_thumbnails(f), fields), headers=headers)
@@ -0,0 +1,39 @@
+"""
+Media Routes - Serve content-addressed image blobs
+"""
+
+from flask import Blueprint, send_file, abort
+
+from services.blob_store import resolve
+from services.thumbnail_service import get_thumbnail, THUMBNAIL_MIME
+
+media_bp = Blueprint('media', __name__, url_prefix='/media')
+
+# Blob names are content hashes, so a URL's content never changes
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+@media_bp.route('/<name>', methods=['GET'])
+def serve(name):
+    """Serve a stored image by its digest"""
+    found = resolve(name)
+    if found is None:
+        abort(404)
+
+    path, mime_type = found
+    response = send_file(path, mimetype=mime_type, conditional=True, etag=name.split('.')[0])
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+@media_bp.route('/<name>/<int:size>', methods=['GET'])
+def serve_thumbnail(name, size):
+    """Serve a thumbnail of a stored image, rendering it on first request"""
+    path = get_thumbnail(name, size)
+    if path is None:
+        abort(404)
+
+    response = send_file(path, mimetype=THUMBNAIL_MIME, conditional=True,
+                         etag=f"{name.split('.')[0]}-{size}")
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
@@ -0,0 +1,83 @@
+"""
+Metrics Routes - Request timing middleware and the Prometheus endpoint
+
+`install_timing(app)` times every request: spans recorded while it runs
+(see services/metrics.py) are returned in a Server-Timing header, and
+the total time until the body has been sent goes into the per-route
+latency histogram. Bodies that are streamed (e.g. the familiar list)
+are serialized after the headers, so their serialization span only
+shows up in /metrics. With PROFILE_SLOW_MS set, slow requests are also
+profiled (see services/profiler.py).
+
+Set SERVER_TIMING=0 to leave the header out.
+"""
+
+import os
+import time
+import threading
+
+from flask import Blueprint, Response, request
+from flask.json.provider import DefaultJSONProvider
+
+from services.metrics import (registry, span, begin_request, end_request, current_timings,
+                              render_prometheus)
+from services.profiler import create_profiler
+
+metrics_bp = Blueprint('metrics', __name__)
+
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '1') != '0'
+UNMATCHED_ROUTE = 'unmatched'
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """jsonify() with its encoding recorded as the 'serialization' span"""
+
+    def dumps(self, obj, **kwargs):
+        with span('serialization'):
+            return super().dumps(obj, **kwargs)
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Latency histograms in the Prometheus text format"""
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+
+def install_timing(app):
+    """Register the timing hooks on an app"""
+    app.json_provider_class = TimedJSONProvider
+    app.json = TimedJSONProvider(app)
+    profiler = create_profiler()
+
+    @app.before_request
+    def start_timing():
+        rule = request.url_rule
+        begin_request(rule.rule if rule is not None else UNMATCHED_ROUTE)
+        registry.track_in_flight(1)
+        if profiler is not None:
+            profiler.start(threading.get_ident())
+
+    @app.after_request
+    def finish_timing(response):
+        timings = current_timings()
+        if timings is None:
+            return response
+        if SERVER_TIMING:
+            response.headers['Server-Timing'] = timings.server_timing()
+
+        method, status, thread_id = request.method, response.status_code, threading.get_ident()
+        info = {'method': method, 'path': request.full_path.rstrip('?'), 'route': timings.route,
+                'status': status}
+
+        # Runs once the last byte of the body was handed to the server
+        def on_close():
+            duration = time.perf_counter() - timings.started
+            registry.observe_request(method, timings.route, status, duration)
+            registry.track_in_flight(-1)
+            if profiler is not None:
+                profiler.stop(thread_id, duration, info)
+            if current_timings() is timings:
+                end_request()
+
+        response.call_on_close(on_close)
+        return response
@@ -0,0 +1,238 @@
+"""
+Admission Service - Single-flight coalescing and admission control
+
+`SingleFlight` makes concurrent calls with the same key share one
+execution: the first caller runs it and the others wait for its result
+(or its exception). A double-click or a retried request therefore costs
+one Gemini call, not two.
+
+`AdmissionController` guards a slow upstream:
+- a `TokenBucket` caps the call rate (sustained rate plus a burst), and
+  can be shared by several controllers using the same quota;
+- at most `max_concurrent` calls run at once;
+- up to `max_queue` more wait, each for at most `queue_timeout` seconds,
+  for a slot.
+
+Anything beyond that is refused at once with `Overloaded`, which routes
+turn into 429 + Retry-After. Time spent waiting in the queue is recorded
+as the 'gemini_queue' span. Queue depth, in-flight calls and outcome
+counters are exported to /metrics (see services/metrics.py).
+"""
+
+import math
+import time
+import threading
+from contextlib import contextmanager
+
+from services.metrics import span, register_collector
+
+ADMISSION_OUTCOMES = ('admitted', 'rejected_rate', 'rejected_queue_full', 'rejected_timeout')
+
+
+class Overloaded(Exception):
+    """An upstream call was refused by admission control"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that have the same key"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.shared = 0
+
+    def do(self, key, fn):
+        """Return fn(), or the result of the identical call already in flight"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'in_flight': len(self._calls), 'leaders': self.leaders, 'shared': self.shared}
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    Args:
+        rate: Tokens added per second
+        burst: Bucket capacity (and initial fill)
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def take(self) -> float:
+        """Take a token; returns 0, or the seconds until one is available (nothing taken)"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def give_back(self):
+        """Return a token taken for a call that never ran"""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.burst, self._tokens + 1)
+
+    def available(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+
+class AdmissionController:
+    """
+    Rate, concurrency and queue limits for one kind of upstream call.
+
+    Args:
+        name: Label in metrics and errors
+        bucket: Shared TokenBucket, or None for no rate limit
+        max_concurrent: Calls that run at once
+        max_queue: Calls that may wait for a slot
+        queue_timeout: Seconds a call waits for a slot before it is refused
+    """
+
+    def __init__(self, name: str, bucket: TokenBucket = None, max_concurrent: int = 4,
+                 max_queue: int = 8, queue_timeout: float = 10.0):
+        self.name = name
+        self.bucket = bucket
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = threading.Condition()
+        self.in_flight = 0
+        self.waiting = 0
+        self.outcomes = dict.fromkeys(ADMISSION_OUTCOMES, 0)
+
+    def _refuse(self, outcome: str, message: str, retry_after: float):
+        """Count a refusal and raise it (slot lock held)"""
+        self.outcomes[outcome] += 1
+        raise Overloaded(f"{self.name}: {message}", retry_after)
+
+    @contextmanager
+    def admit(self):
+        """Hold a slot for the enclosed call; raises Overloaded if none can be had"""
+        with self._slots:
+            full = self.in_flight >= self.max_concurrent
+            if full and self.waiting >= self.max_queue:
+                self._refuse('rejected_queue_full', 'too many requests waiting', self.queue_timeout)
+            if self.bucket is not None:
+                wait = self.bucket.take()
+                if wait:
+                    self._refuse('rejected_rate', 'rate limit reached', wait)
+            if full:
+                self.waiting += 1
+                try:
+                    with span('gemini_queue'):
+                        deadline = time.monotonic() + self.queue_timeout
+                        while self.in_flight >= self.max_concurrent:
+                            remaining = deadline - time.monotonic()
+                            if remaining <= 0:
+                                if self.bucket is not None:
+                                    self.bucket.give_back()
+                                self._refuse('rejected_timeout', 'timed out waiting for a slot',
+                                             self.queue_timeout)
+                            self._slots.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.in_flight += 1
+            self.outcomes['admitted'] += 1
+        try:
+            yield
+        finally:
+            with self._slots:
+                self.in_flight -= 1
+                self._slots.notify()
+
+    def stats(self) -> dict:
+        with self._slots:
+            stats = {'in_flight': self.in_flight, 'queued': self.waiting,
+                     'max_concurrent': self.max_concurrent, 'max_queue': self.max_queue,
+                     **self.outcomes}
+        if self.bucket is not None:
+            stats['tokens'] = round(self.bucket.available(), 2)
+        return stats
+
+
+def prometheus_lines(controllers: list, flights: list) -> list:
+    """Gauges and counters of admission controllers and single-flight groups"""
+    lines = [
+        '# HELP gemini_admission_in_flight Upstream calls currently running.',
+        '# TYPE gemini_admission_in_flight gauge',
+    ]
+    stats = [(c.name, c.stats()) for c in controllers]
+    lines += [f'gemini_admission_in_flight{{kind="{name}"}} {s["in_flight"]}' for name, s in stats]
+    lines += [
+        '# HELP gemini_admission_queue_depth Calls waiting for a free slot.',
+        '# TYPE gemini_admission_queue_depth gauge',
+    ]
+    lines += [f'gemini_admission_queue_depth{{kind="{name}"}} {s["queued"]}' for name, s in stats]
+    lines += [
+        '# HELP gemini_admission_total Admission decisions by outcome.',
+        '# TYPE gemini_admission_total counter',
+    ]
+    lines += [f'gemini_admission_total{{kind="{name}",outcome="{outcome}"}} {s[outcome]}'
+              for name, s in stats for outcome in ADMISSION_OUTCOMES]
+    lines += [
+        '# HELP gemini_singleflight_total Calls that ran (leader) or joined an identical call in flight (shared).',
+        '# TYPE gemini_singleflight_total counter',
+    ]
+    for flight in flights:
+        s = flight.stats()
+        lines.append(f'gemini_singleflight_total{{kind="{flight.name}",role="leader"}} {s["leaders"]}')
+        lines.append(f'gemini_singleflight_total{{kind="{flight.name}",role="shared"}} {s["shared"]}')
+    return lines
+
+
+def register_metrics(controllers: list, flights: list):
+    """Export these controllers and flights with the other /metrics"""
+    register_collector(lambda: prometheus_lines(controllers, flights))
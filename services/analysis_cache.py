@@ -0,0 +1,55 @@
+"""
+Analysis Cache - Reuse Gemini analysis results for images seen before
+
+Results are keyed by a fingerprint of the decoded image pixels (after
+applying EXIF orientation), so the same photo re-uploaded under another
+name or container still hits. Entries live in a DiskCache under
+data/cache/analysis and are bounded by size and age.
+"""
+
+import io
+import os
+import json
+import hashlib
+from PIL import Image, ImageOps
+
+from services.disk_cache import DiskCache
+from services.paths import data_path
+
+ANALYSIS_CACHE_DIR = os.environ.get('ANALYSIS_CACHE_DIR', data_path('cache', 'analysis'))
+
+analysis_cache = DiskCache(
+    ANALYSIS_CACHE_DIR,
+    max_bytes=int(float(os.environ.get('ANALYSIS_CACHE_MAX_MB', '20')) * 1024 * 1024),
+    ttl=float(os.environ.get('ANALYSIS_CACHE_TTL', str(7 * 24 * 3600)))
+)
+
+
+def image_fingerprint(image_data: bytes) -> str:
+    """SHA-256 of the normalized pixels of an image, or of its raw bytes if it can't be decoded"""
+    try:
+        img = ImageOps.exif_transpose(Image.open(io.BytesIO(image_data))).convert('RGB')
+        digest = hashlib.sha256(f"{img.size[0]}x{img.size[1]}:".encode('ascii'))
+        digest.update(img.tobytes())
+        return digest.hexdigest()
+    except Exception:
+        return hashlib.sha256(image_data).hexdigest()
+
+
+def cache_key(image_data: bytes, model: str) -> str:
+    return hashlib.sha256(f"{model}:{image_fingerprint(image_data)}".encode('ascii')).hexdigest()
+
+
+def get_cached_analysis(key: str):
+    cached = analysis_cache.get(key)
+    if cached is None:
+        return None
+    try:
+        return json.loads(cached.decode('utf-8'))
+    except ValueError:
+        analysis_cache.delete(key)
+        return None
+
+
+def store_analysis(key: str, result: dict):
+    analysis_cache.set(key, json.dumps(result).encode('utf-8'))
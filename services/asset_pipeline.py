@@ -0,0 +1,62 @@
+"""
+Asset Pipeline - Generated familiar image to stored, cut-out asset in one pass
+
+    generate (Gemini, or Pollinations fallback)
+      -> remove white background
+      -> store PNG in the blob store
+      -> render thumbnails
+
+The image stays in memory between stages and is decoded once, so the
+browser no longer downloads a multi-megabyte data URI only to upload it
+again for background removal. The result is a /media/ URL the familiar
+record can reference directly.
+"""
+
+import io
+from PIL import Image
+
+from services import blob_store
+from services.gemini_service import (
+    generate_image_bytes, fallback_image_url, load_image_bytes, cutout_white_background, encode_png
+)
+from services.admission import Overloaded
+from services.thumbnail_service import store_thumbnails
+
+
+def create_familiar_asset(species: str, description: str, api_key: str = None,
+                          threshold: int = 235, tolerance: int = 35, thumbnails: bool = True) -> dict:
+    """
+    Run the full pipeline for one familiar.
+
+    Returns:
+        {'imageUrl': /media/ URL of the cut-out PNG, 'thumbnails': {size: url}}.
+        If the fallback image can't be downloaded, {'imageUrl': its remote URL}
+        so the browser can still show something.
+    """
+    try:
+        generated = generate_image_bytes(species, description, api_key)
+    except Overloaded as e:
+        # The job already waited its turn; don't fail it, use the fallback
+        print(f"Gemini over capacity, using fallback: {e}")
+        generated = None
+    if generated is not None:
+        image_data = generated[1]
+    else:
+        fallback_url = fallback_image_url(species, description)
+        try:
+            image_data = load_image_bytes(fallback_url)
+        except Exception as e:
+            print(f"Fallback image download error: {e}")
+            return {'imageUrl': fallback_url, 'thumbnails': {}}
+
+    img = cutout_white_background(Image.open(io.BytesIO(image_data)), threshold, tolerance)
+    image_url = blob_store.put_bytes(encode_png(img), 'image/png')
+
+    result = {'imageUrl': image_url, 'thumbnails': {}}
+    if thumbnails:
+        try:
+            result['thumbnails'] = store_thumbnails(image_url, img)
+        except Exception as e:
+            # Thumbnails are also rendered lazily on first request
+            print(f"Thumbnail error: {e}")
+    return result
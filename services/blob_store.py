@@ -0,0 +1,227 @@
+"""
+Blob Store - Content-addressed image storage on local disk
+
+Images are stored once under their SHA-256 digest, sharded into two
+directory levels so no single directory grows too large:
+
+    data/blobs/ab/cd/abcd...ef.png
+
+Because a blob's name is derived from its content it never changes,
+so it can be served with immutable cache headers from /media/<name>.
+
+Blobs are written before the records that reference them are saved, so
+a write that fails afterwards (or a generated image nobody keeps)
+leaves an unreferenced blob behind. `collect_garbage` removes those once
+they are old enough that no request can still be about to save them.
+Storing or importing a blob that already exists refreshes its mtime, so
+a blob that becomes referenced again while a sweep runs counts as young.
+"""
+
+import os
+import re
+import time
+import base64
+import hashlib
+import binascii
+import tempfile
+
+from services.paths import data_path
+
+BLOB_DIR = os.environ.get('BLOB_DIR', data_path('blobs'))
+MEDIA_URL_PREFIX = '/media/'
+
+MIME_EXTENSIONS = {
+    'image/png': 'png',
+    'image/jpeg': 'jpg',
+    'image/jpg': 'jpg',
+    'image/webp': 'webp',
+    'image/gif': 'gif',
+}
+EXTENSION_MIMES = {
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'webp': 'image/webp',
+    'gif': 'image/gif',
+}
+
+IMAGE_FIELDS = ('original_image', 'generated_image')
+
+_BLOB_NAME = re.compile(r'^([0-9a-f]{64})(?:\.([a-z0-9]+))?$')
+_DATA_URI = re.compile(r'^data:([\w/+.-]+)?(;base64)?,', re.IGNORECASE)
+
+
+def blob_path(digest: str, extension: str) -> str:
+    """Sharded on-disk path for a blob"""
+    return os.path.join(BLOB_DIR, digest[:2], digest[2:4], f"{digest}.{extension}")
+
+
+def media_url(digest: str, extension: str) -> str:
+    return f"{MEDIA_URL_PREFIX}{digest}.{extension}"
+
+
+def digest_of(url: str):
+    """Digest of a /media/ URL, or None for inline or external images"""
+    if not isinstance(url, str) or not url.startswith(MEDIA_URL_PREFIX):
+        return None
+    return url[len(MEDIA_URL_PREFIX):].split('.')[0]
+
+
+def put_bytes(data: bytes, mime_type: str) -> str:
+    """
+    Store bytes and return their media URL. Writing the same content twice
+    only refreshes the blob's mtime (see `collect_garbage`).
+    """
+    extension = MIME_EXTENSIONS.get((mime_type or '').lower(), 'bin')
+    digest = hashlib.sha256(data).hexdigest()
+    path = blob_path(digest, extension)
+
+    if not _touch(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file first so readers never see a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    return media_url(digest, extension)
+
+
+def _touch(path: str) -> bool:
+    """Refresh a blob's mtime; False if it doesn't exist (or was just collected)"""
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def touch_media(url: str):
+    """Refresh the mtime of the blob behind a /media/ URL, if this store has it"""
+    if isinstance(url, str) and url.startswith(MEDIA_URL_PREFIX):
+        found = resolve(url[len(MEDIA_URL_PREFIX):])
+        if found is not None:
+            _touch(found[0])
+
+
+def parse_data_uri(uri: str):
+    """Split a data URI into (mime_type, bytes), or return None if it isn't one"""
+    if not isinstance(uri, str):
+        return None
+    match = _DATA_URI.match(uri)
+    if not match:
+        return None
+    mime_type = (match.group(1) or 'application/octet-stream').lower()
+    payload = uri[match.end():]
+    try:
+        if match.group(2):
+            return mime_type, base64.b64decode(payload)
+        return mime_type, payload.encode('utf-8')
+    except (binascii.Error, ValueError):
+        return None
+
+
+def put_data_uri(uri: str) -> str:
+    """Store an inline data URI and return its media URL; other values pass through"""
+    parsed = parse_data_uri(uri)
+    if parsed is None:
+        return uri
+    mime_type, data = parsed
+    return put_bytes(data, mime_type)
+
+
+def externalize_images(familiar: dict) -> dict:
+    """
+    Replace inline image data URIs in a familiar record with media URLs
+    (refreshing blobs it already references by media URL)
+    """
+    for field in IMAGE_FIELDS:
+        if field in familiar:
+            familiar[field] = put_data_uri(familiar[field])
+            touch_media(familiar[field])
+    return familiar
+
+
+def resolve(name: str):
+    """
+    Find a blob by the name used in its media URL (`<digest>` or
+    `<digest>.<ext>`). Returns (path, mime_type) or None.
+    """
+    match = _BLOB_NAME.match(name or '')
+    if not match:
+        return None
+    digest, extension = match.groups()
+
+    extensions = [extension] if extension else list(EXTENSION_MIMES) + ['bin']
+    for ext in extensions:
+        path = blob_path(digest, ext)
+        if os.path.isfile(path):
+            return path, EXTENSION_MIMES.get(ext, 'application/octet-stream')
+    return None
+
+
+def read_media(url: str):
+    """Return (mime_type, bytes) for a /media/ URL held in this store, or None"""
+    if not isinstance(url, str) or not url.startswith(MEDIA_URL_PREFIX):
+        return None
+    found = resolve(url[len(MEDIA_URL_PREFIX):])
+    if found is None:
+        return None
+    path, mime_type = found
+    with open(path, 'rb') as f:
+        return mime_type, f.read()
+
+
+def iter_blobs():
+    """(digest, path) of every stored blob"""
+    if not os.path.isdir(BLOB_DIR):
+        return
+    # Only the two-level hex shards; other directories (thumbs/) aren't blobs
+    for shard in os.scandir(BLOB_DIR):
+        if not (shard.is_dir() and len(shard.name) == 2):
+            continue
+        for subshard in os.scandir(shard.path):
+            if not subshard.is_dir():
+                continue
+            for entry in os.scandir(subshard.path):
+                match = _BLOB_NAME.match(entry.name)
+                if match and match.group(2):
+                    yield match.group(1), entry.path
+
+
+def collect_garbage(referenced: set, min_age: float, dry_run: bool = False) -> list:
+    """
+    Delete blobs whose digest is not in `referenced` and that were written
+    (or stored again) more than `min_age` seconds ago; younger ones may
+    belong to a save that is still in progress.
+
+    Each blob is first renamed aside and its mtime checked again, so a
+    `put_bytes` racing the sweep either refreshed it in time (and it is
+    put back) or finds it gone and writes it anew.
+
+    Returns:
+        The digests removed (or, with dry_run, that would be)
+    """
+    cutoff = time.time() - min_age
+    removed = []
+    for digest, path in list(iter_blobs()):
+        if digest in referenced:
+            continue
+        try:
+            if os.path.getmtime(path) > cutoff:
+                continue
+            if not dry_run:
+                condemned = f"{path}.{os.getpid()}.gc"
+                os.rename(path, condemned)
+                if os.path.getmtime(condemned) > cutoff:
+                    os.replace(condemned, path)
+                    continue
+                os.remove(condemned)
+        except OSError:
+            continue
+        removed.append(digest)
+    return removed
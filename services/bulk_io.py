@@ -0,0 +1,80 @@
+"""
+Bulk I/O - NDJSON import and export of familiars
+
+One familiar per line, in storage order (newest first). Both directions
+work record by record: exports stream from storage, and imports are
+parsed, validated, have their inline images moved to the blob store and
+hashed (see services/image_hash.py) line by line into a temporary file,
+which storage then consumes in a single write. So the slow image work
+happens before the storage lock is taken, and memory use stays flat. A
+bad line aborts the whole import, so nothing is half-applied (blobs it
+already stored are left to `storage gc-blobs`). Records without a forest
+lane get a balanced one (see services/forest_service.py).
+
+Files ending in .gz are (de)compressed transparently by the CLI; the
+HTTP endpoints accept and negotiate gzip.
+"""
+
+import gzip
+import json
+import tempfile
+
+from services.blob_store import externalize_images
+from services.image_hash import add_image_hashes
+from services.forest_service import with_lanes
+from services.storage_service import import_familiars, export_familiars
+
+
+class InvalidRecord(ValueError):
+    """An import line that is not a familiar"""
+
+    def __init__(self, line_number: int, message: str):
+        super().__init__(f"Line {line_number}: {message}")
+        self.line_number = line_number
+
+
+def parse_ndjson(lines):
+    """
+    Yield familiars from NDJSON lines (str or bytes), skipping blank lines.
+    Records exported with image hashes keep them; others are hashed.
+    """
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            familiar = json.loads(line)
+        except ValueError as e:
+            raise InvalidRecord(line_number, f"invalid JSON ({e})")
+        if not isinstance(familiar, dict):
+            raise InvalidRecord(line_number, 'expected a JSON object')
+        if not isinstance(familiar.get('id'), str) or not familiar['id']:
+            raise InvalidRecord(line_number, "'id' must be a non-empty string")
+        externalize_images(familiar)
+        if 'image_hashes' not in familiar:
+            add_image_hashes(familiar)
+        yield familiar
+
+
+def import_ndjson(lines, replace: bool = False) -> int:
+    """Import NDJSON lines in one storage write; returns the number of familiars"""
+    with tempfile.TemporaryFile('w+', encoding='utf-8') as staged:
+        for familiar in with_lanes(parse_ndjson(lines)):
+            staged.write(json.dumps(familiar, ensure_ascii=False, separators=(',', ':')) + '\n')
+        staged.seek(0)
+        return import_familiars((json.loads(line) for line in staged), replace=replace)
+
+
+def open_ndjson(path: str, mode: str):
+    """Open a text NDJSON file, gzip-compressed if the name ends in .gz"""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def export_ndjson(f) -> int:
+    """Write every familiar to a text file object; returns the number written"""
+    count = 0
+    for familiar in export_familiars():
+        f.write(json.dumps(familiar, ensure_ascii=False, separators=(',', ':')) + '\n')
+        count += 1
+    return count
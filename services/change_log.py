@@ -0,0 +1,178 @@
+"""
+Change Log - Sequence-numbered record of familiar changes
+
+Every create, update and delete appends an entry with the next sequence
+number, so clients can ask for "everything since seq N" instead of
+re-downloading whole lists. The JSON backend keeps the log in an
+append-only NDJSON file next to familiars.json; the SQLite backend keeps
+it in a `changes` table. Only the most recent entries are retained; a
+client whose seq is older than that gets `reset: true` and reloads.
+
+Consumers (the change feed, the leaderboard rank index) re-read the
+current record of every id in the log rather than applying the entry
+itself, so seeing an entry twice, or for a write that never landed, is
+harmless; missing one is not. The JSON backend therefore notes its
+changes in a pending file before replacing familiars.json, and logs
+them after (see FileChangeLog.prepare).
+"""
+
+import os
+import json
+import tempfile
+import threading
+from collections import deque
+
+CREATED, UPDATED, DELETED = 'created', 'updated', 'deleted'
+
+
+def coalesce(entries) -> list:
+    """
+    Collapse raw (seq, op, id) entries to one change per familiar, ordered by
+    the seq of its last entry. A familiar created and then updated within
+    the window is reported as created.
+    """
+    latest = {}
+    for seq, op, familiar_id in entries:
+        previous = latest.pop(familiar_id, None)
+        if previous is not None and previous['op'] == CREATED and op == UPDATED:
+            op = CREATED
+        latest[familiar_id] = {'seq': seq, 'op': op, 'id': familiar_id}
+    return list(latest.values())
+
+
+def window(entries: list, since: int, current: int, oldest: int, limit: int) -> dict:
+    """Build a changes_since() result from retained entries (ascending seq)"""
+    if since > current or (since < oldest - 1 and current > 0):
+        return {'seq': current, 'reset': True, 'more': False, 'changes': []}
+    selected = [e for e in entries if e[0] > since]
+    more = len(selected) > limit
+    selected = selected[:limit]
+    seq = selected[-1][0] if selected else current
+    return {'seq': seq if more else current, 'reset': False, 'more': more,
+            'changes': coalesce(selected)}
+
+
+class FileChangeLog:
+    """
+    NDJSON change log for the JSON backend.
+
+    `append`, `prepare`, `commit` and `recover` must be called while
+    holding the storage writer lock; reads pick up entries appended by
+    other processes via the file's signature.
+    """
+
+    def __init__(self, path: str, retain: int = 10000):
+        self.path = path
+        self.pending_path = path + '.pending'
+        self.retain = retain
+        self._lock = threading.RLock()
+        self._entries = deque(maxlen=retain)
+        self._lines_on_disk = 0
+        self._signature = None
+        self.seq = 0
+
+    def _file_signature(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _refresh(self):
+        signature = self._file_signature()
+        if signature == self._signature:
+            return
+        entries = deque(maxlen=self.retain)
+        lines = 0
+        if signature is not None:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from a crash
+                    entries.append((entry['seq'], entry['op'], entry['id']))
+                    lines += 1
+        self._entries = entries
+        self._lines_on_disk = lines
+        self.seq = entries[-1][0] if entries else 0
+        self._signature = signature
+
+    def current(self) -> int:
+        with self._lock:
+            self._refresh()
+            return self.seq
+
+    def append(self, changes: list) -> int:
+        """Record [(op, familiar_id), ...]; returns the last seq"""
+        if not changes:
+            return self.current()
+        with self._lock:
+            self._refresh()
+            lines = []
+            for op, familiar_id in changes:
+                self.seq += 1
+                self._entries.append((self.seq, op, familiar_id))
+                lines.append(json.dumps({'seq': self.seq, 'op': op, 'id': familiar_id}) + '\n')
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.writelines(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            self._lines_on_disk += len(lines)
+            if self._lines_on_disk > 2 * self.retain:
+                self._compact()
+            self._signature = self._file_signature()
+            return self.seq
+
+    def prepare(self, changes: list):
+        """
+        Durably note [(op, familiar_id), ...] that are about to be saved,
+        before the data file is replaced; commit() logs them once it has
+        been. Logging only after the replace means a reader never sees a
+        seq whose write it can't see yet, and the pending file means a
+        crash in between can't lose the entries: recover() logs them.
+        """
+        with open(self.pending_path, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps({'op': op, 'id': familiar_id}) + '\n' for op, familiar_id in changes)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def commit(self) -> int:
+        """Log the changes noted by prepare(); returns the last seq"""
+        return self.recover()
+
+    def recover(self) -> int:
+        """
+        Log changes left pending by a writer that died between prepare()
+        and commit(). Their write may or may not have landed; either way
+        consumers re-read the records, so logging them is safe.
+        """
+        changes = []
+        try:
+            with open(self.pending_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line: the replace never happened
+                    changes.append((entry['op'], entry['id']))
+        except FileNotFoundError:
+            return self.current()
+        seq = self.append(changes)
+        os.remove(self.pending_path)
+        return seq
+
+    def _compact(self):
+        """Rewrite the file with only the retained entries"""
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            for seq, op, familiar_id in self._entries:
+                f.write(json.dumps({'seq': seq, 'op': op, 'id': familiar_id}) + '\n')
+        os.replace(tmp_path, self.path)
+        self._lines_on_disk = len(self._entries)
+
+    def since(self, since: int, limit: int = 1000) -> dict:
+        with self._lock:
+            self._refresh()
+            oldest = self._entries[0][0] if self._entries else self.seq + 1
+            return window(list(self._entries), since, self.seq, oldest, limit)
@@ -0,0 +1,173 @@
+"""
+Disk Cache - Small size-bounded key/value cache on local disk
+
+Values are bytes stored one file per key under `directory`, sharded by
+the first two characters of the key. Entries expire `ttl` seconds after
+they were written, and when the cache grows past `max_bytes` the least
+recently used entries (by access time, which `get` refreshes) are evicted.
+
+The cache is safe to share between threads and processes: files are
+written to a temp file and renamed into place, and every process simply
+sees the files that exist.
+"""
+
+import os
+import re
+import time
+import tempfile
+import threading
+
+_KEY = re.compile(r'^[0-9a-zA-Z_-]{8,128}$')
+
+
+class DiskCache:
+    """LRU + TTL bytes cache backed by a directory"""
+
+    def __init__(self, directory: str, max_bytes: int = 50 * 1024 * 1024, ttl: float = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._total_bytes = None  # computed lazily by scanning the directory
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def _path(self, key: str) -> str:
+        if not _KEY.match(key):
+            raise ValueError(f"Invalid cache key: {key!r}")
+        return os.path.join(self.directory, key[:2], key)
+
+    def _entries(self) -> list:
+        """(access time, size, path) of every entry on disk"""
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_atime, st.st_size, entry.path))
+        return entries
+
+    def _size(self) -> int:
+        if self._total_bytes is None:
+            self._total_bytes = sum(size for _, size, _ in self._entries())
+        return self._total_bytes
+
+    def contains(self, key: str) -> bool:
+        """Whether an unexpired entry exists, without reading it or counting a lookup"""
+        path = self._path(key)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        if self.ttl is not None and time.time() - st.st_mtime > self.ttl:
+            self._discard(path, st.st_size)
+            with self._lock:
+                self.expired += 1
+            return False
+        return True
+
+    def record_miss(self):
+        """Count a lookup that was answered without get() (e.g. after contains())"""
+        with self._lock:
+            self.misses += 1
+
+    def get(self, key: str):
+        """Cached bytes for a key, or None on a miss or expired entry"""
+        path = self._path(key)
+        try:
+            st = os.stat(path)
+            if self.ttl is not None and time.time() - st.st_mtime > self.ttl:
+                self._discard(path, st.st_size)
+                with self._lock:
+                    self.expired += 1
+                    self.misses += 1
+                return None
+            with open(path, 'rb') as f:
+                value = f.read()
+            # Refresh the access time for LRU; mtime keeps the write time for the TTL
+            os.utime(path, (time.time(), st.st_mtime))
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            previous = os.path.getsize(path)
+        except OSError:
+            previous = 0
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            self._total_bytes = self._size() + len(value) - previous
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def delete(self, key: str):
+        path = self._path(key)
+        try:
+            self._discard(path, os.path.getsize(path))
+        except OSError:
+            pass
+
+    def _discard(self, path: str, size: int):
+        try:
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes = max(0, self._total_bytes - size)
+
+    def _evict(self):
+        """Drop least recently used entries until under max_bytes (lock held)"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+        self._total_bytes = total
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'expired': self.expired,
+                'evictions': self.evictions,
+                'bytes': self._size(),
+                'max_bytes': self.max_bytes,
+            }
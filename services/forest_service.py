@@ -0,0 +1,164 @@
+"""
+Forest Service - Bounded, weighted forest windows and lane allocation
+
+The forest shows a window of at most FOREST_WINDOW_SIZE familiars rather
+than the whole collection. Each familiar's weight grows with its recency
+(half-life RECENCY_HALF_LIFE_DAYS, measured from the newest familiar so
+the result does not drift with the clock) and its magic_power. A window
+is a weighted sample without replacement (Efraimidis-Spirakis: the k
+largest u ** (1 / weight)). Each familiar's u is a hash of the viewer's
+seed and its id. So one seed always gets the same window for the same
+data, and a new familiar never reshuffles the rest. The sampling runs
+on NumPy arrays that are rebuilt only when storage changes.
+
+Lanes (0-4) are persisted on the familiar. New and imported familiars go
+to the lane with the fewest of the LANE_BALANCE_WINDOW newest familiars.
+Windows are read-only: familiars stored without a lane or speed are shown
+with ones derived from their id until `storage assign-lanes` stores them.
+"""
+
+import os
+import zlib
+import threading
+import numpy as np
+
+from services.storage_service import (
+    get_sampling_columns, get_familiars_by_ids, get_familiars_page, apply_batch, storage_version,
+    default_speed, fill_flight_defaults
+)
+
+LANES = 5
+FOREST_WINDOW_SIZE = int(os.environ.get('FOREST_WINDOW_SIZE', '40'))
+FOREST_MAX_WINDOW = 200
+RECENCY_HALF_LIFE_DAYS = float(os.environ.get('FOREST_RECENCY_HALF_LIFE_DAYS', '7'))
+# Weight an arbitrarily old familiar keeps, relative to a brand-new one
+RECENCY_FLOOR = 0.05
+LANE_BALANCE_WINDOW = 200
+
+_DAY_MS = 24 * 60 * 60 * 1000
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    """SplitMix64 finalizer on a uint64 array (wrap-around arithmetic)"""
+    x = x + _GOLDEN
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def sampling_weights(created: np.ndarray, power: np.ndarray) -> np.ndarray:
+    """Recency x magic_power weight of every familiar (always > 0)"""
+    if not len(created):
+        return np.zeros(0)
+    age_days = (created.max() - created) / _DAY_MS
+    recency = RECENCY_FLOOR + 0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS)
+    popularity = np.where(power >= 0, 1 + np.log1p(np.maximum(power, 0)),
+                          1 / (1 + np.log1p(np.maximum(-power, 0))))
+    return recency * popularity
+
+
+class _SamplingIndex:
+    """Ids, id hashes and weights of all familiars for one storage version"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.ids = []
+        self.hashes = np.zeros(0, dtype=np.uint64)
+        self.weights = np.zeros(0)
+
+    def refresh(self):
+        version = storage_version()
+        with self.lock:
+            if self.version == version:
+                return self
+            rows = get_sampling_columns()
+            self.ids = [row[0] for row in rows]
+            self.hashes = np.fromiter((zlib.crc32(str(i).encode('utf-8')) for i in self.ids),
+                                      dtype=np.uint64, count=len(rows))
+            created = np.fromiter((row[1] for row in rows), dtype=np.float64, count=len(rows))
+            power = np.fromiter((row[2] for row in rows), dtype=np.float64, count=len(rows))
+            self.weights = sampling_weights(created, power)
+            self.version = version
+            return self
+
+
+_index = _SamplingIndex()
+
+
+def sample_ids(size: int, seed: int) -> list:
+    """Ids of a weighted sample of `size` familiars for a viewer seed, most likely first"""
+    index = _index.refresh()
+    with index.lock:
+        ids, hashes, weights = index.ids, index.hashes, index.weights
+    if size <= 0 or not ids:
+        return []
+    seed_mix = _splitmix64(np.array([seed % 2 ** 64], dtype=np.uint64))[0]
+    u = ((_splitmix64(hashes ^ seed_mix) >> np.uint64(11)).astype(np.float64) + 0.5) / 2 ** 53
+    keys = np.log(u) / weights  # log(u ** (1/w)): same order, no underflow
+    if size < len(ids):
+        chosen = np.argpartition(-keys, size - 1)[:size]
+    else:
+        chosen = np.arange(len(ids))
+    chosen = chosen[np.argsort(-keys[chosen], kind='stable')]
+    return [ids[i] for i in chosen]
+
+
+# ============ Lanes ============
+
+class LaneAllocator:
+    """Hands out the least crowded lane, counting the lanes it has handed out"""
+
+    def __init__(self, counts: list):
+        self.counts = list(counts)
+
+    def next(self) -> int:
+        lane = min(range(LANES), key=lambda i: (self.counts[i], i))
+        self.counts[lane] += 1
+        return lane
+
+
+def lane_allocator() -> LaneAllocator:
+    """Allocator balanced against the lanes of the newest familiars"""
+    counts = [0] * LANES
+    for familiar in get_familiars_page('newest', LANE_BALANCE_WINDOW):
+        lane = familiar.get('lane')
+        if isinstance(lane, int) and 0 <= lane < LANES:
+            counts[lane] += 1
+    return LaneAllocator(counts)
+
+
+def _flight(familiar: dict, allocator: LaneAllocator) -> dict:
+    """Lane and speed for a familiar, keeping whichever it already has"""
+    return {'lane': familiar['lane'] if 'lane' in familiar else allocator.next(),
+            'speed': familiar['speed'] if 'speed' in familiar else default_speed(familiar['id'])}
+
+
+def with_lanes(familiars):
+    """Familiars (lazily) with balanced lanes/speeds added to those without, for imports"""
+    # Balanced against storage now, before an import takes the write lock
+    allocator = lane_allocator()
+    return (f if 'lane' in f and 'speed' in f else {**f, **_flight(f, allocator)}
+            for f in familiars)
+
+
+def assign_flight(familiars: list) -> list:
+    """Give familiars without a lane/speed persisted ones (in one write); returns the list"""
+    missing = [i for i, f in enumerate(familiars) if 'lane' not in f or 'speed' not in f]
+    if not missing:
+        return familiars
+    allocator = lane_allocator()
+    operations = []
+    for i in missing:
+        f = familiars[i]
+        flight = _flight(f, allocator)
+        familiars[i] = {**f, **flight}
+        operations.append(('update', f['id'], flight))
+    apply_batch(operations)
+    return familiars
+
+
+def forest_window(size: int = FOREST_WINDOW_SIZE, seed: int = 0) -> list:
+    """At most `size` familiars for the forest, sampled for `seed` (read-only)"""
+    return fill_flight_defaults(get_familiars_by_ids(sample_ids(size, seed)))
@@ -2,27 +2,97 @@
 Gemini Service - AI Integration for object analysis and image generation
 """
 
+import os
 import json
 import urllib.request
 import urllib.parse
 import random
 import io
 import base64
+import numpy as np
 from PIL import Image
 
+from services.analysis_cache import cache_key, get_cached_analysis, store_analysis
+from services.image_cache import prompt_key, get_cached_image, store_image
+from services.http_client import HttpClient
+from services.blob_store import parse_data_uri, read_media
+from services.metrics import span, timed
+from services.admission import (
+    SingleFlight, TokenBucket, AdmissionController, Overloaded, register_metrics
+)
 
-def analyze_object_and_suggest_names(base64_image: str, api_key: str) -> dict:
-    """Analyze an image using Gemini API and suggest familiar names"""
+
+ANALYSIS_MODEL = 'gemini-2.0-flash'
+IMAGE_MODEL = 'gemini-2.0-flash-exp-image-generation'
+
+# Point at tools/gemini_stub.py (e.g. http://127.0.0.1:8089) to run offline
+GEMINI_BASE_URL = os.environ.get('GEMINI_BASE_URL', 'https://generativelanguage.googleapis.com').rstrip('/')
+
+# Shared keep-alive client; hedging only applies to the cheap analysis call
+_hedge_after = os.environ.get('GEMINI_HEDGE_AFTER')
+gemini_client = HttpClient(
+    retries=int(os.environ.get('GEMINI_RETRIES', '2')),
+    hedge_after=float(_hedge_after) if _hedge_after else None
+)
+
+# Admission control: one token bucket for the API key's request quota, and
+# separate concurrency limits so slow image calls can't starve analysis
+_rate_per_min = float(os.environ.get('GEMINI_RATE_PER_MIN', '60'))
+gemini_quota = TokenBucket(_rate_per_min / 60, int(os.environ.get('GEMINI_BURST', '10'))) \
+    if _rate_per_min > 0 else None
+_queue_limit = int(os.environ.get('GEMINI_QUEUE_LIMIT', '8'))
+_queue_timeout = float(os.environ.get('GEMINI_QUEUE_TIMEOUT', '10'))
+analysis_admission = AdmissionController(
+    'analysis', gemini_quota, int(os.environ.get('GEMINI_ANALYZE_CONCURRENCY', '4')),
+    _queue_limit, _queue_timeout)
+image_admission = AdmissionController(
+    'image', gemini_quota, int(os.environ.get('GEMINI_IMAGE_CONCURRENCY', '2')),
+    _queue_limit, _queue_timeout)
+
+# Identical concurrent requests (same image / same prompt) share one call
+analysis_flight = SingleFlight('analysis')
+image_flight = SingleFlight('image')
+register_metrics([analysis_admission, image_admission], [analysis_flight, image_flight])
+
+
+def admission_stats() -> dict:
+    return {'analysis': {**analysis_admission.stats(), 'single_flight': analysis_flight.stats()},
+            'image': {**image_admission.stats(), 'single_flight': image_flight.stats()}}
+
+
+def _model_url(model: str, api_key: str) -> str:
+    return f"{GEMINI_BASE_URL}/v1beta/models/{model}:generateContent?key={api_key}"
+
+
+MOCK_ANALYSIS = {
+    'originalItem': 'Mystery Object',
+    'species': 'Shadow Creature',
+    'suggestedNames': ['Umbra', 'Shade', 'Echo'],
+    'description': 'A mysterious creature formed from the void.'
+}
+
+
+def analyze_object_and_suggest_names(base64_image: str, api_key: str, mime_type: str = 'image/jpeg') -> dict:
+    """
+    Analyze an image using Gemini API and suggest familiar names.
+    Pass images through image_ingest.normalize_for_analysis first.
+    Raises Overloaded when admission control refuses the call.
+    """
     if not api_key:
-        return {
-            'originalItem': 'Mystery Object',
-            'species': 'Shadow Creature',
-            'suggestedNames': ['Umbra', 'Shade', 'Echo'],
-            'description': 'A mysterious creature formed from the void.'
-        }
+        return dict(MOCK_ANALYSIS)
     
+    # Identical images were analyzed before: skip the Gemini call
+    key = cache_key(base64.b64decode(base64_image), ANALYSIS_MODEL)
+    cached = get_cached_analysis(key)
+    if cached is not None:
+        return cached
+    return analysis_flight.do(key, lambda: _analyze(base64_image, api_key, mime_type, key))
+
+
+def _analyze(base64_image: str, api_key: str, mime_type: str, key: str) -> dict:
+    """Uncached Gemini analysis (one per image at a time, see analysis_flight)"""
     try:
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={api_key}"
+        url = _model_url(ANALYSIS_MODEL, api_key)
         
         prompt = """You are a mystical witch in a fantasy world.
 Analyze this image of a real-world object.
@@ -42,47 +112,65 @@ Return JSON with these exact fields:
         payload = {
             "contents": [{
                 "parts": [
-                    {"inlineData": {"mimeType": "image/jpeg", "data": base64_image}},
+                    {"inlineData": {"mimeType": mime_type, "data": base64_image}},
                     {"text": prompt}
                 ]
             }],
             "generationConfig": {"responseMimeType": "application/json"}
         }
         
-        data = json.dumps(payload).encode('utf-8')
-        req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+        with analysis_admission.admit(), span('gemini'):
+            result = gemini_client.post_json(url, payload, deadline=30)
+        text = result['candidates'][0]['content']['parts'][0]['text']
+        analysis = json.loads(text)
         
-        with urllib.request.urlopen(req, timeout=30) as response:
-            result = json.loads(response.read().decode('utf-8'))
-            text = result['candidates'][0]['content']['parts'][0]['text']
-            return json.loads(text)
+        # Only real results are cached, never the mock fallback
+        store_analysis(key, analysis)
+        return analysis
     
+    except Overloaded:
+        raise
     except Exception as e:
         print(f"Gemini API Error: {e}")
-        return {
-            'originalItem': 'Mystery Object',
-            'species': 'Shadow Creature',
-            'suggestedNames': ['Umbra', 'Shade', 'Echo'],
-            'description': 'A mysterious creature formed from the void.'
-        }
+        return dict(MOCK_ANALYSIS)
 
 
-def generate_familiar_image(species: str, description: str, api_key: str = None) -> str:
-    """Generate a familiar image using Gemini 2.0 Flash (experimental image generation)"""
-    prompt = f"""Generate an image of: A high quality, magical 2D game asset art of a {species}.
+def _image_prompt(species: str, description: str) -> str:
+    return f"""Generate an image of: A high quality, magical 2D game asset art of a {species}.
 Description: {description}.
 Style: Cute, mystical, vibrant colors, fantasy art style, stickers, white background.
 The creature should look like a familiar companion.""".strip()
-    
-    # If no API key, fallback to Pollinations.ai
+
+
+def generate_image_bytes(species: str, description: str, api_key: str = None):
+    """
+    Generate a familiar image with Gemini 2.0 Flash (experimental image generation).
+
+    Returns:
+        (mime_type, image bytes), or None without an API key or if Gemini
+        produced no image
+
+    Raises:
+        Overloaded: admission control refused the call
+    """
     if not api_key:
         print("No API key provided, using Pollinations.ai")
-        return _fallback_pollinations(species, prompt)
+        return None
     
-    # Try Gemini 2.0 Flash experimental image generation
+    # An identical prompt was generated before: reuse the stored image
+    prompt = _image_prompt(species, description)
+    key = prompt_key(prompt, IMAGE_MODEL)
+    cached = get_cached_image(key)
+    if cached is not None:
+        return cached
+    return image_flight.do(key, lambda: _generate(prompt, api_key, key))
+
+
+def _generate(prompt: str, api_key: str, key: str):
+    """Uncached Gemini image generation (one per prompt at a time, see image_flight)"""
     try:
         print(f"Calling Gemini 2.0 Flash for image generation...")
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash-exp-image-generation:generateContent?key={api_key}"
+        url = _model_url(IMAGE_MODEL, api_key)
         
         payload = {
             "contents": [{
@@ -93,30 +181,45 @@ The creature should look like a familiar companion.""".strip()
             }
         }
         
-        data = json.dumps(payload).encode('utf-8')
-        req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+        with image_admission.admit(), span('gemini'):
+            result = gemini_client.post_json(url, payload, deadline=90, hedge_after=0)
+        print(f"Gemini response received")
         
-        with urllib.request.urlopen(req, timeout=90) as response:
-            result = json.loads(response.read().decode('utf-8'))
-            print(f"Gemini response received")
-            
-            # Check for image in response
-            if 'candidates' in result and len(result['candidates']) > 0:
-                parts = result['candidates'][0].get('content', {}).get('parts', [])
-                for part in parts:
-                    if 'inlineData' in part:
-                        mime_type = part['inlineData'].get('mimeType', 'image/png')
-                        image_base64 = part['inlineData'].get('data', '')
-                        if image_base64:
-                            print("Successfully generated image with Gemini")
-                            return f"data:{mime_type};base64,{image_base64}"
-            
-            print(f"No image in Gemini response, trying fallback...")
-            raise Exception("No image in response")
+        # Check for image in response
+        if 'candidates' in result and len(result['candidates']) > 0:
+            parts = result['candidates'][0].get('content', {}).get('parts', [])
+            for part in parts:
+                if 'inlineData' in part:
+                    mime_type = part['inlineData'].get('mimeType', 'image/png')
+                    image_base64 = part['inlineData'].get('data', '')
+                    if image_base64:
+                        print("Successfully generated image with Gemini")
+                        image_bytes = base64.b64decode(image_base64)
+                        store_image(key, mime_type, image_bytes)
+                        return mime_type, image_bytes
+        
+        print(f"No image in Gemini response, trying fallback...")
+        return None
             
+    except Overloaded:
+        raise
     except Exception as e:
         print(f"Gemini Image Generation Error: {e}")
-        return _fallback_pollinations(species, prompt)
+        return None
+
+
+def generate_familiar_image(species: str, description: str, api_key: str = None) -> str:
+    """Generate a familiar image; returns a data URI, or a Pollinations.ai URL as fallback"""
+    generated = generate_image_bytes(species, description, api_key)
+    if generated is None:
+        return fallback_image_url(species, description)
+    mime_type, image_bytes = generated
+    return f"data:{mime_type};base64,{base64.b64encode(image_bytes).decode('utf-8')}"
+
+
+def fallback_image_url(species: str, description: str) -> str:
+    """Pollinations.ai URL that renders the familiar prompt"""
+    return _fallback_pollinations(species, _image_prompt(species, description))
 
 
 def _fallback_pollinations(species: str, prompt: str) -> str:
@@ -131,6 +234,16 @@ def _fallback_pollinations(species: str, prompt: str) -> str:
         return f"https://picsum.photos/seed/{urllib.parse.quote(species)}/512/512"
 
 
+def load_image_bytes(image_url: str) -> bytes:
+    """Bytes of an image given as a data URI, a local /media/ URL or a remote URL"""
+    inline = parse_data_uri(image_url) or read_media(image_url)
+    if inline is not None:
+        return inline[1]
+    req = urllib.request.Request(image_url, headers={'User-Agent': 'Mozilla/5.0'})
+    with urllib.request.urlopen(req, timeout=30) as response:
+        return response.read()
+
+
 def remove_white_background(image_url: str, threshold: int = 240, tolerance: int = 30) -> str:
     """
     Download an image from URL and remove white/light background, return as base64 PNG with transparency.
@@ -144,45 +257,10 @@ def remove_white_background(image_url: str, threshold: int = 240, tolerance: int
         Base64 encoded PNG string with transparent background
     """
     try:
-        # Download image from URL
-        req = urllib.request.Request(image_url, headers={'User-Agent': 'Mozilla/5.0'})
-        with urllib.request.urlopen(req, timeout=30) as response:
-            image_data = response.read()
-        
-        # Open image with PIL
-        img = Image.open(io.BytesIO(image_data))
-        img = img.convert('RGBA')
-        
-        # Get pixel data
-        pixels = img.load()
-        width, height = img.size
+        img = Image.open(io.BytesIO(load_image_bytes(image_url)))
+        img = cutout_white_background(img, threshold, tolerance)
         
-        # Process each pixel
-        for y in range(height):
-            for x in range(width):
-                r, g, b, a = pixels[x, y]
-                
-                # Calculate if pixel is "white-ish"
-                # Check if all RGB values are above threshold and close to each other
-                is_bright = r > threshold and g > threshold and b > threshold
-                is_neutral = abs(r - g) < tolerance and abs(g - b) < tolerance and abs(r - b) < tolerance
-                
-                if is_bright and is_neutral:
-                    # Make transparent
-                    pixels[x, y] = (r, g, b, 0)
-                else:
-                    # Keep original with full opacity
-                    pixels[x, y] = (r, g, b, 255)
-        
-        # Apply edge smoothing (anti-aliasing for semi-transparent edges)
-        img = smooth_edges(img)
-        
-        # Save to base64
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG', optimize=True)
-        buffer.seek(0)
-        
-        base64_str = base64.b64encode(buffer.getvalue()).decode('utf-8')
+        base64_str = base64.b64encode(encode_png(img)).decode('utf-8')
         return f"data:image/png;base64,{base64_str}"
         
     except Exception as e:
@@ -190,38 +268,70 @@ def remove_white_background(image_url: str, threshold: int = 240, tolerance: int
         return image_url  # Return original URL if processing fails
 
 
+def encode_png(img: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+@timed('bg_removal')
+def cutout_white_background(img: Image.Image, threshold: int = 240, tolerance: int = 30) -> Image.Image:
+    """
+    Make white/light background pixels transparent and smooth the edges.
+    
+    A pixel is background when all of R, G, B are above `threshold` and
+    every pair of channels differs by less than `tolerance`. Background
+    pixels get alpha 0, everything else alpha 255; colours are kept.
+    Works on the whole image at once with NumPy.
+    """
+    rgba = np.array(img.convert('RGBA'))
+    rgb = rgba[:, :, :3].astype(np.int16)
+    r, g, b = rgb[:, :, 0], rgb[:, :, 1], rgb[:, :, 2]
+    
+    is_bright = (r > threshold) & (g > threshold) & (b > threshold)
+    is_neutral = (
+        (np.abs(r - g) < tolerance)
+        & (np.abs(g - b) < tolerance)
+        & (np.abs(r - b) < tolerance)
+    )
+    rgba[:, :, 3] = np.where(is_bright & is_neutral, 0, 255)
+    
+    # Apply edge smoothing (anti-aliasing for semi-transparent edges)
+    return smooth_edges(Image.fromarray(rgba, 'RGBA'))
+
+
 def smooth_edges(img: Image.Image, passes: int = 2) -> Image.Image:
     """
     Smooth the edges of transparent areas to reduce jagged appearance.
+    
+    Each pass averages the alpha of every partially transparent interior
+    pixel with the mean alpha of its 8 neighbours (as read before the pass).
     """
-    pixels = img.load()
-    width, height = img.size
+    rgba = np.array(img.convert('RGBA'))
+    alpha = rgba[:, :, 3].astype(np.int32)
+    height, width = alpha.shape
+    if height < 3 or width < 3:
+        return Image.fromarray(rgba, 'RGBA')
     
     for _ in range(passes):
-        # Create a copy for reading while we write
-        new_img = img.copy()
-        new_pixels = new_img.load()
+        center = alpha[1:-1, 1:-1]
+        
+        # Only process partially transparent or edge pixels
+        partial = (center > 0) & (center < 255)
+        if not partial.any():
+            break  # nothing to smooth, and later passes would see the same alpha
         
-        for y in range(1, height - 1):
-            for x in range(1, width - 1):
-                r, g, b, a = pixels[x, y]
-                
-                # Only process partially transparent or edge pixels
-                if 0 < a < 255:
-                    # Average alpha with neighbors
-                    neighbor_alphas = []
-                    for dy in [-1, 0, 1]:
-                        for dx in [-1, 0, 1]:
-                            if dx == 0 and dy == 0:
-                                continue
-                            _, _, _, na = pixels[x + dx, y + dy]
-                            neighbor_alphas.append(na)
-                    
-                    avg_alpha = sum(neighbor_alphas) // len(neighbor_alphas)
-                    new_alpha = (a + avg_alpha) // 2
-                    new_pixels[x, y] = (r, g, b, new_alpha)
+        # Sum of the 8 neighbours of every interior pixel
+        neighbor_sum = np.zeros_like(center)
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                if dx == 0 and dy == 0:
+                    continue
+                neighbor_sum += alpha[1 + dy:height - 1 + dy, 1 + dx:width - 1 + dx]
         
-        img = new_img
-        pixels = img.load()
+        smoothed = alpha.copy()
+        smoothed[1:-1, 1:-1] = np.where(partial, (center + neighbor_sum // 8) // 2, center)
+        alpha = smoothed
     
-    return img
+    rgba[:, :, 3] = alpha.astype(np.uint8)
+    return Image.fromarray(rgba, 'RGBA')
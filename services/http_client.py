@@ -0,0 +1,255 @@
+"""
+HTTP Client - Pooled keep-alive JSON client for the Gemini API
+
+One shared client keeps a small pool of persistent HTTP(S) connections per
+host, so analyze/generate calls skip the TCP and TLS handshakes after the
+first request. Each call has an overall deadline; attempts that fail with
+a connection error or a retryable status (429, 5xx) are retried with
+full-jitter exponential backoff while time remains. Optionally a hedged
+second request is sent when the first one is slower than `hedge_after`
+seconds, and whichever succeeds first wins.
+"""
+
+import ssl
+import json
+import time
+import queue
+import random
+import threading
+import http.client
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+# Errors that mean a reused keep-alive connection had been dropped by the server
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+class HttpError(Exception):
+    """Non-2xx response"""
+
+    def __init__(self, status: int, body: bytes):
+        super().__init__(f"HTTP {status}: {body[:200]!r}")
+        self.status = status
+        self.body = body
+
+
+class DeadlineExceeded(Exception):
+    """The call's deadline passed before a successful response"""
+
+
+class HttpClient:
+    """
+    Thread-safe pooled JSON-over-HTTP client.
+
+    Args:
+        pool_size: Idle connections kept per host
+        retries: Extra attempts after the first one
+        backoff_base: First backoff ceiling in seconds (doubles per retry)
+        backoff_max: Upper bound for a single backoff
+        hedge_after: Send a second request if the first takes longer (None = off)
+    """
+
+    def __init__(self, pool_size: int = 4, retries: int = 2, backoff_base: float = 0.5,
+                 backoff_max: float = 8.0, hedge_after: float = None):
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after
+        self._pools = {}
+        self._pools_lock = threading.Lock()
+        self._ssl_context = ssl.create_default_context()
+        self._hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='http-hedge')
+        self._stats_lock = threading.Lock()
+        self._stats = {'requests': 0, 'retries': 0, 'hedges': 0, 'hedge_wins': 0,
+                       'connections_opened': 0, 'connections_reused': 0, 'failures': 0}
+
+    # ============ Connection pool ============
+
+    def _pool(self, origin: tuple) -> queue.LifoQueue:
+        with self._pools_lock:
+            if origin not in self._pools:
+                self._pools[origin] = queue.LifoQueue(maxsize=self.pool_size)
+            return self._pools[origin]
+
+    def _acquire(self, origin: tuple, timeout: float):
+        """(connection, reused) for an origin, reusing an idle one when possible"""
+        try:
+            conn = self._pool(origin).get_nowait()
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            self._count('connections_reused')
+            return conn, True
+        except queue.Empty:
+            return self._connect(origin, timeout), False
+
+    def _connect(self, origin: tuple, timeout: float):
+        scheme, host, port = origin
+        if scheme == 'https':
+            conn = http.client.HTTPSConnection(host, port, timeout=timeout, context=self._ssl_context)
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=timeout)
+        self._count('connections_opened')
+        return conn
+
+    def _release(self, origin: tuple, conn):
+        try:
+            self._pool(origin).put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self):
+        """Close all idle connections"""
+        with self._pools_lock:
+            pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            while True:
+                try:
+                    pool.get_nowait().close()
+                except queue.Empty:
+                    break
+
+    # ============ Requests ============
+
+    def _count(self, name: str, n: int = 1):
+        with self._stats_lock:
+            self._stats[name] += n
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        with self._pools_lock:
+            stats['idle_connections'] = sum(pool.qsize() for pool in self._pools.values())
+        return stats
+
+    def _attempt(self, origin: tuple, path: str, body: bytes, headers: dict, deadline_at: float):
+        """One request, limited to the time left until deadline_at; returns (status, headers, body)"""
+        conn, reused = self._acquire(origin, deadline_at - time.monotonic())
+        try:
+            conn.request('POST', path, body=body, headers=headers)
+            response = conn.getresponse()
+        except STALE_CONNECTION_ERRORS:
+            conn.close()
+            remaining = deadline_at - time.monotonic()
+            if not reused or remaining <= 0:
+                raise
+            # The server dropped an idle keep-alive connection before answering;
+            # nothing was received, so resend once on a fresh one in the time left
+            conn = self._connect(origin, remaining)
+            try:
+                conn.request('POST', path, body=body, headers=headers)
+                response = conn.getresponse()
+            except BaseException:
+                conn.close()
+                raise
+        except BaseException:
+            conn.close()
+            raise
+
+        try:
+            data = response.read()
+        except BaseException:
+            conn.close()
+            raise
+
+        if response.will_close:
+            conn.close()
+        else:
+            self._release(origin, conn)
+        return response.status, response.headers, data
+
+    def _backoff(self, attempt: int, retry_after: str = None) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        # Full jitter: uniform between 0 and the exponential ceiling
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _call(self, url: str, body: bytes, headers: dict, deadline_at: float) -> dict:
+        parsed = urllib.parse.urlsplit(url)
+        default_port = 443 if parsed.scheme == 'https' else 80
+        origin = (parsed.scheme, parsed.hostname, parsed.port or default_port)
+        path = parsed.path + (f"?{parsed.query}" if parsed.query else '')
+
+        last_error = None
+        for attempt in range(self.retries + 1):
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                break
+            if attempt:
+                self._count('retries')
+            self._count('requests')
+
+            retry_after = None
+            try:
+                status, response_headers, data = self._attempt(origin, path, body, headers, deadline_at)
+                if 200 <= status < 300:
+                    return json.loads(data.decode('utf-8'))
+                last_error = HttpError(status, data)
+                if status not in RETRYABLE_STATUSES:
+                    raise last_error
+                retry_after = response_headers.get('Retry-After')
+            except (OSError, http.client.HTTPException) as e:
+                last_error = e
+
+            if attempt < self.retries:
+                delay = self._backoff(attempt, retry_after)
+                if time.monotonic() + delay >= deadline_at:
+                    break
+                time.sleep(delay)
+
+        self._count('failures')
+        if last_error is None or time.monotonic() >= deadline_at:
+            raise DeadlineExceeded(f"No response from {origin[1]} within deadline") from last_error
+        raise last_error
+
+    def post_json(self, url: str, payload: dict, deadline: float = 30.0, hedge_after: float = None) -> dict:
+        """
+        POST a JSON payload and return the decoded JSON response.
+
+        Args:
+            url: Absolute http(s) URL
+            payload: JSON-serializable request body
+            deadline: Seconds the whole call (all attempts and backoff) may take
+            hedge_after: Override the client's hedging delay for this call
+
+        Raises:
+            HttpError: Non-retryable status, or retryable status on the last attempt
+            DeadlineExceeded: No successful response before the deadline
+        """
+        body = json.dumps(payload).encode('utf-8')
+        headers = {'Content-Type': 'application/json', 'Connection': 'keep-alive'}
+        deadline_at = time.monotonic() + deadline
+        hedge_after = self.hedge_after if hedge_after is None else hedge_after
+
+        if not hedge_after or hedge_after >= deadline:
+            return self._call(url, body, headers, deadline_at)
+
+        primary = self._hedge_executor.submit(self._call, url, body, headers, deadline_at)
+        done, _ = wait([primary], timeout=hedge_after)
+        if done:
+            return primary.result()
+
+        # The first request is in the slow tail: race a second one against it
+        self._count('hedges')
+        hedge = self._hedge_executor.submit(self._call, url, body, headers, deadline_at)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline_at - time.monotonic()),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._count('hedge_wins')
+                    return future.result()
+                error = future.exception()
+        if error is not None:
+            raise error
+        raise DeadlineExceeded(f"No response from {url.split('?')[0]} within deadline")
@@ -0,0 +1,68 @@
+"""
+Image Cache - Reuse generated familiar images for identical prompts
+
+Generated images are keyed by the image model plus the normalized prompt
+(whitespace collapsed, case-folded) and stored in a DiskCache under
+data/cache/images. With IMAGE_CACHE_VARIANTS > 1 the first N generations
+for a prompt each store a new variant; after that, each request gets one
+of the stored variants at random instead of calling the model again.
+"""
+
+import os
+import random
+import hashlib
+
+from services.disk_cache import DiskCache
+from services.paths import data_path
+
+IMAGE_CACHE_DIR = os.environ.get('IMAGE_CACHE_DIR', data_path('cache', 'images'))
+IMAGE_CACHE_VARIANTS = max(1, int(os.environ.get('IMAGE_CACHE_VARIANTS', '1')))
+
+_ttl = os.environ.get('IMAGE_CACHE_TTL')
+image_cache = DiskCache(
+    IMAGE_CACHE_DIR,
+    max_bytes=int(float(os.environ.get('IMAGE_CACHE_MAX_MB', '200')) * 1024 * 1024),
+    ttl=float(_ttl) if _ttl else None
+)
+
+
+def prompt_key(prompt: str, model: str) -> str:
+    normalized = ' '.join(prompt.split()).casefold()
+    return hashlib.sha256(f"{model}\n{normalized}".encode('utf-8')).hexdigest()
+
+
+def _variant_key(key: str, variant: int) -> str:
+    return f"{key}-{variant}"
+
+
+def _encode(mime_type: str, data: bytes) -> bytes:
+    return mime_type.encode('ascii') + b'\n' + data
+
+
+def _decode(value: bytes) -> tuple:
+    mime_type, _, data = value.partition(b'\n')
+    return mime_type.decode('ascii'), data
+
+
+def get_cached_image(key: str):
+    """
+    (mime_type, bytes) of a cached image for a prompt key, or None when a
+    new image should be generated (nothing cached, or free variant slots).
+    """
+    # Existence checks only stat the files; just the chosen variant is read
+    for variant in range(IMAGE_CACHE_VARIANTS):
+        if not image_cache.contains(_variant_key(key, variant)):
+            image_cache.record_miss()
+            return None
+    value = image_cache.get(_variant_key(key, random.randrange(IMAGE_CACHE_VARIANTS)))
+    return _decode(value) if value is not None else None
+
+
+def store_image(key: str, mime_type: str, data: bytes):
+    """Store a generated image in the first free variant slot (or the first slot)"""
+    for variant in range(IMAGE_CACHE_VARIANTS):
+        if not image_cache.contains(_variant_key(key, variant)):
+            break
+    else:
+        variant = 0
+    image_cache.set(_variant_key(key, variant), _encode(mime_type, data))
@@ -0,0 +1,105 @@
+"""
+Image Hash Service - Perceptual hashes of familiar images
+
+A dHash (difference hash) is 64 bits: the image is reduced to a 9x8
+grayscale thumbnail and each bit records whether a pixel is brighter
+than its right-hand neighbour. Re-encoded, resized or slightly edited
+copies of an image have hashes a few bits apart, so the Hamming distance
+between two hashes measures how alike the images look. Transparent
+pixels are flattened onto white first, so a cut-out familiar hashes like
+the same creature on a white background.
+
+Hashes are stored on the familiar as 16-digit hex strings:
+
+    "image_hashes": {"original_image": "f0e4...", "generated_image": "3c1b..."}
+
+A flat image (blank, one colour) has no gradients, so it hashes to 0 (and
+a smooth left-to-right fade to all ones); such hashes say nothing about
+what is pictured and `is_featureless` tells them apart so they are never
+matched against each other.
+"""
+
+import io
+from PIL import Image
+
+from services.blob_store import IMAGE_FIELDS, read_media, parse_data_uri
+
+HASH_BITS = 64
+_HASH_SIZE = 8
+# JPEGs only need decoding at (about) this size to be hashed
+HASH_DRAFT_SIZE = 64
+# Hashes with fewer set (or clear) bits than this carry no usable detail
+MIN_DETAIL_BITS = 8
+
+
+def dhash(img: Image.Image) -> int:
+    """64-bit difference hash of a decoded image"""
+    if img.mode in ('RGBA', 'LA', 'P'):
+        rgba = img.convert('RGBA')
+        img = Image.new('RGBA', rgba.size, (255, 255, 255, 255))
+        img.alpha_composite(rgba)
+    small = img.convert('L').resize((_HASH_SIZE + 1, _HASH_SIZE), Image.LANCZOS)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(_HASH_SIZE):
+        offset = row * (_HASH_SIZE + 1)
+        for col in range(_HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hash_bytes(data: bytes):
+    """dHash of encoded image bytes, or None if they are not an image"""
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img.draft('RGB', (HASH_DRAFT_SIZE, HASH_DRAFT_SIZE))  # JPEGs decode at a reduced scale
+            return dhash(img)
+    except Exception:
+        return None
+
+
+def hash_image_url(url: str):
+    """dHash of a /media/ URL or inline data URI, or None for anything else"""
+    found = read_media(url)
+    if found is None and isinstance(url, str):
+        found = parse_data_uri(url)
+    if found is None:
+        return None
+    return hash_bytes(found[1])
+
+
+def to_hex(value: int) -> str:
+    return f"{value:016x}"
+
+
+def from_hex(value) -> int:
+    """Parse a stored hash; None if it is missing or malformed"""
+    try:
+        return int(value, 16) if isinstance(value, str) and len(value) == 16 else None
+    except ValueError:
+        return None
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def is_featureless(value: int) -> bool:
+    """True for the hash of a flat or almost flat image"""
+    return not MIN_DETAIL_BITS <= value.bit_count() <= HASH_BITS - MIN_DETAIL_BITS
+
+
+def image_hashes(familiar: dict) -> dict:
+    """Hex hashes of the image fields present in a record (or update) that can be hashed"""
+    hashes = {}
+    for field in IMAGE_FIELDS:
+        value = hash_image_url(familiar.get(field))
+        if value is not None:
+            hashes[field] = to_hex(value)
+    return hashes
+
+
+def add_image_hashes(familiar: dict) -> dict:
+    """Store the hashes of a new familiar's images on it; returns the familiar"""
+    familiar['image_hashes'] = image_hashes(familiar)
+    return familiar
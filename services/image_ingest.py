@@ -0,0 +1,116 @@
+"""
+Image Ingest - Bounded upload reading and normalization for analysis
+
+Uploads are read in chunks with a hard size cap, then decoded once to
+check they really are images (the client-supplied content type and file
+name are ignored). Large photos are downscaled to ANALYSIS_MAX_EDGE -
+JPEGs are decoded at reduced size via draft mode, so a 12 MP photo never
+materializes at full resolution - and re-encoded as a compact JPEG
+before being base64-encoded for Gemini. The upload's perceptual hash is
+taken from that same decode.
+"""
+
+import io
+import os
+from PIL import Image, ImageOps
+
+from services.image_hash import dhash, HASH_DRAFT_SIZE
+
+MAX_UPLOAD_BYTES = int(float(os.environ.get('MAX_UPLOAD_MB', '15')) * 1024 * 1024)
+ANALYSIS_MAX_EDGE = int(os.environ.get('ANALYSIS_MAX_EDGE', '1024'))
+ANALYSIS_JPEG_QUALITY = int(os.environ.get('ANALYSIS_JPEG_QUALITY', '85'))
+
+# Formats accepted for upload, by the name Pillow detects from the content
+ACCEPTED_FORMATS = {'JPEG', 'PNG', 'WEBP', 'GIF', 'BMP', 'TIFF', 'MPO'}
+# Formats Gemini takes as they are, when no resizing is needed
+PASSTHROUGH_MIMES = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'WEBP': 'image/webp'}
+
+CHUNK_SIZE = 64 * 1024
+
+# Refuse decompression bombs: nothing we accept needs more than ~50 MP
+MAX_UPLOAD_PIXELS = 50_000_000
+
+
+class UploadTooLarge(Exception):
+    """The upload exceeded the size cap"""
+
+
+class InvalidImage(ValueError):
+    """The upload is not an image in an accepted format"""
+
+
+def read_upload(stream, max_bytes: int = MAX_UPLOAD_BYTES) -> bytes:
+    """Read a file stream in chunks, raising UploadTooLarge past max_bytes"""
+    buffer = io.BytesIO()
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        if buffer.tell() + len(chunk) > max_bytes:
+            raise UploadTooLarge(f"Upload exceeds {max_bytes // (1024 * 1024)} MB")
+        buffer.write(chunk)
+    return buffer.getvalue()
+
+
+def _flatten(img: Image.Image) -> Image.Image:
+    """RGB image; transparent areas become white like the app's backgrounds"""
+    if img.mode in ('RGBA', 'LA', 'P'):
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel('A'))
+        return background
+    return img.convert('RGB')
+
+
+def normalize_for_analysis(data: bytes, max_edge: int = ANALYSIS_MAX_EDGE,
+                           quality: int = ANALYSIS_JPEG_QUALITY):
+    """
+    Downscale and re-encode an uploaded image for the analysis model.
+
+    Returns:
+        (mime_type, image bytes, dHash of the upload). A JPEG that is
+        already small enough and upright is passed through unchanged (and
+        only decoded at HASH_DRAFT_SIZE, for the hash). The hash is of the
+        image as stored, before EXIF rotation, like image_hash.hash_bytes.
+
+    Raises:
+        InvalidImage: Not decodable, not an accepted format, or more than
+            MAX_UPLOAD_PIXELS
+    """
+    try:
+        img = Image.open(io.BytesIO(data))
+        image_format = img.format
+        if image_format not in ACCEPTED_FORMATS:
+            raise InvalidImage(f"Unsupported image format: {image_format}")
+        # Checked on the header, before any pixels are decoded
+        width, height = img.size
+        if width * height > MAX_UPLOAD_PIXELS:
+            raise InvalidImage(f"Image is too large ({width}x{height} pixels)")
+        orientation = img.getexif().get(0x0112, 1)
+        fits = max(img.size) <= max_edge
+        passthrough = image_format == 'JPEG' and fits and orientation == 1 and img.mode in ('RGB', 'L')
+        if image_format in ('JPEG', 'MPO'):
+            # Let the decoder scale by 1/2, 1/4 or 1/8 while decoding
+            draft_edge = HASH_DRAFT_SIZE if passthrough else max_edge
+            img.draft('RGB', (draft_edge, draft_edge))
+        if passthrough:
+            return 'image/jpeg', data, dhash(img)
+
+        # Rotating the downscaled image is cheaper, and the hash is taken before it
+        img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+        upload_hash = dhash(img)
+        img = _flatten(ImageOps.exif_transpose(img))
+    except InvalidImage:
+        raise
+    except Exception as e:
+        raise InvalidImage("Could not decode image") from e
+
+    out = io.BytesIO()
+    img.save(out, format='JPEG', quality=quality, optimize=True)
+    encoded = out.getvalue()
+
+    # Small PNGs etc. can be smaller as they are; keep them if Gemini accepts the type
+    original_mime = PASSTHROUGH_MIMES.get(image_format)
+    if fits and orientation == 1 and original_mime and len(data) <= len(encoded):
+        return original_mime, data, upload_hash
+    return 'image/jpeg', encoded, upload_hash
@@ -0,0 +1,263 @@
+"""
+Job Service - Background jobs for slow image generation
+
+Generation can take up to 90 seconds, so instead of holding a Flask
+worker it runs on a small bounded thread pool. Callers get a job id at
+once and poll `get()` (or block in `wait_for_change()` for push updates).
+Finished jobs are kept for `ttl` seconds and then forgotten.
+
+Every state change is also written to `directory` (data/jobs), so with
+several worker processes a poll or event stream that lands on another
+worker than the one running the job still finds it; that worker follows
+the job by re-reading its file. The queue bound (max_pending) and the
+thread pool are per process.
+
+Each job file names its owner (host and pid), and the owner rewrites the
+files of its unfinished jobs every HEARTBEAT_INTERVAL seconds. A job
+whose owner is gone (its pid no longer runs on this host, or its
+heartbeat is older than HEARTBEAT_TIMEOUT) is reported as failed instead
+of staying queued or running forever.
+
+Job states: queued -> running -> done | failed
+"""
+
+import os
+import re
+import json
+import time
+import socket
+import uuid
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from services.paths import data_path
+
+FINISHED_STATES = ('done', 'failed')
+# Unfinished jobs' files are refreshed this often by the worker running them
+HEARTBEAT_INTERVAL = 10
+# An unfinished job without a heartbeat for this long belongs to a worker that died
+HEARTBEAT_TIMEOUT = 60
+# How often a job run by another worker is re-read while waiting for a change
+POLL_INTERVAL = 0.5
+
+_JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+_HOST = socket.gethostname()
+
+
+def _running(pid: int) -> bool:
+    """Whether a process with this pid exists on this host"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # exists, but belongs to another user
+    return True
+
+
+class QueueFull(Exception):
+    """Too many jobs are queued or running"""
+
+
+class JobQueue:
+    """
+    Bounded job runner with expiring job state, in memory and (with a
+    `directory`) on disk for the other worker processes.
+
+    Args:
+        max_workers: Jobs that run at the same time
+        max_pending: Queued + running jobs accepted before submit() raises QueueFull
+        ttl: Seconds a finished job stays retrievable
+        directory: Where job state is shared between processes (None: this process only)
+    """
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 20, ttl: float = 600,
+                 directory: str = None):
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.directory = directory
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._changed = threading.Condition()
+        self._heartbeat = None
+
+    def _pending(self) -> int:
+        return sum(1 for job in self._jobs.values() if job['status'] not in FINISHED_STATES)
+
+    def _expire(self):
+        """Drop finished jobs older than the ttl (condition lock held)"""
+        cutoff = time.time() - self.ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job['status'] in FINISHED_STATES and job['updated'] < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+            self._unpublish(job_id)
+
+    # ============ Shared state ============
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def _publish(self, job: dict):
+        """Write a job's state for the other workers (replaced atomically)"""
+        if self.directory is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(job, f)
+            os.replace(tmp_path, self._path(job['id']))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _unpublish(self, job_id: str):
+        if self.directory is not None:
+            try:
+                os.remove(self._path(job_id))
+            except OSError:
+                pass
+
+    def _orphaned(self, job: dict) -> bool:
+        """Whether an unfinished job from a file was left behind by a worker that stopped"""
+        if job['status'] in FINISHED_STATES:
+            return False
+        # A reused pid still running something else is caught by the heartbeat
+        if job.get('host') == _HOST and 'pid' in job and not _running(job['pid']):
+            return True
+        return time.time() - job.get('heartbeat', job['updated']) > HEARTBEAT_TIMEOUT
+
+    def _read(self, job_id: str):
+        """A job of another worker from its file, or None if unknown or expired"""
+        if self.directory is None or not _JOB_ID.match(job_id or ''):
+            return None
+        try:
+            with open(self._path(job_id), 'r', encoding='utf-8') as f:
+                job = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if self._orphaned(job):
+            job = dict(job, status='failed', error='The worker running this job stopped',
+                       revision=job['revision'] + 1)
+            finished = job.get('heartbeat', job['updated'])
+        else:
+            finished = job['updated']
+        if job['status'] in FINISHED_STATES and time.time() - finished > self.ttl:
+            self._unpublish(job_id)
+            return None
+        return job
+
+    def _beat(self):
+        """Refresh the files of this process's unfinished jobs, forever"""
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            with self._changed:
+                for job in self._jobs.values():
+                    if job['status'] not in FINISHED_STATES:
+                        job['heartbeat'] = time.time()
+                        self._publish(job)
+
+    def _start_heartbeat(self):
+        """Start the heartbeat thread on first use (condition lock held)"""
+        if self._heartbeat is None and self.directory is not None:
+            self._heartbeat = threading.Thread(target=self._beat, name='job-heartbeat', daemon=True)
+            self._heartbeat.start()
+
+    def _sweep(self):
+        """Remove the files of expired or orphaned jobs, whichever worker wrote them"""
+        if self.directory is None or not os.path.isdir(self.directory):
+            return
+        for entry in os.scandir(self.directory):
+            job_id = entry.name[:-len('.json')]
+            if entry.name.endswith('.json') and job_id not in self._jobs:
+                self._read(job_id)
+
+    # ============ Jobs ============
+
+    def submit(self, kind: str, fn, *args, **kwargs) -> dict:
+        """Queue fn(*args, **kwargs); its return value becomes the job result"""
+        with self._changed:
+            self._expire()
+            if self._pending() >= self.max_pending:
+                raise QueueFull(f"{self.max_pending} jobs already pending")
+            now = time.time()
+            job = {'id': uuid.uuid4().hex, 'kind': kind, 'status': 'queued', 'revision': 0,
+                   'created': now, 'updated': now, 'result': None, 'error': None,
+                   'host': _HOST, 'pid': os.getpid(), 'heartbeat': now}
+            self._jobs[job['id']] = job
+            self._start_heartbeat()
+            self._publish(job)
+            snapshot = dict(job)
+
+        self._executor.submit(self._run, job['id'], fn, args, kwargs)
+        self._sweep()
+        return snapshot
+
+    def _set(self, job_id: str, **changes):
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                now = time.time()
+                job.update(changes, updated=now, heartbeat=now, revision=job['revision'] + 1)
+                self._publish(job)
+            self._changed.notify_all()
+
+    def _run(self, job_id: str, fn, args, kwargs):
+        self._set(job_id, status='running')
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            self._set(job_id, status='failed', error=str(e))
+        else:
+            self._set(job_id, status='done', result=result)
+
+    def get(self, job_id: str):
+        """Snapshot of a job (of any worker), or None if unknown or expired"""
+        with self._changed:
+            self._expire()
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return dict(job)
+        return self._read(job_id)
+
+    def wait_for_change(self, job_id: str, revision: int, timeout: float):
+        """
+        Block until the job's revision moves past `revision` (or timeout),
+        then return its snapshot; None if the job is unknown.
+        """
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while job_id in self._jobs:
+                job = self._jobs[job_id]
+                remaining = deadline - time.monotonic()
+                if job['revision'] > revision or remaining <= 0:
+                    return dict(job)
+                self._changed.wait(remaining)
+
+        # Run by another worker: follow its file
+        while True:
+            job = self._read(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job['revision'] > revision or remaining <= 0:
+                return job
+            time.sleep(min(POLL_INTERVAL, remaining))
+
+    def stats(self) -> dict:
+        """Counts of this process's jobs by state"""
+        with self._changed:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job['status']] = counts.get(job['status'], 0) + 1
+            return {'jobs': counts, 'max_pending': self.max_pending, 'pid': os.getpid()}
+
+
+job_queue = JobQueue(
+    max_workers=int(os.environ.get('JOB_WORKERS', '2')),
+    max_pending=int(os.environ.get('JOB_QUEUE_LIMIT', '20')),
+    ttl=float(os.environ.get('JOB_TTL', '600')),
+    directory=os.environ.get('JOB_DIR', data_path('jobs'))
+)
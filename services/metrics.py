@@ -0,0 +1,200 @@
+"""
+Metrics Service - Timing spans, latency histograms and Prometheus export
+
+`span(name)` times a block of work (storage reads and writes, Gemini
+calls, background removal, serialization). Each span is recorded in an
+in-process histogram labelled with the current route. It is also added
+to the current request's timings, which routes/metrics_routes.py sends
+back as a Server-Timing header. Spans outside a request (job workers,
+the vote buffer) are labelled route="background". A span nested in
+another span of the same name is not counted twice.
+
+`render_prometheus()` returns all histograms in the Prometheus text
+exposition format, followed by the lines of any registered collectors
+(e.g. the Gemini admission queue gauges).
+"""
+
+import time
+import bisect
+import threading
+import contextvars
+from functools import wraps
+from contextlib import contextmanager
+
+# Upper bounds in seconds; +Inf is implicit
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BACKGROUND_ROUTE = 'background'
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (not thread-safe; guarded by the registry lock)"""
+
+    def __init__(self, buckets: tuple = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def cumulative(self) -> list:
+        """[(upper bound, cumulative count)], ending with ('+Inf', count)"""
+        result, running = [], 0
+        for bound, n in zip(self.buckets + ('+Inf',), self.counts):
+            running += n
+            result.append((bound, running))
+        return result
+
+
+class RequestTimings:
+    """Spans of one request, summed per name in first-seen order"""
+
+    def __init__(self, route: str):
+        self.route = route
+        self.started = time.perf_counter()
+        self.spans = {}
+
+    def add(self, name: str, seconds: float):
+        total, count = self.spans.get(name, (0.0, 0))
+        self.spans[name] = (total + seconds, count + 1)
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, with the time so far as 'app'"""
+        entries = [f'{name};dur={total * 1000:.2f}' for name, (total, _) in self.spans.items()]
+        entries.append(f'app;dur={(time.perf_counter() - self.started) * 1000:.2f}')
+        return ', '.join(entries)
+
+
+class MetricsRegistry:
+    """Request and span histograms, keyed by their label values"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}   # (method, route, status) -> Histogram
+        self.spans = {}      # (route, span) -> Histogram
+        self.in_flight = 0
+
+    def _observe(self, table: dict, key: tuple, seconds: float):
+        with self.lock:
+            histogram = table.get(key)
+            if histogram is None:
+                histogram = table[key] = Histogram()
+            histogram.observe(seconds)
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float):
+        self._observe(self.requests, (method, route, str(status)), seconds)
+
+    def observe_span(self, route: str, name: str, seconds: float):
+        self._observe(self.spans, (route, name), seconds)
+
+    def track_in_flight(self, delta: int):
+        with self.lock:
+            self.in_flight += delta
+
+
+registry = MetricsRegistry()
+
+_current = contextvars.ContextVar('request_timings', default=None)
+_open_spans = contextvars.ContextVar('open_spans', default=())
+
+
+def begin_request(route: str) -> RequestTimings:
+    """Start collecting spans for the request handled by this context"""
+    timings = RequestTimings(route)
+    _current.set(timings)
+    return timings
+
+
+def end_request():
+    _current.set(None)
+
+
+def current_timings():
+    return _current.get()
+
+
+def record_span(name: str, seconds: float):
+    """Record an already measured span (e.g. work done while streaming a body)"""
+    timings = _current.get()
+    registry.observe_span(timings.route if timings else BACKGROUND_ROUTE, name, seconds)
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+@contextmanager
+def span(name: str):
+    """Time the enclosed block as span `name`"""
+    open_spans = _open_spans.get()
+    if name in open_spans:
+        yield
+        return
+    token = _open_spans.set(open_spans + (name,))
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _open_spans.reset(token)
+        record_span(name, time.perf_counter() - start)
+
+
+def timed(name: str):
+    """Decorator form of span()"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ============ Prometheus export ============
+
+_collectors = []
+
+
+def register_collector(collect):
+    """Add a callable returning extra exposition lines (HELP/TYPE included) to render_prometheus()"""
+    _collectors.append(collect)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _histogram_lines(metric: str, labels: dict, histogram: Histogram) -> list:
+    label_text = ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+    lines = [f'{metric}_bucket{{{label_text},le="{bound}"}} {count}'
+             for bound, count in histogram.cumulative()]
+    lines.append(f'{metric}_sum{{{label_text}}} {histogram.total:.6f}')
+    lines.append(f'{metric}_count{{{label_text}}} {histogram.count}')
+    return lines
+
+
+def render_prometheus() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+    with registry.lock:
+        lines = [
+            '# HELP http_request_duration_seconds Time from the start of a request until its body is sent.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        for (method, route, status), histogram in sorted(registry.requests.items()):
+            lines += _histogram_lines('http_request_duration_seconds',
+                                      {'method': method, 'route': route, 'status': status}, histogram)
+        lines += [
+            '# HELP app_span_duration_seconds Time spent in named spans (storage, gemini, ...) per route.',
+            '# TYPE app_span_duration_seconds histogram',
+        ]
+        for (route, name), histogram in sorted(registry.spans.items()):
+            lines += _histogram_lines('app_span_duration_seconds', {'route': route, 'span': name}, histogram)
+        lines += [
+            '# HELP http_requests_in_flight Requests currently being handled.',
+            '# TYPE http_requests_in_flight gauge',
+            f'http_requests_in_flight {registry.in_flight}',
+        ]
+    for collect in _collectors:
+        lines += collect()
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,19 @@
+"""
+Paths - Where the app keeps its state on disk
+
+Everything the app writes lives under DATA_DIR (default: data/ next to
+the code): the familiars file or database and its change log, the blob
+store and its thumbnails, the analysis and image caches, background job
+state and slow-request profiles. Pointing DATA_DIR elsewhere moves all
+of it; each location can still be overridden on its own (SQLITE_FILE,
+BLOB_DIR, ANALYSIS_CACHE_DIR, ...).
+"""
+
+import os
+
+DATA_DIR = os.environ.get('DATA_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data'))
+
+
+def data_path(*parts: str) -> str:
+    """A path under DATA_DIR"""
+    return os.path.join(DATA_DIR, *parts)
@@ -0,0 +1,113 @@
+"""
+Profiler Service - Sampling profiler for slow requests
+
+While enabled, a background thread samples the Python stack of every
+thread that is handling a request, every `interval` seconds. When a
+request turns out to be slower than `slow_after` seconds its samples
+are handed to the slow-request hooks. The default hook writes them as
+folded stacks ("frame;frame;frame count" lines, the input format of
+flamegraph.pl and speedscope) to PROFILE_DIR. Faster requests just
+drop their samples.
+
+Enable with PROFILE_SLOW_MS; PROFILE_INTERVAL_MS sets the sampling rate.
+"""
+
+import os
+import sys
+import time
+import threading
+from collections import Counter
+
+from services.paths import data_path
+
+PROFILE_SLOW_MS = os.environ.get('PROFILE_SLOW_MS')
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', '5'))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', data_path('profiles'))
+
+
+def _folded(frame) -> str:
+    """Stack of a frame as 'outermost;...;innermost'"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class SlowRequestProfiler:
+    """
+    Stack sampler for request threads.
+
+    Args:
+        slow_after: Requests at least this long (seconds) are reported
+        interval: Seconds between samples
+    """
+
+    def __init__(self, slow_after: float, interval: float = 0.005):
+        self.slow_after = slow_after
+        self.interval = interval
+        self.hooks = []
+        self._active = {}  # thread id -> Counter of folded stacks
+        self._lock = threading.Condition()
+        self._thread = None
+
+    def add_hook(self, hook):
+        """Call hook(info: dict, stacks: Counter) for every slow request"""
+        self.hooks.append(hook)
+
+    def start(self, thread_id: int):
+        with self._lock:
+            self._active[thread_id] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+                self._thread.start()
+            self._lock.notify()
+
+    def stop(self, thread_id: int, duration: float, info: dict):
+        with self._lock:
+            stacks = self._active.pop(thread_id, None)
+        if not stacks or duration < self.slow_after:
+            return
+        info = dict(info, duration_ms=round(duration * 1000, 1), samples=sum(stacks.values()))
+        for hook in self.hooks:
+            try:
+                hook(info, stacks)
+            except Exception as e:
+                print(f"Profiler hook error: {e}")
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._active:
+                    self._lock.wait()
+                thread_ids = list(self._active)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id in thread_ids:
+                    frame = frames.get(thread_id)
+                    stacks = self._active.get(thread_id)
+                    if frame is not None and stacks is not None:
+                        stacks[_folded(frame)] += 1
+            time.sleep(self.interval)
+
+
+def write_folded_stacks(info: dict, stacks: Counter):
+    """Default hook: save the samples to PROFILE_DIR/<time>-<method>-<route>.folded"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    route = info.get('route', 'request').strip('/').replace('/', '_').replace('<', '').replace('>', '')
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{int(time.time() * 1000) % 1000:03d}-{info.get('method', '')}-{route or 'root'}.folded"
+    with open(os.path.join(PROFILE_DIR, name), 'w', encoding='utf-8') as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    print(f"Slow request {info.get('method')} {info.get('path')} "
+          f"({info['duration_ms']} ms, {info['samples']} samples) profiled to {name}")
+
+
+def create_profiler():
+    """The profiler configured by PROFILE_SLOW_MS, or None if it is not set"""
+    if not PROFILE_SLOW_MS:
+        return None
+    profiler = SlowRequestProfiler(float(PROFILE_SLOW_MS) / 1000, PROFILE_INTERVAL_MS / 1000)
+    profiler.add_hook(write_folded_stacks)
+    return profiler
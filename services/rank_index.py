@@ -0,0 +1,170 @@
+"""
+Rank Index - Incrementally maintained leaderboard ordering
+
+Keeps every familiar's leaderboard key (magic_power, created_time, id) in
+a chunked sorted list: sorted chunks of at most 2 * CHUNK_SIZE keys, the
+largest key of each chunk, and a Fenwick tree over the chunk lengths.
+Finding a key is a binary search over the chunk maxima and then within
+one chunk, and a position is a Fenwick prefix sum, so creates, votes and
+deletes cost O(log n) (plus shifting at most 2 * CHUNK_SIZE keys inside
+one chunk), `rank_of(id)` O(log n) and `top(k)` O(log n + k). Splitting
+or merging a chunk rebuilds the Fenwick tree, which is amortized over
+the CHUNK_SIZE writes it takes to fill or drain one.
+"""
+
+import bisect
+import threading
+
+CHUNK_SIZE = 512
+
+
+class RankIndex:
+    """
+    Sorted leaderboard keys plus an id -> key map.
+
+    Args:
+        key: Function returning a familiar's sort key; its last element must be the id
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.lock = threading.RLock()
+        self._chunks = []  # sorted chunks, ascending; the leader is last
+        self._maxes = []   # last key of each chunk
+        self._tree = [0]   # Fenwick tree over the chunk lengths (1-based)
+        self._size = 0
+        self._by_id = {}
+        self.seq = None  # change-log seq the index reflects; None = not built
+
+    def __len__(self):
+        return self._size
+
+    def rebuild(self, familiars: list, seq):
+        with self.lock:
+            self._by_id = {f['id']: self.key(f) for f in familiars}
+            keys = sorted(self._by_id.values())
+            self._chunks = [keys[i:i + CHUNK_SIZE] for i in range(0, len(keys), CHUNK_SIZE)]
+            self._reindex()
+            self.seq = seq
+
+    def upsert(self, familiar: dict):
+        with self.lock:
+            self.remove(familiar['id'])
+            key = self.key(familiar)
+            self._insert(key)
+            self._by_id[familiar['id']] = key
+
+    def remove(self, familiar_id: str):
+        with self.lock:
+            key = self._by_id.pop(familiar_id, None)
+            if key is not None:
+                self._delete(key)
+
+    def top(self, k: int, after: tuple = None) -> list:
+        """Ids of the k best familiars, optionally starting below the key `after`"""
+        with self.lock:
+            if not self._chunks:
+                return []
+            if after is None:
+                i = len(self._chunks) - 1
+                j = len(self._chunks[i])
+            else:
+                i, j = self._locate(tuple(after))
+            ids = []
+            while i >= 0 and len(ids) < k:
+                chunk = self._chunks[i]
+                start = max(0, j - (k - len(ids)))
+                ids.extend(key[-1] for key in reversed(chunk[start:j]))
+                i -= 1
+                j = len(self._chunks[i]) if i >= 0 else 0
+            return ids
+
+    def rank_of(self, familiar_id: str):
+        """1-based leaderboard position of a familiar, or None if unknown"""
+        with self.lock:
+            key = self._by_id.get(familiar_id)
+            if key is None:
+                return None
+            return self._size - self._position(key)
+
+    # ============ Chunked sorted list ============
+
+    def _locate(self, key: tuple):
+        """(chunk, offset) of the first key >= `key`; (last chunk, its length) if none"""
+        i = bisect.bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            i -= 1
+            return i, len(self._chunks[i])
+        return i, bisect.bisect_left(self._chunks[i], key)
+
+    def _position(self, key: tuple) -> int:
+        """Number of keys smaller than `key`"""
+        if not self._chunks:
+            return 0
+        i, j = self._locate(key)
+        return self._prefix(i) + j
+
+    def _insert(self, key: tuple):
+        if not self._chunks:
+            self._chunks = [[key]]
+            self._reindex()
+            return
+        i = bisect.bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            i -= 1
+            self._chunks[i].append(key)
+            self._maxes[i] = key
+        else:
+            bisect.insort(self._chunks[i], key)
+        self._size += 1
+        if len(self._chunks[i]) > 2 * CHUNK_SIZE:
+            chunk = self._chunks[i]
+            self._chunks[i:i + 1] = [chunk[:CHUNK_SIZE], chunk[CHUNK_SIZE:]]
+            self._reindex()
+        else:
+            self._add(i, 1)
+
+    def _delete(self, key: tuple):
+        i, j = self._locate(key)
+        chunk = self._chunks[i]
+        del chunk[j]
+        self._size -= 1
+        if len(chunk) < CHUNK_SIZE // 2 and len(self._chunks) > 1:
+            # Fold a small chunk into a neighbour, splitting again if that overfills it
+            n = i - 1 if i > 0 else i
+            merged = self._chunks[n] + self._chunks[n + 1]
+            parts = [merged] if len(merged) <= 2 * CHUNK_SIZE else [merged[:len(merged) // 2],
+                                                                   merged[len(merged) // 2:]]
+            self._chunks[n:n + 2] = parts
+            self._reindex()
+        elif not chunk:
+            self._chunks = []
+            self._reindex()
+        else:
+            self._maxes[i] = chunk[-1]
+            self._add(i, -1)
+
+    def _reindex(self):
+        """Recompute the chunk maxima and the Fenwick tree after chunks split or merge"""
+        self._maxes = [chunk[-1] for chunk in self._chunks]
+        self._size = sum(len(chunk) for chunk in self._chunks)
+        tree = [0] + [len(chunk) for chunk in self._chunks]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _add(self, i: int, delta: int):
+        i += 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, i: int) -> int:
+        """Total length of the chunks before chunk i"""
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
@@ -0,0 +1,194 @@
+"""
+Similarity Service - Hamming-radius search over familiar image hashes
+
+Every familiar's image hashes (see services/image_hash.py) are held in a
+multi-index hash table per image field. Each 64-bit hash is split into
+CHUNKS 16-bit substrings, and every substring position has its own
+table. Two hashes within distance r must agree to within r // CHUNKS
+bits on at least one substring (pigeonhole; see search() for the
+slightly tighter bound used). So a query only probes the buckets that
+close to its own substrings, then checks the candidates' full distance.
+For the radii used here that is a few hundred dict lookups, however
+many familiars there are.
+
+The index is built once from storage and then kept current from the
+change feed, so writes by other processes and workers show up too. If
+the feed was truncated, the index is rebuilt. Hashes of flat images
+(see image_hash.is_featureless) are neither indexed nor searched for, so
+blank uploads don't all match each other.
+"""
+
+import os
+import threading
+from functools import lru_cache
+from itertools import combinations
+
+from services.blob_store import IMAGE_FIELDS
+from services.image_hash import HASH_BITS, from_hex, is_featureless
+from services.storage_service import get_changes, get_change_seq, get_familiar, export_familiars
+
+CHUNKS = 4
+CHUNK_BITS = HASH_BITS // CHUNKS
+_CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+SIMILAR_DISTANCE = int(os.environ.get('SIMILAR_DISTANCE', '8'))
+SIMILAR_MAX_DISTANCE = 12
+# An upload this close to a familiar's original image counts as a near-duplicate
+REUSE_DISTANCE = int(os.environ.get('REUSE_DISTANCE', '4'))
+
+
+@lru_cache(maxsize=None)
+def _flip_masks(bits: int) -> tuple:
+    """Every CHUNK_BITS-bit mask with at most `bits` bits set"""
+    masks = [0]
+    for count in range(1, bits + 1):
+        for positions in combinations(range(CHUNK_BITS), count):
+            masks.append(sum(1 << p for p in positions))
+    return tuple(masks)
+
+
+def _chunks(value: int):
+    return [(value >> (i * CHUNK_BITS)) & _CHUNK_MASK for i in range(CHUNKS)]
+
+
+class MultiIndexHash:
+    """Exact Hamming-radius search over 64-bit hashes, keyed by familiar id"""
+
+    def __init__(self):
+        self.hashes = {}
+        self.tables = [{} for _ in range(CHUNKS)]
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def add(self, key: str, value: int):
+        if self.hashes.get(key) == value:
+            return
+        self.remove(key)
+        self.hashes[key] = value
+        for table, chunk in zip(self.tables, _chunks(value)):
+            table.setdefault(chunk, set()).add(key)
+
+    def remove(self, key: str):
+        value = self.hashes.pop(key, None)
+        if value is None:
+            return
+        for table, chunk in zip(self.tables, _chunks(value)):
+            bucket = table[chunk]
+            bucket.discard(key)
+            if not bucket:
+                del table[chunk]
+
+    def search(self, value: int, radius: int) -> list:
+        """(distance, key) of every hash within `radius` of value, closest first"""
+        # radius = CHUNKS * s + a: some hash within radius differs by <= s
+        # bits in one of the first a + 1 substrings or by <= s - 1 in the rest
+        s, a = divmod(radius, CHUNKS)
+        candidates = set()
+        for i, (table, chunk) in enumerate(zip(self.tables, _chunks(value))):
+            if i > a and s == 0:
+                break
+            for mask in _flip_masks(s if i <= a else s - 1):
+                bucket = table.get(chunk ^ mask)
+                if bucket:
+                    candidates.update(bucket)
+        hashes = self.hashes
+        found = [(distance, key) for key, distance
+                 in ((key, (value ^ hashes[key]).bit_count()) for key in candidates)
+                 if distance <= radius]
+        found.sort()
+        return found
+
+
+class _SimilarityIndex:
+    """One MultiIndexHash per image field, synced with storage by change seq"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seq = None
+        self.fields = {field: MultiIndexHash() for field in IMAGE_FIELDS}
+
+    def _index(self, familiar_id: str, familiar):
+        hashes = (familiar or {}).get('image_hashes') or {}
+        for field, table in self.fields.items():
+            value = from_hex(hashes.get(field))
+            if value is None or is_featureless(value):
+                table.remove(familiar_id)
+            else:
+                table.add(familiar_id, value)
+
+    def _rebuild(self):
+        self.fields = {field: MultiIndexHash() for field in IMAGE_FIELDS}
+        seq = get_change_seq()
+        for familiar in export_familiars():
+            self._index(familiar['id'], familiar)
+        self.seq = seq
+
+    def refresh(self):
+        with self.lock:
+            if self.seq is None:
+                self._rebuild()
+                return self
+            while self.seq != get_change_seq():
+                feed = get_changes(self.seq)
+                if feed['reset']:
+                    self._rebuild()
+                    break
+                for change in feed['changes']:
+                    self._index(change['id'], change.get('familiar'))
+                self.seq = feed['seq']
+                if not feed['more']:
+                    break
+            return self
+
+    def search(self, field: str, value: int, radius: int) -> list:
+        with self.lock:
+            return self.fields[field].search(value, radius)
+
+
+_index = _SimilarityIndex()
+
+
+def find_similar(field: str, value: int, radius: int = SIMILAR_DISTANCE) -> list:
+    """(distance, familiar id) of familiars whose `field` image is within radius, closest first"""
+    if is_featureless(value):
+        return []
+    return _index.refresh().search(field, value, min(radius, SIMILAR_MAX_DISTANCE))
+
+
+def similar_familiars(familiar_id: str, field: str = 'generated_image',
+                      radius: int = SIMILAR_DISTANCE, limit: int = 20):
+    """
+    Familiars that look like a familiar's `field` image.
+
+    Returns:
+        List of (distance, familiar), closest first and without the
+        familiar itself; None if the familiar does not exist. A familiar
+        without a hash for `field`, or with the hash of a flat image, has
+        no similar familiars.
+    """
+    familiar = get_familiar(familiar_id)
+    if familiar is None:
+        return None
+    value = from_hex((familiar.get('image_hashes') or {}).get(field))
+    if value is None:
+        return []
+    found = []
+    for distance, other_id in find_similar(field, value, radius):
+        if other_id == familiar_id:
+            continue
+        other = get_familiar(other_id)
+        if other is not None:
+            found.append((distance, other))
+            if len(found) >= limit:
+                break
+    return found
+
+
+def find_near_duplicate(value: int, radius: int = REUSE_DISTANCE):
+    """(distance, familiar) of the familiar whose original image is closest to a hash, or None"""
+    for distance, familiar_id in find_similar('original_image', value, radius):
+        familiar = get_familiar(familiar_id)
+        if familiar is not None:
+            return distance, familiar
+    return None
@@ -0,0 +1,398 @@
+"""
+SQLite Storage - Indexed storage backend for familiars
+
+Each familiar is one row. The columns that are queried on (id, user_id,
+magic_power, created_time) are real indexed columns; the full record is
+kept as JSON in the `data` column so the data model can grow freely.
+
+The database runs in WAL mode, so readers never block the writer and
+several Flask workers can share one file. Every read-modify-write runs
+inside a `BEGIN IMMEDIATE` transaction, which serializes writers across
+processes instead of losing updates.
+"""
+
+import os
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from services.storage_service import (
+    StorageBackend, Transaction, tally_votes, PAGE_ORDERS, CHANGE_LOG_RETAIN
+)
+from services.change_log import window, CREATED, UPDATED, DELETED
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS familiars (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL,
+    user_id TEXT,
+    magic_power INTEGER NOT NULL DEFAULT 0,
+    created_time INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_familiars_id ON familiars(id);
+CREATE INDEX IF NOT EXISTS idx_familiars_user_id ON familiars(user_id, seq);
+CREATE INDEX IF NOT EXISTS idx_familiars_magic_power ON familiars(magic_power, seq);
+CREATE INDEX IF NOT EXISTS idx_familiars_created_time ON familiars(created_time);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    op TEXT NOT NULL,
+    familiar_id TEXT NOT NULL
+);
+"""
+
+
+def _row_values(familiar: dict) -> tuple:
+    return (
+        familiar['id'],
+        familiar.get('user_id'),
+        int(familiar.get('magic_power', 0) or 0),
+        int(familiar.get('created_time', 0) or 0),
+        json.dumps(familiar),
+    )
+
+
+class SQLiteTransaction(Transaction):
+    """Writes of one `BEGIN IMMEDIATE` transaction; reads see them"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        super().__init__()
+        self.conn = conn
+
+    def get(self, familiar_id: str):
+        row = self.conn.execute('SELECT data FROM familiars WHERE id = ?', (familiar_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def by_user(self, user_id: str) -> list:
+        rows = self.conn.execute('SELECT data FROM familiars WHERE user_id = ? ORDER BY seq DESC',
+                                 (user_id,)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def _put(self, familiar: dict, created: bool):
+        if created:
+            SQLiteStorage._insert_many(self.conn, [familiar])
+            return
+        familiar_id, user_id, magic_power, created_time, data = _row_values(familiar)
+        self.conn.execute(
+            'UPDATE familiars SET user_id = ?, magic_power = ?, created_time = ?, data = ? '
+            'WHERE id = ?',
+            (user_id, magic_power, created_time, data, familiar_id)
+        )
+
+    def _remove(self, familiar_id: str):
+        self.conn.execute('DELETE FROM familiars WHERE id = ?', (familiar_id,))
+
+
+class SQLiteStorage(StorageBackend):
+    """SQLite (WAL) backend with one connection per thread"""
+
+    def __init__(self, path: str, seed: list = None, busy_timeout_ms: int = 5000,
+                 change_retain: int = CHANGE_LOG_RETAIN):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.change_retain = change_retain
+        self._local = threading.local()
+        self._init_schema(seed)
+
+    # ============ Connection handling ============
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            data_dir = os.path.dirname(self.path)
+            if data_dir and not os.path.exists(data_dir):
+                os.makedirs(data_dir)
+            # isolation_level=None: we issue BEGIN/COMMIT ourselves
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000,
+                                   isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout_ms)}')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction; takes the database write lock up front"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def _init_schema(self, seed: list):
+        with self._transaction() as conn:
+            for statement in SCHEMA.split(';'):
+                if statement.strip():
+                    conn.execute(statement)
+            empty = conn.execute('SELECT 1 FROM familiars LIMIT 1').fetchone() is None
+            if empty and seed:
+                self._insert_many(conn, seed)
+                self._bump_version(conn)
+
+    @staticmethod
+    def _bump_version(conn: sqlite3.Connection):
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+
+    def _record_changes(self, conn: sqlite3.Connection, changes: list):
+        """Append [(op, familiar_id), ...] to the change log and prune old entries"""
+        conn.executemany('INSERT INTO changes (op, familiar_id) VALUES (?, ?)', changes)
+        conn.execute('DELETE FROM changes WHERE seq <= '
+                     '(SELECT MAX(seq) FROM changes) - ?', (self.change_retain,))
+
+    @staticmethod
+    def _insert_many(conn: sqlite3.Connection, familiars: list):
+        # Storage order is newest first; seq grows with insertion, so insert oldest first
+        conn.executemany(
+            'INSERT OR REPLACE INTO familiars (id, user_id, magic_power, created_time, data) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (_row_values(f) for f in reversed(familiars))
+        )
+
+    def _select(self, where: str = '', params: tuple = (), order: str = 'seq DESC',
+                limit: int = None) -> list:
+        sql = f'SELECT data FROM familiars {where} ORDER BY {order}'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params = tuple(params) + (limit,)
+        rows = self._connect().execute(sql, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    # ============ StorageBackend ============
+
+    def all(self) -> list:
+        return self._select()
+
+    def get(self, familiar_id: str):
+        row = self._connect().execute(
+            'SELECT data FROM familiars WHERE id = ?', (familiar_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_many(self, familiar_ids) -> dict:
+        familiar_ids = list(familiar_ids)
+        found = {}
+        conn = self._connect()
+        # Chunked to stay under SQLite's bound-parameter limit
+        for start in range(0, len(familiar_ids), 500):
+            chunk = familiar_ids[start:start + 500]
+            placeholders = ', '.join('?' for _ in chunk)
+            for row in conn.execute(f'SELECT data FROM familiars WHERE id IN ({placeholders})', chunk):
+                familiar = json.loads(row[0])
+                found[familiar['id']] = familiar
+        return found
+
+    def insert(self, familiar: dict):
+        with self._transaction() as conn:
+            self._insert_many(conn, [familiar])
+            self._bump_version(conn)
+            self._record_changes(conn, [(CREATED, familiar['id'])])
+
+    def update(self, familiar_id: str, updates: dict) -> bool:
+        with self._transaction() as conn:
+            row = conn.execute(
+                'SELECT data FROM familiars WHERE id = ?', (familiar_id,)
+            ).fetchone()
+            if row is None:
+                return False
+            familiar = {**json.loads(row[0]), **updates, 'id': familiar_id}
+            _, user_id, magic_power, created_time, data = _row_values(familiar)
+            conn.execute(
+                'UPDATE familiars SET user_id = ?, magic_power = ?, created_time = ?, data = ? '
+                'WHERE id = ?',
+                (user_id, magic_power, created_time, data, familiar_id)
+            )
+            self._bump_version(conn)
+            self._record_changes(conn, [(UPDATED, familiar_id)])
+            return True
+
+    def delete(self, familiar_id: str) -> bool:
+        with self._transaction() as conn:
+            if not conn.execute('DELETE FROM familiars WHERE id = ?', (familiar_id,)).rowcount:
+                return False
+            self._bump_version(conn)
+            self._record_changes(conn, [(DELETED, familiar_id)])
+            return True
+
+    def by_user(self, user_id: str) -> list:
+        return self._select('WHERE user_id = ?', (user_id,))
+
+    def leaderboard(self) -> list:
+        return self._select(order=', '.join(f'{column} DESC' for column in PAGE_ORDERS['magic_power']))
+
+    def page(self, order: str, limit: int, after: tuple = None, user_id: str = None) -> list:
+        columns = PAGE_ORDERS[order]
+        clauses, params = [], []
+        if user_id is not None:
+            clauses.append('user_id = ?')
+            params.append(user_id)
+        if after is not None:
+            # Keyset pagination with a row-value comparison
+            placeholders = ', '.join('?' for _ in columns)
+            clauses.append(f"({', '.join(columns)}) < ({placeholders})")
+            params.extend(after)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        order_by = ', '.join(f'{column} DESC' for column in columns)
+        return self._select(where, params, order=order_by, limit=limit)
+
+    def apply_votes(self, votes: dict) -> dict:
+        updated = {}
+        with self._transaction() as conn:
+            for familiar_id, (likes, dislikes) in votes.items():
+                row = conn.execute(
+                    'SELECT data FROM familiars WHERE id = ?', (familiar_id,)
+                ).fetchone()
+                if row is None:
+                    continue
+                familiar = tally_votes(json.loads(row[0]), likes, dislikes)
+                conn.execute(
+                    'UPDATE familiars SET magic_power = ?, data = ? WHERE id = ?',
+                    (familiar['magic_power'], json.dumps(familiar), familiar_id)
+                )
+                updated[familiar_id] = familiar
+            if updated:
+                self._bump_version(conn)
+                self._record_changes(conn, [(UPDATED, familiar_id) for familiar_id in updated])
+        return updated
+
+    @contextmanager
+    def transaction(self):
+        with self._transaction() as conn:
+            tx = SQLiteTransaction(conn)
+            yield tx
+            if tx.changes:
+                self._bump_version(conn)
+                self._record_changes(conn, tx.changes)
+
+    def iter_all(self):
+        # A connection of its own, so a long export (a read snapshot in WAL
+        # mode) never shares this thread's connection with other work
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000)
+        try:
+            cursor = conn.execute('SELECT data FROM familiars ORDER BY seq DESC')
+            while True:
+                rows = cursor.fetchmany(500)
+                if not rows:
+                    break
+                for row in rows:
+                    yield json.loads(row[0])
+        finally:
+            conn.close()
+
+    def sampling_columns(self) -> list:
+        # Indexed columns only: no JSON decoding
+        return self._connect().execute(
+            'SELECT id, created_time, magic_power FROM familiars ORDER BY seq DESC'
+        ).fetchall()
+
+    def import_records(self, records, replace: bool = False) -> int:
+        with self._transaction() as conn:
+            # Stage the stream in a temporary (disk-backed) table so records
+            # never pile up in memory, then move them over in storage order
+            conn.execute('CREATE TEMP TABLE IF NOT EXISTS import_rows (id TEXT PRIMARY KEY, '
+                         'pos INTEGER, user_id TEXT, magic_power INTEGER, created_time INTEGER, data TEXT)')
+            conn.execute('DELETE FROM import_rows')
+            rows = ((pos,) + _row_values(familiar) for pos, familiar in enumerate(records))
+            # A repeated id keeps its first position and its last contents
+            conn.executemany(
+                'INSERT INTO import_rows (pos, id, user_id, magic_power, created_time, data) '
+                'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET user_id = excluded.user_id, '
+                'magic_power = excluded.magic_power, created_time = excluded.created_time, '
+                'data = excluded.data', rows)
+
+            # Log before writing, while it is still known which ids are new
+            conn.execute(
+                "INSERT INTO changes (op, familiar_id) SELECT CASE WHEN id IN (SELECT id FROM familiars) "
+                "THEN ? ELSE ? END, id FROM import_rows ORDER BY pos", (UPDATED, CREATED))
+            changes = []
+            if replace:
+                changes = [(DELETED, row[0]) for row in conn.execute(
+                    'SELECT id FROM familiars WHERE id NOT IN (SELECT id FROM import_rows)')]
+                conn.execute('DELETE FROM familiars')
+            else:
+                conn.execute(
+                    'UPDATE familiars SET user_id = i.user_id, magic_power = i.magic_power, '
+                    'created_time = i.created_time, data = i.data FROM import_rows AS i '
+                    'WHERE familiars.id = i.id')
+            # New familiars go in front, in the order given (seq grows, so insert the last one first)
+            conn.execute(
+                'INSERT INTO familiars (id, user_id, magic_power, created_time, data) '
+                'SELECT id, user_id, magic_power, created_time, data FROM import_rows '
+                'WHERE id NOT IN (SELECT id FROM familiars) ORDER BY pos DESC')
+            self._record_changes(conn, changes)
+            count = conn.execute('SELECT COUNT(*) FROM import_rows').fetchone()[0]
+            conn.execute('DELETE FROM import_rows')
+            self._bump_version(conn)
+        return count
+
+    def version(self) -> int:
+        row = self._connect().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return row[0] if row else 0
+
+    def change_seq(self) -> int:
+        row = self._connect().execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'changes'"
+        ).fetchone()
+        return row[0] if row else 0
+
+    def validator(self) -> str:
+        row = self._connect().execute(
+            "SELECT (SELECT value FROM meta WHERE key = 'version'), "
+            "(SELECT seq FROM sqlite_sequence WHERE name = 'changes')"
+        ).fetchone()
+        return f'sqlite-{row[0] or 0:x}-{row[1] or 0:x}'
+
+    def changes_since(self, since: int, limit: int = 1000) -> dict:
+        conn = self._connect()
+        # One read transaction so the entries and the current seq agree
+        conn.execute('BEGIN')
+        try:
+            current = self.change_seq()
+            oldest = conn.execute('SELECT MIN(seq) FROM changes').fetchone()[0]
+            entries = conn.execute(
+                'SELECT seq, op, familiar_id FROM changes WHERE seq > ? ORDER BY seq LIMIT ?',
+                (since, limit + 1)
+            ).fetchall()
+        finally:
+            conn.execute('COMMIT')
+        return window(entries, since, current, oldest if oldest is not None else current + 1, limit)
+
+    def stats(self) -> dict:
+        return {'change_seq': self.change_seq()}
+
+
+def migrate_json_to_sqlite(json_path: str, db_path: str, replace: bool = False) -> int:
+    """
+    One-shot import of a familiars.json file into a SQLite database.
+
+    Existing rows with the same id are overwritten. With replace=True the
+    table is emptied first so the database mirrors the JSON file exactly.
+
+    Returns:
+        Number of familiars imported
+    """
+    with open(json_path, 'r', encoding='utf-8') as f:
+        familiars = json.load(f)
+
+    storage = SQLiteStorage(db_path)
+    imported = {f['id'] for f in familiars}
+    with storage._transaction() as conn:
+        changes = []
+        if replace:
+            existing = [row[0] for row in conn.execute('SELECT id FROM familiars')]
+            changes.extend((DELETED, i) for i in existing if i not in imported)
+            conn.execute('DELETE FROM familiars')
+        storage._insert_many(conn, familiars)
+        storage._bump_version(conn)
+        changes.extend((UPDATED, i) for i in imported)
+        storage._record_changes(conn, changes)
+    return len(familiars)
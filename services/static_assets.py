@@ -0,0 +1,240 @@
+"""
+Static Assets - Build step and manifest for fingerprinted front-end files
+
+`build_assets()` (run with `flask --app app assets build`) writes
+static/dist/ from the files under static/:
+
+- images: the original plus WebP and AVIF encodings at several widths
+- js/css: a copy plus pre-compressed .gz and, if the optional `brotli`
+  package is installed, .br siblings
+
+Every output name carries a content hash (`app.3f2a9c1b04.js`), so the
+files can be cached forever. static/dist/manifest.json maps each source
+path to its outputs; templates resolve URLs through `asset_url()` and
+fall back to the plain /static/ URL when nothing has been built.
+"""
+
+import io
+import os
+import json
+import gzip
+import shutil
+import mimetypes
+import hashlib
+import tempfile
+import threading
+from PIL import Image, features
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip variants are built
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_FILE = os.path.join(DIST_DIR, 'manifest.json')
+ASSET_URL_PREFIX = '/assets/'
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+TEXT_EXTENSIONS = ('.js', '.css')
+IMAGE_WIDTHS = (256, 512, 1024, 1920)
+IMAGE_FORMATS = [('webp', 'WEBP', 'image/webp', {'quality': 80, 'method': 6})]
+if features.check('avif'):
+    # Listed first: the smallest format the browser accepts wins
+    IMAGE_FORMATS.insert(0, ('avif', 'AVIF', 'image/avif', {'quality': 60}))
+
+
+def _fingerprint(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+def _write(out_dir: str, relative_path: str, data: bytes) -> str:
+    """Write data under out_dir with a fingerprinted name; returns that name"""
+    base, ext = os.path.splitext(relative_path)
+    name = f"{base}.{_fingerprint(data)}{ext}"
+    path = os.path.join(out_dir, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return name.replace(os.sep, '/')
+
+
+def _build_image(source: str, relative_path: str, out_dir: str) -> dict:
+    with open(source, 'rb') as f:
+        original = f.read()
+    img = Image.open(io.BytesIO(original))
+    img.load()
+
+    entry = {'file': _write(out_dir, relative_path, original), 'width': img.width,
+             'height': img.height, 'variants': []}
+    widths = [w for w in IMAGE_WIDTHS if w < img.width] + [img.width]
+    base = os.path.splitext(relative_path)[0]
+    for width in widths:
+        resized = img if width == img.width else img.resize(
+            (width, round(img.height * width / img.width)), Image.LANCZOS)
+        for ext, pil_format, mime, options in IMAGE_FORMATS:
+            buffer = io.BytesIO()
+            resized.save(buffer, format=pil_format, **options)
+            name = _write(out_dir, f"{base}-{width}.{ext}", buffer.getvalue())
+            entry['variants'].append({'file': name, 'width': width, 'type': mime})
+    return entry
+
+
+def _build_text(source: str, relative_path: str, out_dir: str) -> dict:
+    with open(source, 'rb') as f:
+        data = f.read()
+    name = _write(out_dir, relative_path, data)
+    path = os.path.join(out_dir, name)
+    encodings = []
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    encodings.append('gzip')
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+        encodings.append('br')
+    return {'file': name, 'encodings': encodings}
+
+
+def build_assets(static_dir: str = STATIC_DIR, out_dir: str = DIST_DIR) -> dict:
+    """
+    Rebuild out_dir from static_dir and write its manifest.
+
+    The new build is assembled in a temp directory and swapped in, so a
+    running server never sees a half-written dist/.
+
+    Returns:
+        The manifest: source path -> {'file', ...} (paths relative to out_dir)
+    """
+    parent = os.path.dirname(out_dir)
+    tmp_dir = tempfile.mkdtemp(dir=parent, prefix='.dist-')
+    manifest = {}
+    try:
+        for root, dirs, files in os.walk(static_dir):
+            dirs[:] = sorted(d for d in dirs
+                             if os.path.join(root, d) != out_dir and not d.startswith('.'))
+            for filename in sorted(files):
+                source = os.path.join(root, filename)
+                relative_path = os.path.relpath(source, static_dir).replace(os.sep, '/')
+                ext = os.path.splitext(filename)[1].lower()
+                if ext in IMAGE_EXTENSIONS:
+                    manifest[relative_path] = _build_image(source, relative_path, tmp_dir)
+                elif ext in TEXT_EXTENSIONS:
+                    manifest[relative_path] = _build_text(source, relative_path, tmp_dir)
+
+        with open(os.path.join(tmp_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+
+        old_dir = None
+        if os.path.exists(out_dir):
+            old_dir = tempfile.mkdtemp(dir=parent, prefix='.dist-old-')
+            os.rmdir(old_dir)
+            os.rename(out_dir, old_dir)
+        os.rename(tmp_dir, out_dir)
+        if old_dir is not None:
+            shutil.rmtree(old_dir, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    _manifest.invalidate()
+    return manifest
+
+
+# ============ Manifest lookups ============
+
+class _Manifest:
+    """manifest.json, reloaded when the file changes"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._data = {}
+
+    def invalidate(self):
+        with self._lock:
+            self._mtime = None
+
+    def get(self) -> dict:
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return {}
+        with self._lock:
+            if mtime != self._mtime:
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        self._data = json.load(f)
+                except (OSError, ValueError):
+                    self._data = {}
+                self._mtime = mtime
+            return self._data
+
+
+_manifest = _Manifest(MANIFEST_FILE)
+
+
+def asset_url(path: str) -> str:
+    """Fingerprinted URL of a static file, or its plain /static/ URL if not built"""
+    entry = _manifest.get().get(path)
+    if entry is None:
+        return f"/static/{path}"
+    return ASSET_URL_PREFIX + entry['file']
+
+
+def image_sources(path: str, max_width: int = None) -> dict:
+    """
+    Responsive sources for an image, for <picture> or CSS image-set().
+
+    Args:
+        path: Source path under static/, e.g. 'images/forest.png'
+        max_width: Leave out variants wider than this (the smallest one is
+            kept if none fit)
+
+    Returns:
+        {'src': fallback URL, 'sources': [{'type': mime, 'srcset': '... 512w, ...',
+        'url': largest allowed variant}]}; 'sources' is empty if not built
+    """
+    entry = _manifest.get().get(path)
+    if entry is None or 'variants' not in entry:
+        return {'src': asset_url(path), 'sources': []}
+
+    sources = []
+    for _, _, mime, _ in IMAGE_FORMATS:
+        variants = sorted((v for v in entry['variants'] if v['type'] == mime),
+                          key=lambda v: v['width'])
+        if max_width is not None:
+            variants = [v for v in variants if v['width'] <= max_width] or variants[:1]
+        if variants:
+            sources.append({
+                'type': mime,
+                'srcset': ', '.join(f"{ASSET_URL_PREFIX}{v['file']} {v['width']}w" for v in variants),
+                'url': ASSET_URL_PREFIX + variants[-1]['file'],
+            })
+    return {'src': asset_url(path), 'sources': sources}
+
+
+def background_image(path: str, max_width: int = 1920) -> str:
+    """
+    CSS declarations for a background image: a plain url() fallback, then
+    an image-set() that lets the browser pick AVIF/WebP.
+    """
+    images = image_sources(path, max_width)
+    css = f"background-image: url('{images['src']}');"
+    if images['sources']:
+        options = ', '.join(f"url('{s['url']}') type('{s['type']}')" for s in images['sources'])
+        fallback_type = mimetypes.guess_type(path)[0] or 'image/png'
+        css += f" background-image: image-set({options}, url('{images['src']}') type('{fallback_type}'));"
+    return css
+
+
+def resolve_asset(name: str):
+    """
+    Path of a built file and the pre-compressed encodings available for it,
+    or None if `name` is not in the current build.
+    """
+    path = os.path.normpath(os.path.join(DIST_DIR, name))
+    if not path.startswith(DIST_DIR + os.sep) or not os.path.isfile(path):
+        return None
+    encodings = [e for e, suffix in (('br', '.br'), ('gzip', '.gz')) if os.path.isfile(path + suffix)]
+    return path, encodings
@@ -16,13 +16,48 @@ Storage Service - Local JSON file storage for familiars
 - lane: 飞行航道 (0-4)
 - speed: 飞行速度
 - is_main: 是否为主魔宠
+
+Two backends implement the same StorageBackend interface:
+- json:   the original data/familiars.json file (default)
+- sqlite: an indexed SQLite database in WAL mode (services/sqlite_storage.py)
+
+Select one with the STORAGE_BACKEND environment variable. The public
+functions are timed as the storage_read / storage_write spans
+(services/metrics.py).
+
+Read-modify-write work on several familiars goes through a unit of work,
+which commits in one write (one file replace or one SQLite transaction)
+under one lock hold, or not at all:
+
+    with transaction() as tx:
+        for f in tx.by_user(CURRENT_USER_ID):
+            tx.update(f['id'], {'is_main': f['id'] == main_id})
 """
 
 import os
 import json
-import random
+import heapq
+import zlib
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within a process
+    fcntl = None
+
+from services.rank_index import RankIndex
+from services.change_log import FileChangeLog, CREATED, UPDATED, DELETED
+from services.metrics import timed, span
+from services.paths import DATA_DIR
 
-STORAGE_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'familiars.json')
+STORAGE_FILE = os.path.join(DATA_DIR, 'familiars.json')
+LOCK_FILE = STORAGE_FILE + '.lock'
+CHANGES_FILE = os.path.join(DATA_DIR, 'familiars.changes.ndjson')
+CHANGE_LOG_RETAIN = int(os.environ.get('CHANGE_LOG_RETAIN', '10000'))
+SQLITE_FILE = os.environ.get('SQLITE_FILE', os.path.join(DATA_DIR, 'familiars.db'))
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'json').lower()
 CURRENT_USER_ID = 'local_user'
 
 # Mock data with new data model
@@ -116,8 +151,80 @@ def _ensure_storage_dir():
         os.makedirs(data_dir)
 
 
-def get_familiars() -> list:
-    _ensure_storage_dir()
+# ============ JSON file cache ============
+
+class FamiliarsCache:
+    """
+    Parsed contents of the JSON storage file, shared by the whole process.
+
+    The cache is revalidated against the file's (mtime, size, inode) on every
+    read, so writes made by other processes are picked up; writes made by
+    this process go through `_save_familiars`, which refreshes the cache in
+    place. `version` increases every time the cached contents change.
+
+    Cached records are shared between callers and must be treated as
+    read-only; mutate copies and save them through the storage API.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.records = None
+        self.signature = None
+        self._index = None
+        self._user_index = None
+        self.version = 0
+        self.write_depth = 0
+        self.hits = 0
+        self.misses = 0
+
+    def store(self, records: list, signature):
+        with self.lock:
+            self.records = records
+            self.signature = signature
+            self._index = None
+            self._user_index = None
+            self.version += 1
+
+    def index(self) -> dict:
+        """id -> record map for the cached records, built on first use"""
+        with self.lock:
+            if self._index is None:
+                self._index = {f['id']: f for f in self.records}
+            return self._index
+
+    def user_index(self) -> dict:
+        """user_id -> [familiar id, ...] (storage order) for the cached records, built on first use"""
+        with self.lock:
+            if self._user_index is None:
+                self._user_index = {}
+                for f in self.records:
+                    self._user_index.setdefault(f.get('user_id'), []).append(f['id'])
+            return self._user_index
+
+    def stats(self) -> dict:
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+                'version': self.version,
+                'records': len(self.records) if self.records is not None else 0,
+            }
+
+
+_cache = FamiliarsCache()
+
+
+def _file_signature():
+    try:
+        st = os.stat(STORAGE_FILE)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _read_familiars_file() -> list:
     if not os.path.exists(STORAGE_FILE):
         with open(STORAGE_FILE, 'w', encoding='utf-8') as f:
             json.dump(MOCK_FAMILIARS, f, indent=2)
@@ -129,46 +236,759 @@ def get_familiars() -> list:
         return MOCK_FAMILIARS.copy()
 
 
+def _load_familiars() -> list:
+    """Cached list of all familiars; see FamiliarsCache for the sharing rules"""
+    _ensure_storage_dir()
+    with _cache.lock:
+        signature = _file_signature()
+        if _cache.records is not None and signature is not None and _cache.signature == signature:
+            _cache.hits += 1
+            return _cache.records
+        _cache.misses += 1
+        records = _read_familiars_file()
+        _cache.store(records, _file_signature())
+        return records
+
+
+# Serializes the writers of this process; other processes are kept out by the flock
+_writer = threading.RLock()
+
+
+@contextmanager
+def _write_lock():
+    """
+    Hold the JSON writer lock: _writer for threads of this process and an
+    flock on LOCK_FILE for other processes. Re-entrant. Readers are never
+    blocked by it; the cache lock is only taken to swap in saved records.
+    """
+    with _writer:
+        if fcntl is None or _cache.write_depth:
+            _cache.write_depth += 1
+            try:
+                yield
+            finally:
+                _cache.write_depth -= 1
+            return
+
+        _ensure_storage_dir()
+        with open(LOCK_FILE, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            _cache.write_depth += 1
+            try:
+                yield
+            finally:
+                _cache.write_depth -= 1
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def tally_votes(familiar: dict, likes: int, dislikes: int) -> dict:
+    """Return a copy of a familiar with votes added and magic_power recomputed"""
+    new_likes = familiar.get('likes', 0) + likes
+    new_dislikes = familiar.get('dislikes', 0) + dislikes
+    return {**familiar, 'likes': new_likes, 'dislikes': new_dislikes,
+            'magic_power': new_likes - new_dislikes}
+
+
 def _save_familiars(familiars: list):
+    """Replace the storage file atomically (temp file + rename), so a crash never leaves half of it"""
     _ensure_storage_dir()
-    with open(STORAGE_FILE, 'w', encoding='utf-8') as f:
-        json.dump(familiars, f, indent=2)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(STORAGE_FILE), prefix='.familiars-',
+                                    suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(familiars, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, STORAGE_FILE)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    # Write-through: the saved list becomes the cached copy (store() takes the cache lock)
+    _cache.store(familiars, _file_signature())
+
+
+# ============ Page ordering ============
+
+# Sort keys for paginated listings, all descending. Each ends with the id so
+# keys are unique and a page cursor can resume right after the last item.
+PAGE_ORDERS = {
+    'newest': ('created_time', 'id'),
+    'magic_power': ('magic_power', 'created_time', 'id'),
+}
+
+
+def page_key(familiar: dict, order: str) -> tuple:
+    return tuple(familiar['id'] if column == 'id' else (familiar.get(column) or 0)
+                 for column in PAGE_ORDERS[order])
+
+
+# ============ Backends ============
+
+BATCH_OPS = ('create', 'update', 'delete', 'vote')
+
+
+class Transaction:
+    """
+    A unit of work handed out by StorageBackend.transaction(). Reads see
+    the transaction's own writes. Backends implement get/by_user and the
+    two primitive writes; the operations below are shared.
+
+    `changes` collects the (op, id) change-log entries; `upserts` and
+    `removals` the net effect per familiar, for the rank index.
+    """
+
+    def __init__(self):
+        self.changes = []
+        self.upserts = {}
+        self.removals = set()
+
+    def get(self, familiar_id: str):
+        """A single familiar by id, or None"""
+        raise NotImplementedError
+
+    def by_user(self, user_id: str) -> list:
+        """The familiars of one user, newest first"""
+        raise NotImplementedError
+
+    def _put(self, familiar: dict, created: bool):
+        raise NotImplementedError
+
+    def _remove(self, familiar_id: str):
+        raise NotImplementedError
+
+    def _written(self, op: str, familiar: dict):
+        self.changes.append((op, familiar['id']))
+        self.removals.discard(familiar['id'])
+        self.upserts[familiar['id']] = familiar
+        return familiar
+
+    def insert(self, familiar: dict):
+        """Add a new familiar; returns it, or None if the id already exists"""
+        if self.get(familiar['id']) is not None:
+            return None
+        self._put(familiar, created=True)
+        return self._written(CREATED, familiar)
+
+    def update(self, familiar_id: str, updates: dict):
+        """Merge fields into a familiar; returns the updated familiar, or None if missing"""
+        familiar = self.get(familiar_id)
+        if familiar is None:
+            return None
+        familiar = {**familiar, **updates, 'id': familiar_id}
+        self._put(familiar, created=False)
+        return self._written(UPDATED, familiar)
+
+    def vote(self, familiar_id: str, likes: int = 0, dislikes: int = 0):
+        """Add votes and recompute magic_power; returns the familiar, or None if missing"""
+        familiar = self.get(familiar_id)
+        if familiar is None:
+            return None
+        familiar = tally_votes(familiar, likes, dislikes)
+        self._put(familiar, created=False)
+        return self._written(UPDATED, familiar)
+
+    def delete(self, familiar_id: str):
+        """Delete a familiar; returns it as it was, or None if missing"""
+        familiar = self.get(familiar_id)
+        if familiar is None:
+            return None
+        self._remove(familiar_id)
+        self.changes.append((DELETED, familiar_id))
+        self.upserts.pop(familiar_id, None)
+        self.removals.add(familiar_id)
+        return familiar
+
+    def apply(self, op: str, familiar_id: str, payload):
+        """Run one StorageBackend.apply_batch operation"""
+        if op == 'create':
+            return self.insert(payload)
+        if op == 'update':
+            return self.update(familiar_id, payload)
+        if op == 'vote':
+            return self.vote(familiar_id, *payload)
+        if op == 'delete':
+            return self.delete(familiar_id)
+        raise ValueError(f"Unknown batch op: {op!r}")
+
+
+class StorageBackend:
+    """Interface shared by every storage backend"""
+
+    def all(self) -> list:
+        """All familiars, newest first"""
+        raise NotImplementedError
+
+    def get(self, familiar_id: str):
+        """A single familiar by id, or None"""
+        raise NotImplementedError
+
+    def get_many(self, familiar_ids) -> dict:
+        """id -> familiar for the given ids that exist, in one lookup"""
+        found = ((familiar_id, self.get(familiar_id)) for familiar_id in familiar_ids)
+        return {familiar_id: f for familiar_id, f in found if f is not None}
+
+    def insert(self, familiar: dict):
+        raise NotImplementedError
+
+    def update(self, familiar_id: str, updates: dict) -> bool:
+        """Merge fields into a familiar; returns False if it does not exist"""
+        raise NotImplementedError
+
+    def delete(self, familiar_id: str) -> bool:
+        """Delete a familiar; returns False if it does not exist"""
+        raise NotImplementedError
+
+    def by_user(self, user_id: str) -> list:
+        raise NotImplementedError
+
+    def leaderboard(self) -> list:
+        """All familiars in descending PAGE_ORDERS['magic_power'] (the rank index order)"""
+        raise NotImplementedError
+
+    def page(self, order: str, limit: int, after: tuple = None, user_id: str = None) -> list:
+        """
+        Up to `limit` familiars in descending PAGE_ORDERS[order], starting
+        after the familiar whose page_key is `after`.
+        """
+        raise NotImplementedError
+
+    def apply_votes(self, votes: dict) -> dict:
+        """
+        Atomically add votes and recompute magic_power.
+
+        Args:
+            votes: familiar id -> (likes to add, dislikes to add)
+
+        Returns:
+            familiar id -> updated familiar, for the ids that exist
+        """
+        raise NotImplementedError
+
+    def transaction(self):
+        """
+        Context manager yielding a Transaction. Its writes are committed in
+        one write when the block exits normally and discarded if it raises;
+        other writers wait until then.
+        """
+        raise NotImplementedError
+
+    def apply_batch(self, operations: list) -> list:
+        """
+        Apply many operations in one write (one transaction).
+
+        Args:
+            operations: [(op, familiar id, payload), ...] where op is one of
+                BATCH_OPS: 'create' (payload: the familiar), 'update'
+                (payload: fields to change), 'delete' (payload: None) or
+                'vote' (payload: (likes, dislikes) to add)
+
+        Returns:
+            One entry per operation: the familiar as created/updated/deleted,
+            or None if it did not exist (or, for 'create', already existed)
+        """
+        with self.transaction() as tx:
+            return [tx.apply(op, familiar_id, payload) for op, familiar_id, payload in operations]
+
+    def iter_all(self):
+        """All familiars, newest first, without holding them all in memory where possible"""
+        return iter(self.all())
+
+    def sampling_columns(self) -> list:
+        """[(id, created_time, magic_power), ...] of every familiar, for forest sampling"""
+        return [(f['id'], f.get('created_time', 0) or 0, f.get('magic_power', 0) or 0)
+                for f in self.all()]
+
+    def import_records(self, records, replace: bool = False) -> int:
+        """
+        Upsert familiars from an iterable in one write. Familiars that are
+        new are placed before existing ones in the order given; with
+        replace=True every familiar that is not imported is deleted.
+
+        Returns:
+            Number of records imported
+        """
+        raise NotImplementedError
+
+    def version(self) -> int:
+        """Counter that increases whenever the stored familiars change"""
+        raise NotImplementedError
+
+    def change_seq(self) -> int:
+        """Sequence number of the latest recorded change"""
+        raise NotImplementedError
+
+    def validator(self) -> str:
+        """
+        Cheap token that changes whenever the stored familiars change and is
+        the same in every process sharing the storage (unlike version()).
+        Used to build HTTP ETags without loading any records.
+        """
+        raise NotImplementedError
+
+    def changes_since(self, since: int, limit: int = 1000) -> dict:
+        """
+        Changes recorded after sequence `since`, one per familiar.
+
+        Returns:
+            {'seq': resume point, 'reset': True if `since` is no longer (or not
+            yet) covered by the log, 'more': True if `limit` cut the result
+            short, 'changes': [{'seq', 'op', 'id'}, ...]}
+        """
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {}
+
 
+class JsonTransaction(Transaction):
+    """
+    Pending writes over one loaded snapshot of the JSON file. Reads go
+    through the cache's id and user indexes plus an overlay of the
+    familiars written so far; records() builds the list to save.
+    """
 
+    def __init__(self):
+        super().__init__()
+        self._records = _load_familiars()
+        self._index = _cache.index()
+        self._user_index = _cache.user_index()
+        self._overlay = {}   # id -> familiar as written, or None once deleted
+        self._created = {}   # ids created in this transaction, oldest first
+
+    def get(self, familiar_id: str):
+        if familiar_id in self._overlay:
+            return self._overlay[familiar_id]
+        return self._index.get(familiar_id)
+
+    def by_user(self, user_id: str) -> list:
+        familiars = []
+        candidates = dict.fromkeys(list(reversed(self._created)) + self._user_index.get(user_id, [])
+                                   + list(self._overlay))
+        for familiar_id in candidates:
+            familiar = self.get(familiar_id)
+            if familiar is not None and familiar.get('user_id') == user_id:
+                familiars.append(familiar)
+        return familiars
+
+    def _put(self, familiar: dict, created: bool):
+        self._overlay[familiar['id']] = familiar
+        if created:
+            self._created[familiar['id']] = True
+
+    def _remove(self, familiar_id: str):
+        self._overlay[familiar_id] = None
+        self._created.pop(familiar_id, None)
+
+    def records(self) -> list:
+        """All familiars after this transaction, newest first (created ones in front)"""
+        familiars = [self._overlay[familiar_id] for familiar_id in reversed(self._created)]
+        for f in self._records:
+            if f['id'] in self._created:
+                continue
+            f = self._overlay.get(f['id'], f)
+            if f is not None:
+                familiars.append(f)
+        return familiars
+
+
+class JsonStorage(StorageBackend):
+    """The original whole-file JSON storage, read through FamiliarsCache"""
+
+    def __init__(self):
+        self.changes = FileChangeLog(CHANGES_FILE, retain=CHANGE_LOG_RETAIN)
+        _ensure_storage_dir()
+        with self._writing():
+            pass  # logs changes a crashed writer left pending
+
+    @contextmanager
+    def _writing(self):
+        """The writer lock, after logging anything a crashed writer left pending"""
+        with _write_lock():
+            self.changes.recover()
+            yield
+
+    def _commit(self, familiars: list, changes: list):
+        """Save the familiars and log their changes (writer lock held)"""
+        self.changes.prepare(changes)
+        _save_familiars(familiars)
+        self.changes.commit()
+
+    def all(self) -> list:
+        return list(_load_familiars())
+
+    def get(self, familiar_id: str):
+        _load_familiars()
+        return _cache.index().get(familiar_id)
+
+    def get_many(self, familiar_ids) -> dict:
+        with _cache.lock:
+            _load_familiars()
+            index = _cache.index()
+        return {familiar_id: index[familiar_id] for familiar_id in familiar_ids if familiar_id in index}
+
+    def insert(self, familiar: dict):
+        with self._writing():
+            self._commit([familiar] + _load_familiars(), [(CREATED, familiar['id'])])
+
+    def update(self, familiar_id: str, updates: dict) -> bool:
+        with self._writing():
+            familiars = list(_load_familiars())
+            for i, f in enumerate(familiars):
+                if f['id'] == familiar_id:
+                    familiars[i] = {**f, **updates}
+                    self._commit(familiars, [(UPDATED, familiar_id)])
+                    return True
+            return False
+
+    def delete(self, familiar_id: str) -> bool:
+        with self._writing():
+            current = _load_familiars()
+            familiars = [f for f in current if f['id'] != familiar_id]
+            if len(familiars) == len(current):
+                return False
+            self._commit(familiars, [(DELETED, familiar_id)])
+            return True
+
+    def by_user(self, user_id: str) -> list:
+        with _cache.lock:
+            _load_familiars()
+            index, ids = _cache.index(), _cache.user_index().get(user_id, [])
+        return [index[familiar_id] for familiar_id in ids]
+
+    def leaderboard(self) -> list:
+        return sorted(_load_familiars(), key=lambda f: page_key(f, 'magic_power'), reverse=True)
+
+    def page(self, order: str, limit: int, after: tuple = None, user_id: str = None) -> list:
+        candidates = _load_familiars()
+        if user_id is not None:
+            candidates = self.by_user(user_id)
+        if after is not None:
+            candidates = (f for f in candidates if page_key(f, order) < after)
+        # Partial selection: O(n log limit) instead of sorting everything
+        return heapq.nlargest(limit, candidates, key=lambda f: page_key(f, order))
+
+    def apply_votes(self, votes: dict) -> dict:
+        updated = {}
+        with self._writing():
+            familiars = list(_load_familiars())
+            for i, f in enumerate(familiars):
+                if f['id'] in votes:
+                    likes, dislikes = votes[f['id']]
+                    familiars[i] = updated[f['id']] = tally_votes(f, likes, dislikes)
+            if updated:
+                self._commit(familiars, [(UPDATED, familiar_id) for familiar_id in updated])
+        return updated
+
+    @contextmanager
+    def transaction(self):
+        with self._writing():
+            tx = JsonTransaction()
+            yield tx
+            if tx.changes:
+                self._commit(tx.records(), tx.changes)
+
+    def import_records(self, records, replace: bool = False) -> int:
+        with self._writing():
+            existing = {f['id']: f for f in _load_familiars()}
+            imported = {}
+            for familiar in records:
+                imported[familiar['id']] = familiar
+            if replace:
+                familiars = list(imported.values())
+                removed = [familiar_id for familiar_id in existing if familiar_id not in imported]
+            else:
+                new = [f for familiar_id, f in imported.items() if familiar_id not in existing]
+                familiars = new + [imported.get(familiar_id, f) for familiar_id, f in existing.items()]
+                removed = []
+            self._commit(familiars, [(UPDATED if familiar_id in existing else CREATED, familiar_id)
+                                     for familiar_id in imported]
+                         + [(DELETED, familiar_id) for familiar_id in removed])
+        return len(imported)
+
+    def version(self) -> int:
+        _load_familiars()
+        return _cache.version
+
+    def change_seq(self) -> int:
+        return self.changes.current()
+
+    def validator(self) -> str:
+        # The change seq also covers same-size writes within one mtime tick
+        signature = _file_signature() or (0, 0, 0)
+        parts = signature + (self.changes.current(),)
+        return 'json-' + '-'.join(f'{part:x}' for part in parts)
+
+    def changes_since(self, since: int, limit: int = 1000) -> dict:
+        return self.changes.since(since, limit)
+
+    def stats(self) -> dict:
+        return {'cache': _cache.stats(), 'change_seq': self.changes.current()}
+
+
+_backend = None
+
+
+def get_backend() -> StorageBackend:
+    """Return the configured storage backend, creating it on first use"""
+    global _backend
+    if _backend is None:
+        if STORAGE_BACKEND == 'sqlite':
+            from services.sqlite_storage import SQLiteStorage
+            seed = None if os.path.exists(STORAGE_FILE) else MOCK_FAMILIARS
+            _backend = SQLiteStorage(SQLITE_FILE, seed=seed)
+        elif STORAGE_BACKEND == 'json':
+            _backend = JsonStorage()
+        else:
+            raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+    return _backend
+
+
+# ============ Leaderboard rank index ============
+
+_ranks = RankIndex(key=lambda f: page_key(f, 'magic_power'))
+RANK_REPLAY_BATCH = 1000
+
+
+def _ranked() -> RankIndex:
+    """
+    The rank index, caught up with writes made outside this process by
+    replaying the change log since the seq it reflects. It is rebuilt
+    from all familiars only at first use or once the log no longer
+    reaches back that far.
+    """
+    backend = get_backend()
+    seq = backend.change_seq()
+    with _ranks.lock:
+        if _ranks.seq == seq:
+            return _ranks
+        while _ranks.seq is not None:
+            feed = backend.changes_since(_ranks.seq, RANK_REPLAY_BATCH)
+            if feed['reset']:
+                _ranks.seq = None
+                break
+            # The log is written after the records, so these are at least as new as the feed
+            current = backend.get_many([c['id'] for c in feed['changes'] if c['op'] != DELETED])
+            for change in feed['changes']:
+                familiar = current.get(change['id'])
+                if familiar is None:
+                    _ranks.remove(change['id'])
+                else:
+                    _ranks.upsert(familiar)
+            _ranks.seq = feed['seq']
+            if not feed['more']:
+                return _ranks
+        # Seq first: changes made while loading are replayed again later, which is harmless
+        seq = backend.change_seq()
+        _ranks.rebuild(backend.all(), seq)
+    return _ranks
+
+
+def _track(changes: int, upserts=(), removals=()):
+    """
+    Apply a write of `changes` change-log entries made through this module
+    to the rank index, if nothing else was written since the index was
+    last caught up. Otherwise the next read replays the log instead.
+    """
+    seq = get_backend().change_seq()
+    with _ranks.lock:
+        if _ranks.seq is not None and seq == _ranks.seq + changes:
+            for familiar in upserts:
+                if familiar is not None:
+                    _ranks.upsert(familiar)
+            for familiar_id in removals:
+                _ranks.remove(familiar_id)
+            _ranks.seq = seq
+
+
+# ============ Public API ============
+
+@timed('storage_read')
+def get_familiars() -> list:
+    return get_backend().all()
+
+
+@timed('storage_read')
+def get_familiar(familiar_id: str):
+    return get_backend().get(familiar_id)
+
+
+@timed('storage_read')
+def get_familiars_by_ids(familiar_ids: list) -> list:
+    """The familiars with these ids that exist, in the order given, in one read"""
+    familiars = get_backend().get_many(familiar_ids)
+    return [familiars[familiar_id] for familiar_id in familiar_ids if familiar_id in familiars]
+
+
+@timed('storage_write')
 def save_familiar(familiar: dict):
-    familiars = get_familiars()
-    familiars.insert(0, familiar)
-    _save_familiars(familiars)
+    get_backend().insert(familiar)
+    _track(1, upserts=[familiar])
 
 
+@timed('storage_write')
 def update_familiar(familiar_id: str, updates: dict):
-    familiars = get_familiars()
-    for i, f in enumerate(familiars):
-        if f['id'] == familiar_id:
-            familiars[i] = {**f, **updates}
-            break
-    _save_familiars(familiars)
+    # Nothing written, nothing to track: stamping the current version on the
+    # index could hide a write made meanwhile by another process
+    if get_backend().update(familiar_id, updates):
+        _track(1, upserts=[get_backend().get(familiar_id)])
 
 
+@timed('storage_write')
 def delete_familiar(familiar_id: str):
-    familiars = get_familiars()
-    familiars = [f for f in familiars if f['id'] != familiar_id]
-    _save_familiars(familiars)
+    if get_backend().delete(familiar_id):
+        _track(1, removals=[familiar_id])
 
 
+@timed('storage_read')
 def get_user_familiars() -> list:
-    return [f for f in get_familiars() if f.get('user_id') == CURRENT_USER_ID]
+    return get_backend().by_user(CURRENT_USER_ID)
 
 
+@timed('storage_read')
 def get_leaderboard() -> list:
-    return sorted(get_familiars(), key=lambda x: x.get('magic_power', 0), reverse=True)
+    return get_backend().leaderboard()
+
+
+@timed('storage_read')
+def get_top_familiars(limit: int, after: tuple = None) -> list:
+    """Top of the leaderboard from the rank index, without sorting"""
+    return get_familiars_by_ids(_ranked().top(limit, after))
+
+
+@timed('storage_read')
+def get_rank(familiar_id: str):
+    """(rank, total) of a familiar on the leaderboard, or None if it doesn't exist"""
+    ranks = _ranked()
+    with ranks.lock:
+        rank = ranks.rank_of(familiar_id)
+        return None if rank is None else (rank, len(ranks))
+
+
+@timed('storage_read')
+def get_familiars_page(order: str, limit: int, after: tuple = None, user_id: str = None) -> list:
+    """One page of familiars; see StorageBackend.page"""
+    if order == 'magic_power' and user_id is None:
+        return get_top_familiars(limit, after)
+    return get_backend().page(order, limit, after, user_id)
+
+
+@timed('storage_write')
+def increment_votes(familiar_id: str, likes: int = 0, dislikes: int = 0):
+    """Add votes to one familiar in a single write; returns it, or None if missing"""
+    return apply_votes({familiar_id: (likes, dislikes)}).get(familiar_id)
+
+
+@timed('storage_write')
+def apply_votes(votes: dict) -> dict:
+    """Apply coalesced votes {id: (likes, dislikes)} in a single write"""
+    updated = get_backend().apply_votes(votes)
+    if updated:
+        _track(len(updated), upserts=updated.values())
+    return updated
+
+
+@contextmanager
+def transaction():
+    """
+    Unit of work: `with transaction() as tx:` reads and writes familiars
+    through tx (get, by_user, insert, update, vote, delete), and all of
+    its writes are saved together in one write when the block ends. If
+    the block raises, nothing is saved.
+    """
+    with span('storage_write'):
+        with get_backend().transaction() as tx:
+            yield tx
+        if tx.changes:
+            _track(len(tx.changes), upserts=tx.upserts.values(), removals=tx.removals)
+
+
+@timed('storage_write')
+def apply_batch(operations: list) -> list:
+    """Apply [(op, id, payload), ...] in one write; see StorageBackend.apply_batch"""
+    with transaction() as tx:
+        return [tx.apply(op, familiar_id, payload) for op, familiar_id, payload in operations]
 
 
+@timed('storage_write')
+def import_familiars(records, replace: bool = False) -> int:
+    """Bulk upsert familiars from an iterable; see StorageBackend.import_records"""
+    # The rank index replays the import's change-log entries on its next read
+    return get_backend().import_records(records, replace)
+
+
+def export_familiars():
+    """Iterate over all familiars, newest first (streams from SQLite)"""
+    return get_backend().iter_all()
+
+
+@timed('storage_read')
+def get_changes(since: int, limit: int = 1000) -> dict:
+    """
+    Familiars created, updated or deleted after change sequence `since`.
+
+    Created/updated entries carry the current record (with flight
+    defaults) under 'familiar'; see StorageBackend.changes_since for the
+    other fields.
+    """
+    backend = get_backend()
+    feed = backend.changes_since(since, limit)
+    current = backend.get_many([c['id'] for c in feed['changes'] if c['op'] != DELETED])
+    for change in feed['changes']:
+        if change['op'] != DELETED:
+            familiar = current.get(change['id'])
+            if familiar is None:
+                # Deleted after the log was read; the delete entry follows
+                change['op'] = DELETED
+            else:
+                change['familiar'] = fill_flight_defaults([familiar])[0]
+    return feed
+
+
+@timed('storage_read')
+def get_sampling_columns() -> list:
+    return get_backend().sampling_columns()
+
+
+@timed('storage_read')
+def get_change_seq() -> int:
+    return get_backend().change_seq()
+
+
+@timed('storage_read')
+def storage_validator() -> str:
+    return get_backend().validator()
+
+
+@timed('storage_read')
 def get_forest_familiars() -> list:
-    familiars = get_familiars()
+    return fill_flight_defaults(get_familiars())
+
+
+def default_speed(familiar_id: str) -> float:
+    """Flight speed (seconds per crossing) derived from the id"""
+    return 10 + (zlib.crc32(str(familiar_id).encode('utf-8')) >> 8) % 1500 / 100
+
+
+def fill_flight_defaults(familiars: list) -> list:
+    """
+    Give familiars without a lane/speed one for the forest view. Both are
+    derived from the id, so a familiar keeps its flight path across reloads
+    and change-feed updates.
+    """
     for i, f in enumerate(familiars):
-        if 'lane' not in f:
-            f['lane'] = i % 5
-        if 'speed' not in f:
-            f['speed'] = 10 + random.random() * 15
+        if 'lane' in f and 'speed' in f:
+            continue
+        # Records may be shared with the cache, so fill in a copy
+        f = familiars[i] = dict(f)
+        h = zlib.crc32(str(f['id']).encode('utf-8'))
+        f.setdefault('lane', h % 5)
+        f.setdefault('speed', default_speed(f['id']))
     return familiars
+
+
+def storage_version() -> int:
+    return get_backend().version()
+
+
+def storage_stats() -> dict:
+    return {'backend': STORAGE_BACKEND, **get_backend().stats()}
@@ -0,0 +1,165 @@
+"""
+Thumbnail Service - Fixed-size image derivatives for list views
+
+The forest, cabin and leaderboard render familiars at 48-144 px, so they
+load small square thumbnails instead of the full images. Thumbnails are
+derived from blobs in the blob store and cached next to them:
+
+    data/blobs/thumbs/ab/<digest>_<size>.webp
+
+They are created when a familiar is saved and, for older records, lazily
+on their first request. Alpha is preserved (WebP, or PNG when this Pillow
+build has no WebP support).
+"""
+
+import io
+import os
+import tempfile
+from PIL import Image, features
+
+from services import blob_store
+
+THUMBNAIL_SIZES = (128, 256)
+THUMBNAIL_DIR = os.path.join(blob_store.BLOB_DIR, 'thumbs')
+
+if features.check('webp'):
+    THUMBNAIL_FORMAT, THUMBNAIL_MIME, THUMBNAIL_EXT = 'WEBP', 'image/webp', 'webp'
+else:
+    THUMBNAIL_FORMAT, THUMBNAIL_MIME, THUMBNAIL_EXT = 'PNG', 'image/png', 'png'
+
+
+def thumbnail_path(digest: str, size: int) -> str:
+    return os.path.join(THUMBNAIL_DIR, digest[:2], f"{digest}_{size}.{THUMBNAIL_EXT}")
+
+
+def remove_thumbnails(digest: str):
+    """Delete the cached thumbnails of a blob"""
+    for size in THUMBNAIL_SIZES:
+        try:
+            os.remove(thumbnail_path(digest, size))
+        except OSError:
+            pass
+
+
+def thumbnail_url(image_url: str, size: int):
+    """URL of a thumbnail for a stored image, or None if it isn't in the blob store"""
+    digest = blob_store.digest_of(image_url)
+    if digest is None:
+        return None
+    return f"{blob_store.MEDIA_URL_PREFIX}{digest}/{size}"
+
+
+def render_thumbnail(data: bytes, size: int) -> bytes:
+    """Fit an image into a size x size box, keeping aspect ratio and alpha"""
+    return encode_thumbnail(Image.open(io.BytesIO(data)), size)
+
+
+def encode_thumbnail(img: Image.Image, size: int) -> bytes:
+    """render_thumbnail for an already decoded image (which is left untouched)"""
+    img = img.convert('RGBA') if img.mode in ('RGBA', 'LA', 'P') else img.convert('RGB')
+    img.thumbnail((size, size), Image.LANCZOS)
+
+    buffer = io.BytesIO()
+    if THUMBNAIL_FORMAT == 'WEBP':
+        img.save(buffer, format='WEBP', quality=80, method=4)
+    else:
+        img.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def get_thumbnail(name: str, size: int):
+    """
+    Path of the thumbnail for a blob, rendering and caching it on first use.
+
+    Args:
+        name: Blob name as used in its media URL (`<digest>` or `<digest>.<ext>`)
+        size: One of THUMBNAIL_SIZES
+
+    Returns:
+        Path to the thumbnail file, or None if the size or blob is unknown
+        or the blob is not a decodable image
+    """
+    if size not in THUMBNAIL_SIZES:
+        return None
+    found = blob_store.resolve(name)
+    if found is None:
+        return None
+
+    source_path, _ = found
+    digest = os.path.basename(source_path).split('.')[0]
+    path = thumbnail_path(digest, size)
+    if os.path.exists(path):
+        return path
+
+    with open(source_path, 'rb') as f:
+        source = f.read()
+    try:
+        data = render_thumbnail(source, size)
+    except OSError:
+        # Not an image (or a truncated one): nothing to render
+        return None
+    _write_thumbnail(path, data)
+    return path
+
+
+def _write_thumbnail(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def store_thumbnails(image_url: str, img: Image.Image) -> dict:
+    """
+    Render all thumbnails of a just-stored blob from its decoded image,
+    skipping a re-read and re-decode of the blob. Returns {size: url}.
+    """
+    digest = blob_store.digest_of(image_url)
+    if digest is None:
+        return {}
+    urls = {}
+    for size in THUMBNAIL_SIZES:
+        path = thumbnail_path(digest, size)
+        if not os.path.exists(path):
+            _write_thumbnail(path, encode_thumbnail(img, size))
+        urls[str(size)] = thumbnail_url(image_url, size)
+    return urls
+
+
+def create_thumbnails(familiar: dict):
+    """Render all thumbnails for a familiar's stored images ahead of the first request"""
+    for field in blob_store.IMAGE_FIELDS:
+        digest = blob_store.digest_of(familiar.get(field))
+        if digest is None:
+            continue
+        if all(os.path.exists(thumbnail_path(digest, size)) for size in THUMBNAIL_SIZES):
+            continue
+        found = blob_store.resolve(digest)
+        if found is None:
+            continue
+        try:
+            # Decoded once; every size is resized from the same image
+            with Image.open(found[0]) as img:
+                img.load()
+                store_thumbnails(familiar[field], img)
+        except Exception as e:
+            print(f"Thumbnail error ({field}): {e}")
+
+
+def with_thumbnails(familiar: dict) -> dict:
+    """
+    Copy of a familiar with a `thumbnails` map of {field: {size: url}} for its
+    stored images. Images that aren't in the blob store get no entry.
+    """
+    thumbnails = {}
+    for field in blob_store.IMAGE_FIELDS:
+        if blob_store.digest_of(familiar.get(field)) is not None:
+            thumbnails[field] = {str(size): thumbnail_url(familiar[field], size)
+                                 for size in THUMBNAIL_SIZES}
+    return {**familiar, 'thumbnails': thumbnails}
@@ -0,0 +1,135 @@
+"""
+Vote Buffer - Write-behind coalescing of likes/dislikes
+
+With write-behind enabled, a vote only increments an in-memory counter.
+Votes for the same familiar are coalesced, and a background thread
+flushes them to storage in one batch every `interval` seconds, or
+sooner once `max_pending` votes have piled up.
+
+A flush takes the pending votes out of the buffer before writing them,
+but they keep counting as pending until the write commits, so the count
+returned to a voter never drops by a batch that is still being written.
+
+Votes still in the buffer are lost if the process is killed; they are
+flushed on normal interpreter exit.
+"""
+
+import atexit
+import threading
+
+from services.storage_service import apply_votes
+
+
+class VoteBuffer:
+    """Coalesces votes per familiar and flushes them in batches"""
+
+    def __init__(self, flush_fn=apply_votes, interval: float = 1.0, max_pending: int = 100):
+        self.flush_fn = flush_fn
+        self.interval = interval
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._in_flight = {}   # batch being written by flush()
+        self._flushed = threading.Condition(self._lock)
+        self._flush_seq = 0    # flushes started
+        self._count = 0
+        self._wake = threading.Event()
+        self._thread = None
+        self.flushes = 0
+        self.flushed_votes = 0
+
+    def start(self):
+        """Start the background flusher (idempotent)"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='vote-buffer', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+        return self
+
+    def vote(self, familiar_id: str, load, likes: int = 0, dislikes: int = 0) -> tuple:
+        """
+        Read a familiar with load() and buffer a vote for it.
+
+        A read can't tell whether it already sees a batch whose write is
+        in progress, so a vote for a familiar in that batch waits for the
+        write to commit, and a read that overlaps the start of a flush is
+        done again.
+
+        Returns:
+            (familiar, (likes, dislikes)): the familiar as load() found it
+            and the votes for it not in storage yet, this vote included;
+            (None, (0, 0)) without buffering the vote if it doesn't exist
+        """
+        while True:
+            with self._lock:
+                while familiar_id in self._in_flight:
+                    self._flushed.wait()
+                started = self._flush_seq
+            familiar = load()
+            with self._lock:
+                if self._flush_seq != started:
+                    continue
+                if familiar is None:
+                    return None, (0, 0)
+                pending_likes, pending_dislikes = self._pending.get(familiar_id, (0, 0))
+                pending = (pending_likes + likes, pending_dislikes + dislikes)
+                self._pending[familiar_id] = pending
+                self._count += 1
+                if self._count >= self.max_pending:
+                    self._wake.set()
+            return familiar, pending
+
+    def pending(self, familiar_id: str) -> tuple:
+        """(likes, dislikes) not in storage yet, including a batch being flushed"""
+        with self._lock:
+            likes, dislikes = self._pending.get(familiar_id, (0, 0))
+            flushing_likes, flushing_dislikes = self._in_flight.get(familiar_id, (0, 0))
+            return likes + flushing_likes, dislikes + flushing_dislikes
+
+    def flush(self) -> int:
+        """Write all pending votes to storage; returns the number of familiars touched"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                votes, self._count = self._count, 0
+                if not batch:
+                    return 0
+                self._in_flight = batch
+                self._flush_seq += 1
+            try:
+                self.flush_fn(batch)
+            except Exception as e:
+                print(f"Vote flush error: {e}")
+                # Put the batch back so the votes are retried on the next flush
+                with self._lock:
+                    for familiar_id, (likes, dislikes) in batch.items():
+                        pending_likes, pending_dislikes = self._pending.get(familiar_id, (0, 0))
+                        self._pending[familiar_id] = (pending_likes + likes, pending_dislikes + dislikes)
+                    self._count += votes
+                    self._in_flight = {}
+                    self._flushed.notify_all()
+                return 0
+            with self._lock:
+                self._in_flight = {}
+                self._flushed.notify_all()
+            self.flushes += 1
+            self.flushed_votes += votes
+            return len(batch)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'pending_votes': self._count,
+                'pending_familiars': len(self._pending),
+                'flushing_familiars': len(self._in_flight),
+                'flushes': self.flushes,
+                'flushed_votes': self.flushed_votes,
+            }
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
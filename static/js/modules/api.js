@@ -15,7 +15,13 @@ const API = {
      */
     async request(url, options = {}) {
         try {
-            const response = await fetch(url, options);
+            let response = await fetch(url, options);
+            if (response.status === 429) {
+                // AI endpoints are at capacity: wait as asked (up to 10s) and try once more
+                const retryAfter = Math.min(Number(response.headers.get('Retry-After')) || 2, 10);
+                await new Promise(resolve => setTimeout(resolve, retryAfter * 1000));
+                response = await fetch(url, options);
+            }
             if (!response.ok) {
                 throw new Error(`HTTP ${response.status}: ${response.statusText}`);
             }
@@ -26,6 +32,17 @@ const API = {
         }
     },
 
+    /**
+     * Pick the thumbnail of a familiar image, falling back to the full image
+     * @param {object} familiar - Familiar from a list endpoint
+     * @param {string} field - 'generated_image' or 'original_image'
+     * @param {number} size - Thumbnail size in px (128 or 256)
+     * @returns {string}
+     */
+    thumbnail(familiar, field, size) {
+        return familiar.thumbnails?.[field]?.[size] || familiar[field] || '';
+    },
+
     // ============ Analysis & Generation ============
     
     /**
@@ -53,6 +70,35 @@ const API = {
         });
     },
 
+    /**
+     * Start generating a familiar image (with background removal) as a background job
+     * @param {string} species - The species of familiar
+     * @param {string} description - Description for image generation
+     * @returns {Promise<{jobId: string, status: string, statusUrl: string, eventsUrl: string}>}
+     */
+    async startGeneration(species, description) {
+        return this.request('/api/generate', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ species, description, threshold: 235, tolerance: 35 })
+        });
+    },
+
+    /**
+     * Poll a background job until it finishes
+     * @param {string} jobId - Job ID from startGeneration
+     * @param {number} interval - Poll interval in ms
+     * @returns {Promise<any>} The job result
+     */
+    async waitForJob(jobId, interval = 1000) {
+        while (true) {
+            const job = await this.request(`/api/jobs/${jobId}`);
+            if (job.status === 'done') return job.result;
+            if (job.status === 'failed') throw new Error(job.error || 'Job failed');
+            await new Promise(resolve => setTimeout(resolve, interval));
+        }
+    },
+
     /**
      * Remove white background from image
      * @param {string} imageUrl - URL of image to process
@@ -69,13 +115,38 @@ const API = {
     },
 
     // ============ Familiar CRUD ============
+
+    /**
+     * Fetch every page of a list endpoint, following X-Next-Cursor
+     * @param {string} url - List endpoint, with its query string if any
+     * @returns {Promise<{familiars: Array, seq: number}>} seq is the first page's X-Change-Seq
+     */
+    async requestAllPages(url) {
+        const separator = url.includes('?') ? '&' : '?';
+        const familiars = [];
+        let seq = null;
+        let cursor = null;
+        do {
+            const pageUrl = cursor ? `${url}${separator}after=${encodeURIComponent(cursor)}` : url;
+            const response = await fetch(pageUrl);
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+            }
+            if (seq === null) {
+                seq = parseInt(response.headers.get('X-Change-Seq') || '0', 10);
+            }
+            familiars.push(...await response.json());
+            cursor = response.headers.get('X-Next-Cursor');
+        } while (cursor);
+        return { familiars, seq };
+    },
     
     /**
      * Get all familiars
      * @returns {Promise<Array>}
      */
     async getAllFamiliars() {
-        return this.request('/api/familiars');
+        return (await this.requestAllPages('/api/familiars?limit=500')).familiars;
     },
 
     /**
@@ -83,7 +154,48 @@ const API = {
      * @returns {Promise<Array>}
      */
     async getForestFamiliars() {
-        return this.request('/api/familiars/forest');
+        return (await this.requestAllPages('/api/familiars/forest?limit=500')).familiars;
+    },
+
+    /**
+     * Get familiars for forest view together with the change sequence they reflect
+     * @returns {Promise<{familiars: Array, seq: number}>}
+     */
+    async getForestSnapshot() {
+        return this.requestAllPages('/api/familiars/forest?limit=500');
+    },
+
+    /**
+     * Get a bounded, weighted sample of familiars for the forest
+     * @param {number} seed - Viewer seed; the same seed gets the same window
+     * @param {number} size - Maximum number of familiars
+     * @returns {Promise<{familiars: Array, seq: number}>}
+     */
+    async getForestWindow(seed, size) {
+        const response = await fetch(`/api/familiars/forest/window?seed=${seed}&size=${size}`);
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+        }
+        const seq = parseInt(response.headers.get('X-Change-Seq') || '0', 10);
+        return { familiars: await response.json(), seq };
+    },
+
+    /**
+     * Get familiars created, updated or deleted since a change sequence
+     * @param {number} since - Sequence from getForestWindow or a previous call
+     * @returns {Promise<{seq: number, reset: boolean, more: boolean, changes: Array}>}
+     */
+    async getChanges(since) {
+        return this.request(`/api/familiars/changes?since=${since}`);
+    },
+
+    /**
+     * Open a server-sent event stream of changes since a sequence
+     * @param {number} since - Sequence to resume from
+     * @returns {EventSource}
+     */
+    streamChanges(since) {
+        return new EventSource(`/api/familiars/changes/stream?since=${since}`);
     },
 
     /**
@@ -91,15 +203,25 @@ const API = {
      * @returns {Promise<Array>}
      */
     async getUserFamiliars() {
-        return this.request('/api/familiars/user');
+        return (await this.requestAllPages('/api/familiars/user?limit=500')).familiars;
     },
 
     /**
      * Get leaderboard rankings
+     * @param {number} limit - Number of top familiars to fetch
      * @returns {Promise<Array>}
      */
-    async getLeaderboard() {
-        return this.request('/api/familiars/leaderboard');
+    async getLeaderboard(limit = 100) {
+        return this.request(`/api/familiars/leaderboard?limit=${limit}`);
+    },
+
+    /**
+     * Get a familiar's leaderboard position
+     * @param {string} id - Familiar ID
+     * @returns {Promise<{id: string, rank: number, total: number}>}
+     */
+    async getRank(id) {
+        return this.request(`/api/familiars/${id}/rank`);
     },
 
     /**
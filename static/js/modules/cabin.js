@@ -93,7 +93,7 @@ const Cabin = {
         div.style.left = pos.left;
 
         // Extract data with fallbacks
-        const generatedImg = f.generated_image || f.imageUrl || '';
+        const generatedImg = API.thumbnail(f, 'generated_image', 256) || f.imageUrl || '';
         const animalName = f.animal_name || f.name || 'Unknown';
         const isMain = f.is_main || f.isMain || false;
 
@@ -112,12 +112,13 @@ const Cabin = {
      * Show management menu for a familiar
      * @param {object} familiar - Familiar data
      */
-    showMenu(familiar) {
+    async showMenu(familiar) {
         const animalName = familiar.animal_name || familiar.name || 'Unknown';
         const magicPower = familiar.magic_power ?? familiar.magicPoints ?? 0;
+        const rank = await this.rankLabel(familiar.id);
         
         const action = prompt(
-            `${animalName} (${magicPower} MP)\n\nOptions:\n1. Type new name to rename\n2. Type "DELETE" to release\n3. Type "MAIN" to set as main\n4. Cancel to close`,
+            `${animalName} (${magicPower} MP${rank})\n\nOptions:\n1. Type new name to rename\n2. Type "DELETE" to release\n3. Type "MAIN" to set as main\n4. Cancel to close`,
             animalName
         );
 
@@ -132,6 +133,21 @@ const Cabin = {
         }
     },
 
+    /**
+     * Leaderboard position label, e.g. " · #123 of 50,000"
+     * @param {string} id - Familiar ID
+     * @returns {Promise<string>} Empty string if the rank is unavailable
+     */
+    async rankLabel(id) {
+        try {
+            const { rank, total } = await API.getRank(id);
+            return ` · #${rank.toLocaleString()} of ${total.toLocaleString()}`;
+        } catch (error) {
+            console.error('Rank error:', error);
+            return '';
+        }
+    },
+
     /**
      * Delete a familiar
      * @param {string} id - Familiar ID
@@ -2,7 +2,8 @@
  * Forest Module - Forest view with flying familiars
  * 
  * Handles:
- * - Loading and displaying familiars in forest lanes
+ * - Loading a bounded window of familiars and displaying them in forest lanes
+ * - Keeping the forest live with change-feed deltas
  * - Hover information cards
  * - Like/dislike interactions
  */
@@ -13,11 +14,22 @@ const Forest = {
         forestLanes: null
     },
 
+    // Familiars currently shown, by id, and the change sequence they reflect
+    familiars: new Map(),
+    seq: null,
+    // At most this many familiars fly at once; the seed keeps this viewer's window stable
+    windowSize: 40,
+    seed: null,
+    stream: null,
+    pollTimer: null,
+    broom: null,
+
     /**
      * Initialize forest module
      */
     init() {
         this.cacheElements();
+        this.seed = this.viewerSeed();
         console.log('Forest module initialized');
     },
 
@@ -31,17 +43,136 @@ const Forest = {
     },
 
     /**
-     * Load and display familiars in the forest
+     * Seed for this browser's forest window, kept across visits
+     * @returns {number}
+     */
+    viewerSeed() {
+        let seed = parseInt(localStorage.getItem('forestSeed'), 10);
+        if (!Number.isInteger(seed) || seed < 0) {
+            seed = Math.floor(Math.random() * 2 ** 31);
+            localStorage.setItem('forestSeed', String(seed));
+        }
+        return seed;
+    },
+
+    /**
+     * Load and display familiars in the forest.
+     * The window is fetched once; afterwards only changes are applied.
      */
     async load() {
         try {
-            const familiars = await API.getForestFamiliars();
-            this.render(familiars);
+            if (this.seq === null) {
+                const { familiars, seq } = await API.getForestWindow(this.seed, this.windowSize);
+                this.seq = seq;
+                this.familiars = new Map(familiars.map(f => [f.id, f]));
+                this.render(familiars);
+                this.subscribe();
+            } else {
+                await this.sync();
+            }
         } catch (error) {
             console.error('Load forest error:', error);
         }
     },
 
+    /**
+     * Follow the change stream, falling back to polling without EventSource
+     */
+    subscribe() {
+        if (this.stream || this.pollTimer) return;
+        if (typeof EventSource === 'undefined') {
+            this.pollTimer = setInterval(() => this.sync(), 5000);
+            return;
+        }
+        this.stream = API.streamChanges(this.seq);
+        this.stream.onmessage = (event) => this.applyChanges(JSON.parse(event.data));
+    },
+
+    /**
+     * Fetch and apply everything that changed since the last known sequence
+     */
+    async sync() {
+        try {
+            let feed;
+            do {
+                feed = await API.getChanges(this.seq);
+                this.applyChanges(feed);
+            } while (feed.more && !feed.reset);
+        } catch (error) {
+            console.error('Forest sync error:', error);
+        }
+    },
+
+    /**
+     * Apply a change feed batch to the forest
+     * @param {object} feed - {seq, reset, changes} from the changes endpoint
+     */
+    applyChanges(feed) {
+        if (feed.reset) {
+            // Too far behind for deltas: start over from a fresh snapshot
+            this.stream?.close();
+            this.stream = null;
+            this.seq = null;
+            this.load();
+            return;
+        }
+        if (feed.seq <= this.seq && !feed.changes.length) return;
+        feed.changes.forEach(change => {
+            if (change.op === 'deleted') {
+                this.familiars.delete(change.id);
+                this.removeFamiliarElement(change.id);
+            } else if (change.op === 'created' || this.familiars.has(change.id)) {
+                // Only familiars in the window are updated; new ones join it
+                this.familiars.set(change.id, change.familiar);
+                this.upsertFamiliarElement(change.familiar);
+            }
+        });
+        this.trimWindow();
+        this.seq = Math.max(this.seq, feed.seq);
+    },
+
+    /**
+     * Keep the window at windowSize by letting the oldest familiars fly off
+     */
+    trimWindow() {
+        if (this.familiars.size <= this.windowSize) return;
+        const oldest = [...this.familiars.values()]
+            .sort((a, b) => (a.created_time || 0) - (b.created_time || 0))
+            .slice(0, this.familiars.size - this.windowSize);
+        oldest.forEach(f => {
+            this.familiars.delete(f.id);
+            this.removeFamiliarElement(f.id);
+        });
+    },
+
+    /**
+     * Remove a familiar's element from its lane
+     * @param {string} id - Familiar ID
+     */
+    removeFamiliarElement(id) {
+        this.elements.forestLanes?.querySelector(`[data-id="${CSS.escape(id)}"]`)?.remove();
+    },
+
+    /**
+     * Add a familiar's element, or replace it in place if it is already shown
+     * @param {object} f - Familiar data
+     */
+    upsertFamiliarElement(f) {
+        const { forestLanes } = this.elements;
+        if (!forestLanes) return;
+        const existing = forestLanes.querySelector(`[data-id="${CSS.escape(f.id)}"]`);
+        const laneDiv = forestLanes.children[f.lane || 0];
+        const container = this.createFamiliarElement(f);
+        if (existing && existing.parentElement === laneDiv) {
+            // Same lane: swap the contents only, so the flight animation keeps going
+            existing.style.animationDuration = container.style.animationDuration;
+            existing.innerHTML = container.innerHTML;
+        } else {
+            existing?.remove();
+            laneDiv?.appendChild(container);
+        }
+    },
+
     /**
      * Render familiars in forest lanes
      * @param {Array} familiars - Array of familiar objects
@@ -77,6 +208,7 @@ const Forest = {
     createFamiliarElement(f) {
         const container = document.createElement('div');
         container.className = 'absolute top-2 animate-fly group cursor-pointer';
+        container.dataset.id = f.id;
         container.style.animationDuration = `${f.speed || 15}s`;
         container.style.animationDelay = `-${(f.id.charCodeAt(0) % 10) * 2}s`;
 
@@ -85,7 +217,7 @@ const Forest = {
 
         container.innerHTML = `
             <div class="relative w-32 h-24">
-                <img src="/static/images/broom.png" class="absolute bottom-0 left-0 w-35 h-15 object-contain transform -rotate-6 translate-y-2 opacity-90" alt="broom" />
+                ${this.broomHtml()}
                 <img src="${data.generatedImg}" class="absolute top-0 left-4 w-20 h-20 object-contain drop-shadow-xl transform group-hover:scale-180 transition-transform" alt="${data.animalName}" />
                 ${this.createHoverCard(f, data)}
             </div>
@@ -94,6 +226,20 @@ const Forest = {
         return container;
     },
 
+    /**
+     * Broom image, as a <picture> with AVIF/WebP sources when assets are built
+     * @returns {string} HTML string
+     */
+    broomHtml() {
+        if (this.broom) return this.broom;
+        const images = window.ASSET_IMAGES?.['images/broom.png'] || { src: '/static/images/broom.png', sources: [] };
+        const sources = images.sources
+            .map(s => `<source type="${s.type}" srcset="${s.srcset}" sizes="160px" />`)
+            .join('');
+        this.broom = `<picture>${sources}<img src="${images.src}" class="absolute bottom-0 left-0 w-35 h-15 object-contain transform -rotate-6 translate-y-2 opacity-90" alt="broom" /></picture>`;
+        return this.broom;
+    },
+
     /**
      * Extract familiar data with fallbacks
      * @param {object} f - Familiar object
@@ -101,8 +247,8 @@ const Forest = {
      */
     extractFamiliarData(f) {
         return {
-            generatedImg: f.generated_image || f.imageUrl || '',
-            originalImg: f.original_image || f.generated_image || f.imageUrl || '',
+            generatedImg: API.thumbnail(f, 'generated_image', 256) || f.imageUrl || '',
+            originalImg: API.thumbnail(f, 'original_image', 128) || API.thumbnail(f, 'generated_image', 128) || f.imageUrl || '',
             animalName: f.animal_name || f.name || 'Unknown',
             animalSpecies: f.animal_species || f.animalSpecies || 'Unknown Species',
             originalItemName: f.original_item_name || f.originalItemName || 'Unknown',
@@ -152,7 +298,7 @@ const Forest = {
         event?.stopPropagation();
         try {
             await API.likeFamiliar(id, value);
-            this.load(); // Reload forest
+            this.sync(); // Pull just the changed familiar
         } catch (error) {
             console.error('Like error:', error);
         }
@@ -14,12 +14,14 @@ const ImageGenerator = {
      * @param {string} description - Description for generation
      */
     async generate(species, description) {
+        if (this.offerReuse()) return;
+
         try {
-            // Call API to generate image
-            const data = await API.generateImage(species, description);
-            
-            // Remove white background from generated image
-            const processedUrl = await this.removeBackground(data.imageUrl);
+            // One server-side job generates the image, cuts out its background and stores it;
+            // the result is a /media/ URL, so no image data passes through the browser
+            const job = await API.startGeneration(species, description);
+            const data = await API.waitForJob(job.jobId);
+            const processedUrl = data.imageUrl;
             AppState.generatedImageUrl = processedUrl;
 
             // Prepare temporary familiar object
@@ -48,6 +50,28 @@ const ImageGenerator = {
         }
     },
 
+    /**
+     * Offer the assets of an existing familiar whose original image nearly
+     * matches the upload, instead of generating a new image
+     * @returns {boolean} True if the existing image was taken
+     */
+    offerReuse() {
+        const existing = AppState.reuse?.familiar;
+        if (!existing?.generated_image) return false;
+        const taken = confirm(`This looks like ${existing.animal_name}'s ${existing.original_item_name}. Summon with the same image?`);
+        if (!taken) return false;
+
+        AppState.generatedImageUrl = existing.generated_image;
+        AppState.tempFamiliar = {
+            animal_name: AppState.chosenName,
+            original_item_name: AppState.analysis?.originalItem || 'Unknown',
+            animal_species: AppState.analysis?.species || 'Unknown',
+            original_image: existing.original_image || AppState.originalImageUrl || '',
+            generated_image: existing.generated_image
+        };
+        return true;
+    },
+
     /**
      * Remove white background from image
      * @param {string} imageUrl - URL of image to process
@@ -65,7 +65,7 @@ const Leaderboard = {
      */
     createRow(f, idx) {
         // Extract data with fallbacks
-        const generatedImg = f.generated_image || f.imageUrl || '';
+        const generatedImg = API.thumbnail(f, 'generated_image', 128) || f.imageUrl || '';
         const animalName = f.animal_name || f.name || 'Unknown';
         const animalSpecies = f.animal_species || f.animalSpecies || 'Unknown';
         const userId = f.user_id || f.ownerId || '';
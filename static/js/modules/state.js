@@ -23,6 +23,9 @@ const AppState = {
     
     // Temporary familiar object before releasing to forest
     tempFamiliar: null,
+
+    // Existing familiar whose original image nearly matches the upload
+    reuse: null,
     
     /**
      * Reset all state to initial values
@@ -33,6 +36,7 @@ const AppState = {
         this.generatedImageUrl = null;
         this.originalImageUrl = null;
         this.tempFamiliar = null;
+        this.reuse = null;
     },
     
     /**
@@ -86,8 +86,8 @@ const Upload = {
      */
     async handleFile(file) {
         // Validate file type
-        if (!file.type.match(/image\/(jpeg|png)/)) {
-            alert('Please upload a JPG or PNG image');
+        if (!file.type.match(/image\/(jpeg|png|webp)/)) {
+            alert('Please upload a JPG, PNG or WebP image');
             return;
         }
 
@@ -107,6 +107,7 @@ const Upload = {
             
             // Store analysis in state
             AppState.analysis = data;
+            AppState.reuse = data.reuse || null;
 
             // Update UI with results
             this.displayAnalysisResults(data);
@@ -0,0 +1,160 @@
+"""
+Gemini Stub - Local stand-in for the Gemini generateContent endpoint
+
+Answers POST /v1beta/models/<model>:generateContent like the real API:
+analysis requests get a JSON text part, requests with an IMAGE response
+modality get a generated PNG as inlineData. Latency, tail latency and
+failures are configurable so retries, deadlines and hedging can be
+exercised offline.
+
+Usage:
+    python -m tools.gemini_stub --port 8089 --latency 0.3 --fail-rate 0.1
+    GEMINI_BASE_URL=http://127.0.0.1:8089 API_KEY=stub python app.py
+"""
+
+import io
+import re
+import json
+import time
+import base64
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from PIL import Image, ImageDraw
+
+_PATH = re.compile(r'^/v1beta/models/([\w.-]+):generateContent$')
+
+SPECIES = ['Owl', 'Fox', 'Raven', 'Cat', 'Toad', 'Dragonling', 'Moth']
+NAMES = ['Nebula', 'Cinder', 'Whisper', 'Glimmer', 'Moss', 'Umbra', 'Echo', 'Sprocket']
+
+
+class StubConfig:
+    """Behaviour knobs, shared by all handler threads"""
+
+    def __init__(self, latency=0.0, jitter=0.0, tail_rate=0.0, tail_latency=0.0,
+                 fail_rate=0.0, fail_status=503, image_size=512):
+        self.latency = latency
+        self.jitter = jitter
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        self.image_size = image_size
+        self.lock = threading.Lock()
+        self.requests = 0
+
+
+def _sticker_png(size: int, seed: str) -> bytes:
+    """A coloured blob on a white background, like a generated sticker"""
+    rng = random.Random(seed)
+    img = Image.new('RGB', (size, size), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    color = tuple(rng.randint(30, 200) for _ in range(3))
+    draw.ellipse((size * 0.2, size * 0.25, size * 0.8, size * 0.9), fill=color)
+    draw.ellipse((size * 0.35, size * 0.1, size * 0.65, size * 0.4), fill=color)
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _analysis_text(rng: random.Random) -> str:
+    return json.dumps({
+        'originalItem': 'Stub Object',
+        'species': rng.choice(SPECIES),
+        'suggestedNames': rng.sample(NAMES, 3),
+        'description': 'A familiar conjured by the local stub.'
+    })
+
+
+def make_handler(config: StubConfig):
+    class GeminiStubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, body: dict):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            if status in (429, 503):
+                self.send_header('Retry-After', '0')
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+
+            match = _PATH.match(self.path.split('?')[0])
+            if not match:
+                self._send_json(404, {'error': {'code': 404, 'message': 'Not found'}})
+                return
+
+            with config.lock:
+                config.requests += 1
+            delay = config.latency + random.uniform(0, config.jitter)
+            if random.random() < config.tail_rate:
+                delay += config.tail_latency
+            time.sleep(delay)
+
+            if random.random() < config.fail_rate:
+                self._send_json(config.fail_status, {
+                    'error': {'code': config.fail_status, 'message': 'Stub failure'}
+                })
+                return
+
+            rng = random.Random(json.dumps(request, sort_keys=True))
+            modalities = request.get('generationConfig', {}).get('responseModalities', [])
+            if 'IMAGE' in modalities:
+                image = base64.b64encode(_sticker_png(config.image_size, str(rng.random()))).decode('ascii')
+                parts = [{'text': 'Here is your familiar.'},
+                         {'inlineData': {'mimeType': 'image/png', 'data': image}}]
+            else:
+                parts = [{'text': _analysis_text(rng)}]
+
+            self._send_json(200, {
+                'candidates': [{'content': {'role': 'model', 'parts': parts}, 'finishReason': 'STOP'}],
+                'modelVersion': match.group(1)
+            })
+
+    return GeminiStubHandler
+
+
+def start_stub(host: str = '127.0.0.1', port: int = 0, **options):
+    """Start the stub in a background thread; returns (server, base_url)"""
+    config = StubConfig(**options)
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    server.config = config
+    threading.Thread(target=server.serve_forever, name='gemini-stub', daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local Gemini generateContent stub')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=0.0, help='Base latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Extra uniform random latency')
+    parser.add_argument('--tail-rate', type=float, default=0.0, help='Fraction of slow responses')
+    parser.add_argument('--tail-latency', type=float, default=0.0, help='Extra latency of slow responses')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Fraction of failed responses')
+    parser.add_argument('--fail-status', type=int, default=503)
+    parser.add_argument('--image-size', type=int, default=512)
+    args = parser.parse_args()
+
+    config = StubConfig(args.latency, args.jitter, args.tail_rate, args.tail_latency,
+                        args.fail_rate, args.fail_status, args.image_size)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(config))
+    print(f"Gemini stub listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()